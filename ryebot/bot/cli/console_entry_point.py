@@ -5,7 +5,7 @@ import click
 
 from ryebot.bot.cli.daemon_manager import start_daemon, do_debug_action
 from ryebot.bot.cli.status_displayer import StatusDisplayer
-from ryebot.bot.cli.wiki_manager import display_wiki_list, add_wiki, remove_wiki, go_online_on_wiki, go_offline_on_wiki
+from ryebot.bot.cli.wiki_manager import display_wiki_list, add_wiki, remove_wiki, import_dump_to_wiki, go_online_on_wiki, go_offline_on_wiki
 from ryebot.bot.loggers import cmd_logger
 from ryebot.bot.scripts import __availablescripts__
 
@@ -112,6 +112,16 @@ def wiki_remove(name):
     remove_wiki(name)
 
 
+@click.command(context_settings=CONTEXT_SETTINGS, name='import')
+@click.option('-n', '--name', prompt='Name of the wiki', help='Name of the wiki to import the dump to. Use "<wikiname>/<lang>" for language variants.')
+@click.option('-f', '--file', 'filename', prompt='Dump file', type=click.Path(exists=True, dir_okay=False), help='The XML dump file (plain, .bz2, or .gz).')
+@click.option('--search-index/--no-search-index', default=True, help='Whether to also add the pages to the local search index.')
+@click.option('--complete-namespace', 'complete_namespaces', type=int, multiple=True, help='A namespace that the dump contains completely, so that the search index is marked as built for it. Can be given multiple times.')
+def wiki_import(name, filename, search_index, complete_namespaces):
+    """Seed the local page store of a wiki from an XML dump."""
+    import_dump_to_wiki(name, filename, search_index, complete_namespaces)
+
+
 # register the command group structure:
 # all commands for "$ ryebot"
 main.add_command(main_status)
@@ -126,3 +136,4 @@ main.add_command(wiki)
 wiki.add_command(wiki_list)
 wiki.add_command(wiki_add)
 wiki.add_command(wiki_remove)
+wiki.add_command(wiki_import)
@@ -121,6 +121,25 @@ def remove_wiki(wikiname):
     click.echo(f'The bot now does not have access to the "{wikiname}" wiki any longer!')
 
 
+def import_dump_to_wiki(wikiname, filename, search_index, complete_namespaces):
+    wikis = get_local_wikis()
+
+    if wikiname not in wikis:
+        click.echo('\n'.join((
+            f'Cannot import the dump to the "{wikiname}" wiki, because the bot currently does not have access to it.',
+            'You can grant access to the wiki using "ryebot wiki add".'
+        )))
+        return
+
+    # the importer uses the wiki client modules, which import this module
+    from ryebot.custom_mwclient.dump_importer import import_dump
+
+    click.echo(f'Importing "{filename}" to the "{wikiname}" wiki...')
+    pages, written = import_dump(filename, os.path.join(PATHS['wikis'], *get_wiki_directory_from_name(wikiname)),
+                                 search_index=search_index, log=click.echo, complete_namespaces=complete_namespaces)
+    click.echo(f'Imported {written} of {pages} page(s) from the dump; the others were already stored in the same or a newer revision.')
+
+
 def go_online_on_wiki(wikinames, on_all_wikis):
     wikis = get_local_wikis()
 
@@ -13,7 +13,8 @@ def login_to_wiki(wikiname: str, logger: logging.Logger):
     _modify_loginstatus_file(logger, wikiname, newstatus=LoginStatus.LOGGING_IN)
 
     try:
-        site, login_log = login(wikiname, return_log=True)
+        wikidir = os.path.join(PATHS['wikis'], *get_wiki_directory_from_name(wikiname))
+        site, login_log = login(wikiname, return_log=True, localdata_directory=wikidir)
     except Exception as e:
         _modify_loginstatus_file(logger, wikiname, newstatus=LoginStatus.LOGGED_OUT)
         logger.info("Modified the login status file due to error while logging in.")
@@ -34,7 +34,7 @@ def pingcheck(wikiname: str, logger: logging.Logger):
 
         # login to wiki
         try:
-            site, login_log = login(wikiname, return_log=True)
+            site, login_log = login(wikiname, return_log=True, localdata_directory=pidfiledir)
         except Exception as e:
             logger.info(f'Failed to login to the "{wikiname}" wiki in order to start the pingchecker.')
             raise e
@@ -72,8 +72,8 @@ def _check(site: FandomClient, pingpage_name: str, initial_pingpage_text: str, s
                 # and is this also a fresh request, not one from before we started the pingchecker.
                 # therefore, prepare the response
                 page_new_text = pingpage_text + (RESPONSE_TEXT.format(startuptime=startuptime))
-                # publish the response
-                site.save(pingpage, page_new_text, summary=RESPONSE_SUMMARY, minor=True)
+                # publish the response; only the appended response is sent
+                site.save_diff(pingpage, page_new_text, summary=RESPONSE_SUMMARY, minor=True, old_text=pingpage_text)
                 # wait a bit
                 time.sleep(TIME_UNTIL_WIPE)
                 # and wipe all requests
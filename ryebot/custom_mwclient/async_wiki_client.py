@@ -0,0 +1,441 @@
+import asyncio
+import datetime
+from typing import AsyncIterator, List, Optional, Tuple, Union
+
+from mwclient.errors import APIError, AssertUserFailedError, LoginError, ProtectedPageError
+
+from custom_mwclient.models.simple_page import SimplePage
+from custom_utils.iter_util import chunked
+
+from .auth_credentials import AuthCredentials
+from .errors import RetriedLoginAndStillFailed, InvalidNamespaceName, PatrolRevisionNotSpecified, PatrolRevisionInvalid
+from .rate_limiter import READ, WRITE, get_rate_limiter
+from .site import Site
+from .token_cache import TokenCache
+from .wiki_client import WikiClient
+
+try:
+    import aiohttp
+except ImportError:
+    # optional dependency, see the "async" extra in setup.py
+    aiohttp = None
+
+
+# API error codes that mean the page is protected, as in mwclient.Page.handle_edit_error()
+PROTECTION_ERROR_CODES = {
+    'protectedtitle', 'cantcreate', 'cantcreate-anon', 'noimageredirect-anon', 'noimageredirect', 'noedit-anon',
+    'noedit', 'protectedpage', 'cascadeprotected', 'customcssjsprotected', 'protectednamespace-interface',
+    'protectednamespace'
+}
+
+
+class AsyncWikiClient(object):
+    """
+    asyncio variant of the read and write methods of WikiClient.
+
+    All requests of a client share one pool of keep-alive connections, so many pages or many wikis can be processed
+    concurrently with ``asyncio.gather`` instead of threads or processes. Retries and re-logins work like in
+    WikiClient. The API URL can be any host and scheme, e.g. ``http://127.0.0.1:8080`` for a local stand-in server.
+
+    Use the client as an async context manager, or call ``open`` and ``close`` explicitly.
+    """
+    write_errors = (AssertUserFailedError, asyncio.TimeoutError, APIError)
+
+    def __init__(self, url: str, path='/', credentials: AuthCredentials = None, scheme: str = 'https',
+                 max_retries=3, retry_interval=10, max_connections=10, max_lag=3, timeout=30,
+                 rate_limit=True, user_agent: str = 'Ryebot (https://github.com/Ryeb0t/ryebot)'):
+        """
+        Create a client. This doesn't make any requests yet.
+        :param url: Host of the wiki, optionally with scheme, e.g. ``terraria.fandom.com``.
+        :param path: Path to the directory of ``api.php``.
+        :param credentials: Optional. Provide if you want a logged-in session.
+        :param max_connections: Size of the connection pool.
+        """
+
+        if aiohttp is None:
+            raise ImportError('AsyncWikiClient requires the "aiohttp" package. Install it with "pip install ryebot[async]".')
+
+        if 'http://' in url:
+            scheme = 'http'
+            url = url.replace('http://', '')
+        elif 'https://' in url:
+            scheme = 'https'
+            url = url.replace('https://', '')
+
+        self.url = url
+        self.path = path
+        self.scheme = scheme
+        self.api_url = '{}://{}{}api.php'.format(scheme, url, path)
+        self.credentials = credentials
+        self.max_retries = max_retries
+        self.retry_interval = retry_interval
+        self.max_connections = max_connections
+        self.max_lag = max_lag
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.rate_limiter = get_rate_limiter(url) if rate_limit else None
+
+        self.tokens = TokenCache()
+        self._session = None
+        self._relog_lock = None
+        self._login_generation = 0
+        self._namespaces = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def open(self):
+        """Create the connection pool and log in, if credentials were provided."""
+
+        self._relog_lock = asyncio.Lock()
+        await self._new_session()
+        await self.login()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def _new_session(self):
+        await self.close()
+        connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            # unsafe=True to also keep cookies for IP addresses, e.g. of a local test server
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            headers={'User-Agent': self.user_agent, 'Accept-Encoding': 'gzip'},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self.tokens.invalidate()
+
+    async def login(self):
+        """Log in to the wiki with the credentials of this client."""
+
+        if self.credentials is None:
+            return
+        login_token = await self.get_token('login')
+        result = await self.api('login', lgname=self.credentials.username, lgpassword=self.credentials.password,
+                                lgtoken=login_token)
+        if result['login']['result'] != 'Success':
+            raise LoginError(self, result['login']['result'], result['login'].get('reason'))
+        # tokens of the anonymous session aren't valid anymore
+        self.tokens.invalidate()
+
+    async def relog(self, generation: int = None):
+        """Discard the current session and log in again.
+
+        If several tasks fail at the same time, only the first one relogs; the others wait for it and then
+        use the new session. Pass the ``login_generation`` that the failed attempt used to achieve that.
+        """
+
+        async with self._relog_lock:
+            if generation is not None and generation != self._login_generation:
+                # another task already relogged since the failure
+                return
+            await self._new_session()
+            await self.login()
+            self._login_generation += 1
+
+    @property
+    def login_generation(self) -> int:
+        return self._login_generation
+
+    async def api(self, action: str, http_method='POST', **params) -> dict:
+        """Perform an API request and return the decoded result, raising ``APIError`` on errors."""
+
+        data = {'action': action, 'format': 'json', 'maxlag': self.max_lag}
+        if action == 'query':
+            data['continue'] = ''
+        for key, value in params.items():
+            if value is None or value is False:
+                continue
+            data[key] = '1' if value is True else str(value)
+        if self.credentials is not None and 'token' in data and action != 'login':
+            data['assert'] = 'user'
+        kind = WRITE if 'token' in data and action != 'login' else READ
+
+        for retry in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                await asyncio.sleep(self.rate_limiter.reserve(kind))
+            if http_method == 'GET':
+                response = await self._session.get(self.api_url, params=data)
+            else:
+                response = await self._session.post(self.api_url, data=data)
+            async with response:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.observe(kind, response.status, response.headers)
+                if 'X-Database-Lag' in response.headers or response.status == 429 or response.status >= 500:
+                    # wait as long as the server asks for, or back off, and then try again
+                    retry_after = response.headers.get('Retry-After')
+                    await asyncio.sleep(float(retry_after) if retry_after and retry_after.isdigit() else 2 ** retry)
+                    continue
+                response.raise_for_status()
+                result = await response.json(content_type=None)
+            return self._handle_api_result(result, data)
+
+        raise APIError('maxretries', 'Exceeded the maximum number of retries for this request.', data)
+
+    @staticmethod
+    def _handle_api_result(result: dict, data: dict) -> dict:
+        if 'error' not in result:
+            return result
+        code = result['error'].get('code')
+        if code == 'assertuserfailed':
+            raise AssertUserFailedError()
+        raise APIError(code, result['error'].get('info'), data)
+
+    async def get_token(self, type: str) -> str:
+        if type not in Site.non_csrf_token_types:
+            type = 'csrf'
+        token = self.tokens.get(type)
+        if token is None:
+            result = await self.api('query', 'GET', meta='tokens', type=type)
+            token = result['query']['tokens']['{}token'.format(type)]
+            self.tokens.set(type, token)
+        return token
+
+    async def _write(self, action: str, token_type: str, **params) -> dict:
+        """Perform a write request with a cached token, replacing the token once if it is rejected."""
+
+        params['token'] = await self.get_token(token_type)
+        try:
+            return await self.api(action, **params)
+        except APIError as e:
+            if e.code != 'badtoken':
+                raise
+            self.tokens.invalidate()
+            params['token'] = await self.get_token(token_type)
+            return await self.api(action, **params)
+
+    async def api_continue_iter(self, action: str, item_key: str = None, **params) -> AsyncIterator:
+        """Async version of ``WikiClient.api_continue_iter``."""
+
+        while True:
+            api_result = await self.api(action, **params)
+            batch = api_result.get(action, {})
+            if item_key is None:
+                yield batch
+            else:
+                items = batch.get(item_key, [])
+                if isinstance(items, dict):
+                    items = items.values()
+                for item in items:
+                    yield item
+
+            continue_params = api_result.get('continue')
+            if not continue_params:
+                return
+            params.update(continue_params)
+
+
+    ##### Read methods
+
+
+    async def get_ns_number(self, ns: str) -> int:
+        if self._namespaces is None:
+            result = await self.api('query', 'GET', meta='siteinfo', siprop='namespaces|namespacealiases')
+            namespaces = {}
+            for ns_str, ns_data in result['query']['namespaces'].items():
+                namespaces[ns_data['*']] = int(ns_str)
+                if 'canonical' in ns_data:
+                    namespaces[ns_data['canonical']] = int(ns_str)
+            for alias in result['query']['namespacealiases']:
+                namespaces[alias['*']] = alias['id']
+            self._namespaces = namespaces
+        if ns not in self._namespaces:
+            raise InvalidNamespaceName
+        return self._namespaces[ns]
+
+    async def get_simple_pages(self, title_list: List[str], limit: int, max_concurrency: int = 4) -> List[SimplePage]:
+        """Return a list of ``SimplePage`` objects for the titles in the ``title_list``, in the same order.
+
+        The titles are queried in batches of ``limit``, and up to ``max_concurrency`` batches are fetched at the same time.
+        """
+
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def fetch(titles):
+            async with semaphore:
+                result = await self.api('query', 'GET', prop='revisions', titles='|'.join(titles),
+                                        rvprop='content|ids|sha1', rvslots='main')
+            return WikiClient._simple_pages_from_result(result, titles)
+
+        batches = await asyncio.gather(*(fetch(titles) for titles in chunked(title_list, limit)))
+        return [page for batch in batches for page in batch]
+
+    async def recentchanges_by_interval(self, minutes, offset=0, prop='title|ids|tags|user|patrolled', **kwargs) -> List[dict]:
+        now = datetime.datetime.utcnow() - datetime.timedelta(minutes=offset)
+        then = now - datetime.timedelta(minutes=minutes)
+        changes = self.api_continue_iter('query', item_key='recentchanges', list='recentchanges',
+                                         rcstart=now.isoformat(), rcend=then.isoformat(), rclimit='max',
+                                         rcprop=prop, **{'rc' + key: value for key, value in kwargs.items()})
+        return [change async for change in changes]
+
+    async def logs_by_interval(self, minutes, offset=0, lelimit='max', leprop='details|type|title|tags', **kwargs) -> List[dict]:
+        now = datetime.datetime.utcnow() - datetime.timedelta(minutes=offset)
+        then = now - datetime.timedelta(minutes=minutes)
+        logs = await self.api('query', 'GET', list='logevents', leend=then.isoformat(), leprop=leprop,
+                              lelimit=lelimit, ledir='older', **kwargs)
+        return logs['query']['logevents']
+
+    async def pages_using(self, template: str, namespace: Optional[Union[int, str]] = None, filterredir='all',
+                          limit=None) -> List[dict]:
+        """Return a list of the pages (``pageid``, ``ns``, and ``title``) that are transcluding the specified page."""
+
+        if isinstance(namespace, str):
+            namespace = await self.get_ns_number(namespace)
+        if ':' not in template:
+            title = 'Template:' + template
+        elif template.startswith(':'):
+            title = template[1:]
+        else:
+            title = template
+        pages = []
+        async for page in self.api_continue_iter('query', item_key='embeddedin', list='embeddedin', eititle=title,
+                                                 einamespace=namespace, eifilterredir=filterredir, eilimit='max'):
+            pages.append(page)
+            if limit is not None and len(pages) >= limit:
+                break
+        return pages
+
+    async def get_last_rev(self, title: str, log=None, query='revid'):
+        """Get the latest revision (rev) id or timestamp for the page with the given title."""
+
+        try:
+            api_result = await self.api('query', 'GET', prop='revisions', titles=title, rvlimit=1)
+        except (APIError, aiohttp.ClientError, asyncio.TimeoutError):
+            if log is None:
+                raise
+            log('\n***ERROR*** while getting last revision!')
+            log(exc_info=True, s='Error message:\n')
+            return None
+        for page in api_result['query']['pages'].values():
+            try:
+                return page['revisions'][0][query]
+            except KeyError:
+                return None
+        return None
+
+    async def page_exists(self, title: str, log=None) -> bool:
+        """Check whether a page with the specified name exists on the wiki."""
+
+        try:
+            api_result = await self.api('query', 'GET', prop='info', titles=title)
+        except (APIError, aiohttp.ClientError, asyncio.TimeoutError):
+            if log is None:
+                raise
+            log('\n***ERROR*** while checking whether the page "{}" exists!'.format(title))
+            log(exc_info=True, s='Error message:\n')
+            return False
+        return '-1' not in api_result['query'].get('pages', {'-1': None})
+
+
+    ##### Write methods
+
+
+    async def save(self, title: str, text: str, summary='', minor=False, bot=True, section=None, log=None, **kwargs):
+        """Async version of ``WikiClient.save``, retrying the login if the edit fails due to the user being logged out."""
+
+        params = dict(title=title, text=text, summary=summary, bot=bot, section=section, **kwargs)
+        params['minor' if minor else 'notminor'] = True
+        try:
+            return await self._retrying(self._edit, 'edit', **params)
+        except ProtectedPageError:
+            if log:
+                log(exc_info=True, s='Error while saving page {}: Page is protected!'.format(title))
+            else:
+                raise
+
+    async def _edit(self, **params):
+        try:
+            result = await self._write('edit', 'csrf', **params)
+        except APIError as e:
+            if e.code in PROTECTION_ERROR_CODES:
+                raise ProtectedPageError(params['title'], e.code, e.info)
+            raise
+        return result['edit']
+
+    async def move(self, title: str, new_title: str, reason='', move_talk=True, no_redirect=False,
+                   move_subpages=False, ignore_warnings=False):
+        params = {'from': title, 'to': new_title, 'reason': reason, 'movetalk': move_talk, 'noredirect': no_redirect,
+                  'movesubpages': move_subpages, 'ignorewarnings': ignore_warnings}
+        result = await self._retrying(self._write, 'move', 'move', 'csrf', retry_codes=('badtoken',), **params)
+        return result['move']
+
+    async def delete(self, title: str, reason='', watch=False, unwatch=False, oldimage=False):
+        params = {'title': title, 'reason': reason, 'watch': watch, 'unwatch': unwatch, 'oldimage': oldimage}
+        result = await self._retrying(self._write, 'delete', 'delete', 'csrf', retry_codes=('badtoken',), **params)
+        return result['delete']
+
+    async def patrol(self, revid=None, rcid=None, **kwargs):
+        if revid is None and rcid is None:
+            raise PatrolRevisionNotSpecified
+        try:
+            return await self._retrying(self._write, 'patrol', 'patrol', 'patrol', revid=revid, rcid=rcid, **kwargs)
+        except APIError as e:
+            if e.code == 'nosuchrevid' or e.code == 'nosuchrcid':
+                raise PatrolRevisionInvalid
+            raise
+
+    async def purge(self, title: str):
+        return await self._retrying(self.api, 'purge', 'purge', titles=title)
+
+    async def _retrying(self, f, failure_type: str, *args, retry_codes: Tuple[str, ...] = None, **kwargs):
+        """Run ``f``, and retry it with a new login if it fails, like ``WikiClient._retry_login_action``.
+
+        :param retry_codes: Optional. The API error codes that are retried, like ``WikiClient.move`` and
+        ``WikiClient.delete`` only retry ``badtoken``. Other API errors are raised immediately. By default, all API
+        errors are retried except for invalid revisions.
+        """
+
+        def is_retryable(e: Exception) -> bool:
+            if not isinstance(e, APIError):
+                return True
+            if retry_codes is not None:
+                return e.code in retry_codes
+            # retrying won't help
+            return e.code not in ('nosuchrevid', 'nosuchrcid')
+
+        generation = self._login_generation
+        try:
+            return await f(*args, **kwargs)
+        except self.write_errors as e:
+            if not is_retryable(e):
+                raise
+
+        codes = []
+        for retry in range(self.max_retries):
+            await self.relog(generation)
+            generation = self._login_generation
+            # don't sleep at all the first retry, and then increment in retry_interval intervals;
+            # other tasks keep running while this one sleeps
+            await asyncio.sleep((2 ** retry - 1) * self.retry_interval)
+            try:
+                return await f(*args, **kwargs)
+            except self.write_errors as e:
+                if not is_retryable(e):
+                    raise
+                if isinstance(e, APIError):
+                    codes.append(e.code)
+                continue
+        raise RetriedLoginAndStillFailed(failure_type, codes)
+
+
+class AsyncFandomClient(AsyncWikiClient):
+    """Async variant of FandomClient, for connecting to Fandom wikis."""
+
+    def __init__(self, wiki: str, lang: str = None, credentials: AuthCredentials = None, **kwargs):
+        """
+        Create a client.
+        :param wiki: Name of a wiki
+        :param lang: Optional. If the wiki has a language path in the URL, provide it here.
+        :param credentials: Optional. Provide if you want a logged-in session.
+        """
+
+        url = '{}.fandom.com'.format(wiki)
+        self.lang = '/' + ('' if lang is None else lang + '/')
+        super().__init__(url=url, path=self.lang, credentials=credentials, **kwargs)
@@ -0,0 +1,186 @@
+import os
+import time
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, Optional
+
+from custom_mwclient.errors import PatrolRevisionInvalid, RetriedLoginAndStillFailed
+from custom_mwclient.wiki_client import WikiClient
+from custom_utils.iter_util import imap_ordered
+
+from .checkpoint import Checkpoint
+
+
+# Name of the file in the wiki's localdata directory that holds the position of the bulk patroller
+PATROLCHECKPOINTFILE = '.patrol.checkpoint'
+
+PATROLLED = 'patrolled'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+# Number of runs in which a change whose patrol failed is tried
+MAX_ATTEMPTS = 3
+# errors after which retrying a change is pointless
+_PERMANENT_ERROR_CODES = {'nosuchrcid'}
+
+
+class PatrolReport(object):
+    """Statistics of a bulk patrol run."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.finished = None
+        self.checked = 0
+        self.patrolled = 0
+        self.skipped = 0
+        self.failures: Dict[int, str] = {} # rcid -> error code
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def rate(self) -> float:
+        """Number of patrolled changes per second."""
+        elapsed = self.elapsed
+        return self.patrolled / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return 'Checked {} changes in {:.1f} s: {} patrolled ({:.1f}/s), {} skipped, {} failed.'.format(
+            self.checked, self.elapsed, self.patrolled, self.rate, self.skipped, len(self.failures))
+
+
+class BulkPatroller(object):
+    """
+    Patrols all unpatrolled recent changes of a wiki that match a predicate.
+
+    The changes are streamed from the API and patrolled over a bounded number of concurrent requests, all using
+    the same cached patrol token. A patrol that fails because the session expired relogs and is retried, like the
+    other writes of the site. Failures are recorded per change instead of aborting the run, and the position in the
+    stream is saved to a checkpoint, so that an interrupted run continues where it stopped.
+
+    The changes whose patrol failed (e.g. due to a timeout) are saved to the checkpoint as well, and tried again at the
+    start of the next run, in up to ``MAX_ATTEMPTS`` runs in total.
+    """
+
+    def __init__(self, site: WikiClient, predicate: Callable[[dict], bool] = None,
+                 users: Iterable[str] = None, tags: Iterable[str] = None, namespaces: Iterable[int] = None,
+                 max_workers: int = 4, checkpoint_file: Optional[str] = ''):
+        """
+        :param site: The client of the wiki to patrol on.
+        :param predicate: Optional. Function that receives a recent change (with the properties ``rcid``, ``revid``,
+        ``title``, ``ns``, ``user``, ``tags``, ``type`` and ``timestamp``) and returns whether to patrol it.
+        :param users: Optional. Only patrol changes by these users.
+        :param tags: Optional. Only patrol changes with at least one of these tags.
+        :param namespaces: Optional. Only patrol changes in these namespaces.
+        :param max_workers: The maximum number of patrol requests in flight.
+        :param checkpoint_file: Full path of the checkpoint file. Defaults to a file in the wiki's localdata directory,
+        if there is one. Use ``None`` to not persist the checkpoint.
+        """
+
+        self.site = site
+        self.predicate = predicate
+        self.users = set(users) if users is not None else None
+        self.tags = set(tags) if tags is not None else None
+        self.namespaces = set(namespaces) if namespaces is not None else None
+        self.max_workers = max_workers
+
+        if checkpoint_file == '':
+            directory = site.localdata_directory
+            checkpoint_file = os.path.join(directory, PATROLCHECKPOINTFILE) if directory is not None else None
+        self.checkpoint = Checkpoint(checkpoint_file)
+
+    def matches(self, change: dict) -> bool:
+        if self.users is not None and change.get('user') not in self.users:
+            return False
+        if self.tags is not None and not self.tags.intersection(change.get('tags', [])):
+            return False
+        if self.namespaces is not None and change.get('ns') not in self.namespaces:
+            return False
+        if self.predicate is not None and not self.predicate(change):
+            return False
+        return True
+
+    def unpatrolled_changes(self) -> Iterable[dict]:
+        """Stream the unpatrolled changes after the checkpoint, oldest first."""
+
+        last_timestamp = self.checkpoint.get('timestamp')
+        last_rcid = self.checkpoint.get('rcid', 0)
+        kwargs = {}
+        if last_timestamp is not None:
+            kwargs['rcstart'] = last_timestamp
+
+        changes = self.site.api_continue_iter('query', item_key='recentchanges', list='recentchanges',
+                                              rcshow='!patrolled', rcprop='ids|title|user|tags|timestamp|patrolled',
+                                              rcdir='newer', rclimit='max', **kwargs)
+        for change in changes:
+            if last_timestamp is not None and (change['timestamp'], change['rcid']) <= (last_timestamp, last_rcid):
+                continue
+            yield change
+
+    def _process(self, change: dict):
+        if not self.matches(change):
+            return (SKIPPED, None)
+        try:
+            # goes through the site's session check, so a patrol that fails on an expired session relogs and is retried
+            self.site.patrol(rcid=change['rcid'])
+        except PatrolRevisionInvalid:
+            return (FAILED, 'nosuchrcid')
+        except RetriedLoginAndStillFailed as e:
+            return (FAILED, e.codes[-1] if e.codes else type(e).__name__)
+        return (PATROLLED, None)
+
+    def run(self, limit: int = None, log=None, report_interval: int = 500) -> PatrolReport:
+        """Patrol the matching unpatrolled changes.
+
+        Parameters
+        ----------
+        1. limit : int
+            - Optional. The maximum number of changes to check.
+        2. log : function
+            - Optional. Function to report the progress to, every ``report_interval`` checked changes.
+
+        Returns
+        -------
+        A ``PatrolReport`` with the statistics and the failed changes of the run.
+        """
+
+        report = PatrolReport()
+        # rcid -> {'change': change, 'attempts': number of failed attempts}, of the changes to try again
+        failed = {entry['change']['rcid']: entry for entry in self.checkpoint.get('failed', [])}
+        retries = [(entry['change'], True) for entry in failed.values()]
+        changes = chain(retries, ((change, False) for change in self.unpatrolled_changes()))
+        if limit is not None:
+            changes = islice(changes, limit)
+
+        # keep the changes next to their results, so that the checkpoint can follow the results in stream order
+        def process(item):
+            change, retried = item
+            return (change, retried, self._process(change))
+
+        try:
+            for change, retried, (outcome, code) in imap_ordered(process, changes, max_workers=self.max_workers):
+                report.checked += 1
+                if outcome == PATROLLED:
+                    report.patrolled += 1
+                elif outcome == SKIPPED:
+                    report.skipped += 1
+                else:
+                    report.failures[change['rcid']] = code
+
+                entry = failed.pop(change['rcid'], {'change': change, 'attempts': 0})
+                if outcome == FAILED and code not in _PERMANENT_ERROR_CODES and entry['attempts'] + 1 < MAX_ATTEMPTS:
+                    failed[change['rcid']] = {'change': change, 'attempts': entry['attempts'] + 1}
+                if not retried:
+                    self.checkpoint.update(timestamp=change['timestamp'], rcid=change['rcid'])
+                self.checkpoint.update(failed=list(failed.values()))
+                if report.checked % report_interval == 0:
+                    self.checkpoint.save()
+                    if log:
+                        log(str(report))
+        finally:
+            self.checkpoint.save()
+            report.finished = time.time()
+
+        if log:
+            log(str(report))
+        return report
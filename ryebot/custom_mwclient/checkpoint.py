@@ -0,0 +1,32 @@
+from custom_utils.file_util import read_json, write_json_atomic
+
+
+class Checkpoint(object):
+    """
+    Small persistent state (e.g. the position of a long-running stream) that survives a restart of the process.
+
+    Without a filename, the state is only kept in memory.
+    """
+
+    def __init__(self, filename: str = None):
+        self.filename = filename
+        self.state = {}
+        if filename is not None:
+            state = read_json(filename)
+            if isinstance(state, dict):
+                self.state = state
+
+    def get(self, key: str, default=None):
+        return self.state.get(key, default)
+
+    def update(self, **kwargs):
+        """Change the state in memory. Use ``save`` to persist it."""
+        self.state.update(kwargs)
+
+    def save(self):
+        if self.filename is not None:
+            write_json_atomic(self.filename, self.state)
+
+    def clear(self):
+        self.state = {}
+        self.save()
@@ -0,0 +1,104 @@
+import string
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from custom_mwclient.wiki_client import WikiClient
+from custom_utils.iter_util import imap_ordered
+
+
+# Default split points of the listings: before the digits, before every uppercase letter, and before the lowercase
+# letters (where titles with a lowercase first letter and most non-ASCII titles are)
+ALLPAGES_SPLIT_POINTS = ('0',) + tuple(string.ascii_uppercase) + ('a',)
+# sort keys are uppercased by the default category collation, so a split point in lowercase would repeat another one
+CATEGORY_SPLIT_POINTS = ('0',) + tuple(string.ascii_uppercase)
+
+
+def key_ranges(split_points: Sequence[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Return the ranges ``[start, end)`` between the sorted ``split_points``, with open ends (``None``) at both sides."""
+
+    points = [None] + sorted(set(split_points)) + [None]
+    return list(zip(points[:-1], points[1:]))
+
+
+class PartitionedCrawler(object):
+    """
+    Enumerates long listings (all pages of a namespace, all members of a category) with several cursors at once.
+
+    A listing is split into ranges of titles or sort keys, which are crawled concurrently, each with its own continue
+    chain, and yielded in order. The default split points suit wikis with mostly English titles; for other wikis,
+    pass split points that divide their titles into ranges of similar size.
+    """
+
+    def __init__(self, site: WikiClient, max_workers: int = 4, limit: Optional[int] = None):
+        """
+        :param site: The client of the wiki to crawl.
+        :param max_workers: Number of ranges that are crawled at the same time.
+        :param limit: The number of items per request. Defaults to the maximum.
+        """
+
+        self.site = site
+        self.max_workers = max_workers
+        self.limit = limit or 'max'
+
+    def _crawl(self, list_name: str, ranges: List[dict], params: dict) -> Iterator[dict]:
+        def crawl_range(range_params: dict) -> List[dict]:
+            return list(self.site.api_continue_iter('query', item_key=list_name, list=list_name,
+                                                    **params, **range_params))
+
+        previous = None
+        for items in imap_ordered(crawl_range, ranges, max_workers=self.max_workers):
+            for item in items:
+                # the end of a range might be included in it and in the next one
+                if previous is not None and item.get('pageid', item['title']) == previous:
+                    continue
+                previous = item.get('pageid', item['title'])
+                yield item
+
+    def allpages(self, namespace: int = 0, split_points: Sequence[str] = ALLPAGES_SPLIT_POINTS, **kwargs) -> Iterator[dict]:
+        """Yield all pages of the ``namespace`` (as dicts with ``pageid``, ``ns``, and ``title``) in title order.
+
+        :param namespace: The number of the namespace.
+        :param split_points: The titles (without namespace) at which the listing is split into ranges.
+        :param kwargs: Additional parameters of the ``allpages`` list, e.g. ``apfilterredir='nonredirects'``.
+        """
+
+        ranges = []
+        for start, end in key_ranges(split_points):
+            extra_params = {}
+            if start is not None:
+                extra_params['apfrom'] = start
+            if end is not None:
+                # inclusive, so a page with exactly this title is in both ranges
+                extra_params['apto'] = end
+            ranges.append(extra_params)
+        params = dict(apnamespace=namespace, aplimit=self.limit, **kwargs)
+        return self._crawl('allpages', ranges, params)
+
+    def categorymembers(self, category: str, split_points: Sequence[str] = CATEGORY_SPLIT_POINTS,
+                        **kwargs) -> Iterator[dict]:
+        """Yield all members of the ``category`` (as dicts with ``pageid``, ``ns``, and ``title``) in sort key order.
+
+        :param category: The title of the category, with or without namespace prefix.
+        :param split_points: The sort key prefixes at which the listing is split into ranges.
+        :param kwargs: Additional parameters of the ``categorymembers`` list, e.g. ``cmnamespace=0``.
+        """
+
+        if self.site.title_normalizer.split(category)[0] != 14:
+            category = '{}:{}'.format(self.site.title_normalizer.namespace_name(14), category)
+        ranges = []
+        for start, end in key_ranges(split_points):
+            extra_params = {}
+            if start is not None:
+                extra_params['cmstartsortkeyprefix'] = start
+            if end is not None:
+                # exclusive
+                extra_params['cmendsortkeyprefix'] = end
+            ranges.append(extra_params)
+        params = dict(cmtitle=category, cmsort='sortkey', cmlimit=self.limit, **kwargs)
+        return self._crawl('categorymembers', ranges, params)
+
+
+def crawl_titles(site: WikiClient, namespace: int, max_workers: int = 4, **kwargs) -> Iterator[str]:
+    """Yield the titles of all pages of the ``namespace``, crawled with a ``PartitionedCrawler``."""
+
+    for page in PartitionedCrawler(site, max_workers=max_workers).allpages(namespace, **kwargs):
+        yield page['title']
@@ -0,0 +1,226 @@
+import bz2
+import calendar
+import gzip
+import hashlib
+import os
+import time
+import xml.etree.ElementTree as ElementTree
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from custom_mwclient.models.simple_page import SimplePage
+from custom_utils.iter_util import chunked
+
+from .followers import TIMESTAMP_FORMAT
+from .page_store import PageStore, PAGESTOREFILE
+from .search_index import SearchIndex, SEARCHINDEXFILE
+
+
+# Number of seconds that wikis keep their recent changes by default ($wgRCMaxAge)
+RC_MAX_AGE = 90 * 24 * 60 * 60
+
+def sha1_base36_to_hex(sha1: str) -> Optional[str]:
+    """Convert a SHA-1 hash from the base 36 form of XML dumps to the hexadecimal form of the API."""
+    if not sha1:
+        return None
+    return '{:040x}'.format(int(sha1, 36))
+
+
+def _local_name(tag: str) -> str:
+    # "{http://www.mediawiki.org/xml/export-0.11/}page" -> "page"
+    return tag.rsplit('}', 1)[-1]
+
+
+class DumpPage(object):
+    """The latest revision of a page in an XML dump."""
+
+    def __init__(self, title: str, namespace: int, revid: int, timestamp: str, sha1: Optional[str], text: str):
+        self.title = title
+        self.namespace = namespace
+        self.revid = revid
+        self.timestamp = timestamp
+        self.sha1 = sha1
+        self.text = text
+
+    def to_simple_page(self) -> SimplePage:
+        return SimplePage(name=self.title, text=self.text, exists=True, revid=self.revid, sha1=self.sha1)
+
+
+def open_dump(filename: str):
+    """Open the dump file for reading bytes, decompressing ``.bz2`` and ``.gz`` files on the fly.
+
+    Returns the file object to parse and the raw file object, whose position is the number of bytes read from disk.
+    """
+
+    raw = open(filename, 'rb')
+    if filename.endswith('.bz2'):
+        return bz2.BZ2File(raw), raw
+    if filename.endswith('.gz'):
+        return gzip.GzipFile(fileobj=raw), raw
+    if filename.endswith('.7z'):
+        raw.close()
+        raise ValueError('7z archives are not supported; extract the XML file first, or recompress it with bzip2.')
+    return raw, raw
+
+
+def iter_dump_pages(f) -> Iterator[DumpPage]:
+    """Parse the MediaWiki XML export/dump in the file object ``f`` incrementally and yield the latest revision of
+    every page.
+
+    Memory usage doesn't depend on the size of the dump: every page is removed from the parse tree once it has been
+    yielded. Revisions without text (e.g. deleted ones) are skipped.
+    """
+
+    root = None
+    for event, element in ElementTree.iterparse(f, events=('start', 'end')):
+        if root is None:
+            root = element
+            continue
+        if event != 'end' or _local_name(element.tag) != 'page':
+            continue
+
+        title = namespace = None
+        latest = None
+        for child in element:
+            name = _local_name(child.tag)
+            if name == 'title':
+                title = child.text
+            elif name == 'ns':
+                namespace = int(child.text)
+            elif name == 'revision':
+                revision = {_local_name(node.tag): node for node in child}
+                text = revision.get('text')
+                if text is None or text.get('deleted') is not None:
+                    continue
+                revid = int(revision['id'].text)
+                if latest is None or revid > latest[0]:
+                    latest = (revid, revision, text.text or '')
+
+        if latest is not None and title is not None:
+            revid, revision, text = latest
+            sha1 = sha1_base36_to_hex(revision['sha1'].text if 'sha1' in revision else None)
+            if sha1 is None:
+                sha1 = hashlib.sha1(text.encode('utf-8')).hexdigest()
+            timestamp = revision['timestamp'].text if 'timestamp' in revision else None
+            yield DumpPage(title, namespace if namespace is not None else 0, revid, timestamp, sha1, text)
+
+        # drop the page (and everything before it) from the tree
+        root.clear()
+
+
+class DumpImporter(object):
+    """
+    Seeds the local page store (and optionally the search index) of a wiki from an XML dump, without any API requests.
+
+    Pages are written in batches. Pages whose stored revision is newer than the one in the dump are left alone, so
+    importing an old dump never overwrites newer data.
+
+    The search index follows the recent changes from the newest revision of the dump on. The wiki only keeps them for
+    ``rc_max_age`` seconds, so no namespace is marked as built from an older dump; the index has to be built from the
+    wiki instead.
+    """
+
+    def __init__(self, page_store: PageStore, search_index: SearchIndex = None, batch_size: int = 1000,
+                 log: Callable[[str], None] = None, report_interval: float = 10,
+                 complete_namespaces: Iterable[int] = None, rc_max_age: float = RC_MAX_AGE):
+        """
+        :param page_store: The page store to write the texts to.
+        :param search_index: Optional. The search index to add the pages to.
+        :param batch_size: Number of pages per write.
+        :param log: Optional. Function to report the progress with, e.g. ``print``.
+        :param report_interval: Seconds between two progress reports.
+        :param complete_namespaces: Optional. The namespaces that the dump contains completely (e.g. not only the
+        content pages). Those that have pages in the dump are marked as built in the search index afterwards.
+        :param rc_max_age: Number of seconds that the wiki keeps its recent changes.
+        """
+
+        self.page_store = page_store
+        self.search_index = search_index
+        self.batch_size = batch_size
+        self.log = log
+        self.report_interval = report_interval
+        self.complete_namespaces = set(complete_namespaces) if complete_namespaces is not None else set()
+        self.rc_max_age = rc_max_age
+        self.pages = 0
+        self.written = 0
+
+    def run(self, filename: str):
+        """Import the dump file (plain XML, ``.bz2``, or ``.gz``)."""
+
+        f, raw = open_dump(filename)
+        total_bytes = os.path.getsize(filename)
+        start = last_report = time.monotonic()
+        namespaces = set()
+        newest = None
+        try:
+            for batch in chunked(iter_dump_pages(f), self.batch_size):
+                self._write(batch)
+                for page in batch:
+                    namespaces.add(page.namespace)
+                    if page.timestamp is not None and (newest is None or page.timestamp > newest):
+                        newest = page.timestamp
+
+                now = time.monotonic()
+                if self.log and now - last_report >= self.report_interval:
+                    last_report = now
+                    self._report(raw.tell(), total_bytes, now - start)
+        finally:
+            f.close()
+            raw.close()
+
+        if self.search_index is not None:
+            self._mark_built(namespaces, newest)
+            self.search_index.compact()
+        if self.log:
+            self._report(total_bytes, total_bytes, time.monotonic() - start)
+
+    def _mark_built(self, namespaces: Set[int], newest: Optional[str]):
+        """Mark the complete namespaces of the dump as built in the search index, if the dump is recent enough."""
+
+        built = sorted(self.complete_namespaces & namespaces)
+        if not built:
+            return
+        if newest is None or time.time() - calendar.timegm(time.strptime(newest, TIMESTAMP_FORMAT)) > self.rc_max_age:
+            if self.log:
+                self.log('The dump is older than the recent changes of the wiki, so the changes since then are '
+                         'unknown. Not marking the namespaces {} as built; build the search index from the wiki '
+                         'instead.'.format(
+                         ', '.join(str(namespace) for namespace in built)))
+            return
+        self.search_index.mark_built(built, since=newest)
+
+    def _write(self, batch: List[DumpPage]):
+        self.pages += len(batch)
+        stored_revids = self.page_store.get_revids(page.title for page in batch)
+        newer = [page for page in batch if stored_revids.get(page.title, 0) < page.revid]
+        self.page_store.put_many(page.to_simple_page() for page in newer)
+        if self.search_index is not None:
+            self.search_index.add_pages([page.to_simple_page() for page in batch],
+                                        {page.title: page.namespace for page in batch}, only_newer=True)
+        self.written += len(newer)
+
+    def _report(self, bytes_read: int, total_bytes: int, seconds: float):
+        seconds = max(seconds, 1e-6)
+        self.log('{:,} pages ({:,} written), {:.1f}/{:.1f} MB ({:.0%}), {:.1f} MB/s, {:.0f} pages/s'.format(
+            self.pages, self.written, bytes_read / 1e6, total_bytes / 1e6, bytes_read / max(total_bytes, 1),
+            bytes_read / 1e6 / seconds, self.pages / seconds))
+
+
+def import_dump(filename: str, directory: str, search_index: bool = True, log: Callable[[str], None] = None,
+                complete_namespaces: Iterable[int] = None) -> Tuple[int, int]:
+    """Import the dump file into the local data of the wiki in the ``directory``.
+
+    ``complete_namespaces`` are the namespaces that the dump contains completely, see ``DumpImporter``.
+
+    Returns the number of pages in the dump and the number of pages written to the page store.
+    """
+
+    page_store = PageStore(os.path.join(directory, PAGESTOREFILE))
+    index = SearchIndex(None, os.path.join(directory, SEARCHINDEXFILE)) if search_index else None
+    try:
+        importer = DumpImporter(page_store, index, log=log, complete_namespaces=complete_namespaces)
+        importer.run(filename)
+        return (importer.pages, importer.written)
+    finally:
+        page_store.close()
+        if index is not None:
+            index.close()
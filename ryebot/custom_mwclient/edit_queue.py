@@ -0,0 +1,346 @@
+import json
+import os
+import queue
+import threading
+import zlib
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+
+from mwclient.errors import APIError
+
+from custom_mwclient.wiki_client import WikiClient
+from custom_utils.file_util import read_json_lines, write_json_lines_atomic
+
+
+# Name of the file in the wiki's localdata directory that holds the journal of the edit queue
+EDITJOURNALFILE = '.edits.journal.jsonl'
+
+SAVE = 'save'
+MOVE = 'move'
+DELETE = 'delete'
+TOUCH = 'touch'
+PURGE = 'purge'
+
+# errors that mean that a write from the journal was already sent before the process stopped
+_ALREADY_DONE_CODES = {
+    MOVE: {'articleexists', 'missingtitle'},
+    DELETE: {'missingtitle'},
+}
+
+
+def _matches(intent_params: dict, params: Optional[dict]) -> bool:
+    return params is None or all(intent_params.get(key) == value for key, value in params.items())
+
+
+class EditJournal(object):
+    """
+    Write-ahead journal of the writes of an ``EditQueue``, as a JSON Lines file.
+
+    Every write is recorded as an ``intent`` before it is sent, and as ``done`` or ``failed`` afterwards. The intents
+    without outcome are the writes that were queued or in flight when the process stopped. Without a filename, the
+    journal is only kept in memory.
+    """
+
+    def __init__(self, filename: str = None):
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._intents: Dict[int, dict] = {} # id -> intent, in the order of the journal
+        self._outcomes: Dict[int, str] = {} # id -> 'done' or 'failed'
+        self._done: Dict[tuple, List[dict]] = {} # (action, title) -> params of the done intents
+        self._pending: Dict[tuple, List[dict]] = {} # (action, title) -> intents without outcome
+        self._next_id = 1
+        self._file = None
+
+        if filename is None:
+            return
+        for record in read_json_lines(filename):
+            if record.get('op') == 'intent':
+                self._intents[record['id']] = record
+                self._pending.setdefault((record['action'], record['title']), []).append(record)
+                self._next_id = max(self._next_id, record['id'] + 1)
+            elif record.get('op') in ('done', 'failed'):
+                self._set_outcome(record['id'], record['op'])
+        self._file = open(filename, 'a', encoding='utf-8')
+        if self._file.tell() > 0:
+            # the last line might have been written only partially, so never continue it
+            self._file.write('\n')
+
+    def _set_outcome(self, intent_id: int, outcome: str):
+        self._outcomes[intent_id] = outcome
+        intent = self._intents.get(intent_id)
+        if intent is None:
+            return
+        pending = self._pending.get((intent['action'], intent['title']), [])
+        if intent in pending:
+            pending.remove(intent)
+        if outcome == 'done':
+            self._done.setdefault((intent['action'], intent['title']), []).append(intent['params'])
+
+    def _write(self, record: dict):
+        if self._file is None:
+            return
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def add_intent(self, action: str, title: str, params: dict) -> dict:
+        """Record a write that is about to be sent, and return its intent record."""
+
+        with self._lock:
+            intent = {'op': 'intent', 'id': self._next_id, 'action': action, 'title': title, 'params': params}
+            self._next_id += 1
+            self._write(intent)
+            self._intents[intent['id']] = intent
+            self._pending.setdefault((action, title), []).append(intent)
+            return intent
+
+    def add_outcome(self, intent_id: int, done: bool, error: str = None):
+        with self._lock:
+            record = {'op': 'done' if done else 'failed', 'id': intent_id}
+            if error is not None:
+                record['error'] = error
+            self._write(record)
+            self._set_outcome(intent_id, record['op'])
+
+    def pending(self) -> List[dict]:
+        """Return the intents that have no outcome yet, oldest first."""
+
+        with self._lock:
+            return [intent for intent_id, intent in self._intents.items() if intent_id not in self._outcomes]
+
+    def pending_intents(self, action: str, title: str, params: dict = None) -> List[dict]:
+        """Return the intents of the ``action`` on the ``title`` (and with the ``params``, if given) that have no
+        outcome yet, oldest first."""
+
+        with self._lock:
+            pending = self._pending.get((action, title), [])
+            return [intent for intent in pending if _matches(intent['params'], params)]
+
+    def is_done(self, action: str, title: str, params: dict = None) -> bool:
+        """Return whether a write of the ``action`` on the ``title`` (and with the ``params``, if given) is done."""
+
+        with self._lock:
+            return any(_matches(done_params, params) for done_params in self._done.get((action, title), []))
+
+    def compact(self):
+        """Rewrite the journal with only the pending intents, or remove it if there are none."""
+
+        pending = self.pending()
+        with self._lock:
+            self._intents = {intent['id']: intent for intent in pending}
+            self._outcomes = {}
+            self._done = {}
+            self._pending = {}
+            for intent in pending:
+                self._pending.setdefault((intent['action'], intent['title']), []).append(intent)
+            if self.filename is None:
+                return
+            self._file.close()
+            if pending:
+                write_json_lines_atomic(self.filename, pending)
+                self._file = open(self.filename, 'a', encoding='utf-8')
+            else:
+                os.remove(self.filename)
+                self._file = None
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class EditQueue(object):
+    """
+    Sends the writes of a bulk script (edits, moves, deletions, null-edits, purges) in the background.
+
+    The calling thread only queues the writes, so it can compute the next one while the previous ones are sent; the
+    writer threads send them as fast as the rate limiter of the wiki allows. Writes to the same title are always sent
+    in the order they were queued.
+
+    Every write is appended to a journal in the wiki's localdata directory before it is sent. If the process stops
+    before all writes were sent, the next ``EditQueue`` of the wiki sends the remaining ones first, and ``is_done``
+    tells the script which writes it doesn't have to compute again, e.g.::
+
+        with EditQueue(site) as edits:
+            for title in titles:
+                if edits.is_done('save', title):
+                    continue
+                edits.save(title, compute_new_text(title), summary='Update')
+
+    Queuing a write that is identical to one that is still queued (e.g. one resumed from the journal) doesn't send
+    it twice; the future of the queued write is returned instead. The journal is removed once all writes were sent
+    and the queue is closed.
+    """
+
+    def __init__(self, site: WikiClient, journal_file: Optional[str] = '', max_workers: int = 1, max_pending: int = 100,
+                 log=None, resume: bool = True):
+        """
+        :param site: The client of the wiki to write to.
+        :param journal_file: Full path of the journal file. Defaults to a file in the wiki's localdata directory, if
+        there is one. Use ``None`` to not persist the journal.
+        :param max_workers: Number of writer threads.
+        :param max_pending: Maximum number of queued writes per writer thread; queuing more blocks the caller.
+        :param log: Optional. Function to log failed writes with. Without it, they are only collected in ``errors``.
+        :param resume: Whether to send the writes that are still pending in the journal from an earlier run.
+        """
+
+        self.site = site
+        self.log = log
+        self.errors = []
+
+        if journal_file == '':
+            directory = site.localdata_directory
+            journal_file = os.path.join(directory, EDITJOURNALFILE) if directory is not None else None
+        self.journal = EditJournal(journal_file)
+
+        # futures of the intents that are queued or in flight, by intent ID
+        self._futures: Dict[int, Future] = {}
+        self._futures_lock = threading.Lock()
+        self._queues = [queue.Queue(maxsize=max_pending) for _ in range(max_workers)]
+        self._threads = [threading.Thread(target=self._work, args=(q,), name='EditQueue-{}'.format(i), daemon=True)
+                         for i, q in enumerate(self._queues)]
+        self._closed = False
+        for thread in self._threads:
+            thread.start()
+
+        if resume:
+            for intent in self.journal.pending():
+                future = self._futures[intent['id']] = Future()
+                self._put(intent, future, resumed=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def save(self, title: str, text: str, summary: str = u'', minor: bool = False, bot: bool = True, **kwargs) -> Future:
+        """Queue an edit, see ``WikiClient.save``. Returns a future that resolves once the edit was sent."""
+        return self._enqueue(SAVE, title, dict(text=text, summary=summary, minor=minor, bot=bot, **kwargs))
+
+    def move(self, title: str, new_title: str, reason: str = '', **kwargs) -> Future:
+        """Queue a move, see ``WikiClient.move``."""
+        return self._enqueue(MOVE, title, dict(new_title=new_title, reason=reason, **kwargs))
+
+    def delete(self, title: str, reason: str = '', **kwargs) -> Future:
+        """Queue a deletion, see ``WikiClient.delete``."""
+        return self._enqueue(DELETE, title, dict(reason=reason, **kwargs))
+
+    def touch(self, title: str, summary: str = u'') -> Future:
+        """Queue a null-edit, see ``WikiClient.touch``."""
+        return self._enqueue(TOUCH, title, dict(summary=summary))
+
+    def purge(self, title: str) -> Future:
+        """Queue a purge, see ``WikiClient.purge``."""
+        return self._enqueue(PURGE, title, {})
+
+    def is_done(self, action: str, title: str, **params) -> bool:
+        """Return whether the journal has a write of the ``action`` (e.g. ``save``) on the ``title`` that was sent,
+        or that is queued to be sent (e.g. because it was resumed from an earlier run).
+
+        If ``params`` are given (e.g. ``text``), only a write with exactly these parameters counts.
+        """
+
+        if self.journal.is_done(action, title, params or None):
+            return True
+        with self._futures_lock:
+            return any(intent['id'] in self._futures for intent in self.journal.pending_intents(action, title, params or None))
+
+    def _enqueue(self, action: str, title: str, params: dict) -> Future:
+        if self._closed:
+            raise RuntimeError('The edit queue is closed.')
+        # compare with the parameters as they are stored in the journal
+        stored_params = json.loads(json.dumps(params))
+        with self._futures_lock:
+            intent = None
+            for pending_intent in self.journal.pending_intents(action, title, stored_params):
+                if pending_intent['params'] == stored_params:
+                    intent = pending_intent
+                    break
+            if intent is not None and intent['id'] in self._futures:
+                return self._futures[intent['id']]
+            if intent is None:
+                intent = self.journal.add_intent(action, title, params)
+            # else: pending in the journal, but not resumed; send it now instead of journaling it again
+            future = self._futures[intent['id']] = Future()
+        self._put(intent, future)
+        return future
+
+    def _put(self, intent: dict, future: Future, resumed: bool = False):
+        # the same title always goes to the same writer, so that its writes stay in order
+        worker = zlib.crc32(intent['title'].encode('utf-8')) % len(self._queues)
+        self._queues[worker].put((intent, future, resumed))
+
+    def _work(self, q: queue.Queue):
+        while True:
+            item = q.get()
+            try:
+                if item is None:
+                    return
+                intent, future, resumed = item
+                if not future.set_running_or_notify_cancel():
+                    with self._futures_lock:
+                        self._futures.pop(intent['id'], None)
+                    continue
+                try:
+                    result = self._send(intent, resumed)
+                except Exception as e:
+                    self._add_outcome(intent, done=False, error=repr(e))
+                    self.errors.append((intent, e))
+                    if self.log:
+                        self.log('\n***ERROR*** while sending {} of {}'.format(intent['action'], intent['title']))
+                        self.log(exc_info=True, s='Error message:\n')
+                    future.set_exception(e)
+                else:
+                    self._add_outcome(intent, done=True)
+                    future.set_result(result)
+            finally:
+                q.task_done()
+
+    def _add_outcome(self, intent: dict, done: bool, error: str = None):
+        # together, so that _enqueue never sees the intent as pending without its future
+        with self._futures_lock:
+            self.journal.add_outcome(intent['id'], done=done, error=error)
+            self._futures.pop(intent['id'], None)
+
+    def _send(self, intent: dict, resumed: bool):
+        action, params = intent['action'], dict(intent['params'])
+        page = self.site.lazy_page(intent['title'])
+        try:
+            if action == SAVE:
+                return self.site.save(page, params.pop('text'), **params)
+            if action == MOVE:
+                return self.site.move(page, params.pop('new_title'), **params)
+            if action == DELETE:
+                return self.site.delete(page, **params)
+            if action == TOUCH:
+                return self.site.touch(page, **params)
+            if action == PURGE:
+                return self.site.purge(page)
+        except APIError as e:
+            # the write might have been sent before the process stopped, just not recorded as done
+            if resumed and e.code in _ALREADY_DONE_CODES.get(action, ()):
+                return None
+            raise
+        raise ValueError('Unknown action in the edit journal: {}'.format(action))
+
+    def join(self):
+        """Block until all queued writes were sent."""
+
+        for q in self._queues:
+            q.join()
+
+    def close(self):
+        """Send all queued writes, stop the writer threads, and compact the journal."""
+
+        if self._closed:
+            return
+        self._closed = True
+        self.join()
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join()
+        self.journal.compact()
+        self.journal.close()
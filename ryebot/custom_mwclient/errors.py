@@ -33,4 +33,15 @@ class RetriedLoginAndStillFailed(AssertUserFailedError):
 
 
 class InvalidNamespaceName(KeyError):
-    pass
\ No newline at end of file
+    pass
+
+
+class CircuitOpen(RetriedLoginAndStillFailed):
+    def __init__(self, action, wiki, retry_in):
+        super().__init__(action, [])
+        self.wiki = wiki
+        self.retry_in = retry_in
+
+    def __str__(self):
+        return "Too many failed retries on {}, not attempting any more for {:.0f} seconds. Attempted action: {}".format(
+            self.wiki, self.retry_in, self.action)
@@ -1,9 +1,16 @@
+import json
+import os
+
 from mwclient import InvalidResponse
-from typing import Union, List
+from typing import Optional, Union, Iterable, Iterator, List, Tuple
 
+from custom_mwclient.models.simple_page import SimplePage
 from custom_utils.string_util import str_to_list
+from custom_utils.text_search import TextMatch, TextSearcher, search_pages
 
 from .auth_credentials import AuthCredentials
+from .crawler import crawl_titles
+from .search_index import SearchIndex, SEARCHINDEXFILE
 from .site import Site
 from .wiki_client import WikiClient
 
@@ -28,10 +35,21 @@ class FandomClient(WikiClient):
 
         url = '{}.fandom.com'.format(wiki)
         self.lang = '/' + ('' if lang is None else lang + '/')
-        super().__init__(url=url, path=self.lang, credentials=credentials, client=client, **kwargs)
-
-    def relog(self):
-        super().relog()
+        wikiname = wiki if lang is None else '{}/{}'.format(wiki, lang)
+        self._search_index = None
+        super().__init__(url=url, path=self.lang, credentials=credentials, client=client, wikiname=wikiname, **kwargs)
+
+    @property
+    def search_index(self) -> Optional[SearchIndex]:
+        """The local search index of this wiki (see ``search_namespace``), or ``None`` if there is no localdata directory for it."""
+        if self._search_index is None:
+            directory = self.localdata_directory
+            if directory is not None:
+                self._search_index = SearchIndex(self, os.path.join(directory, SEARCHINDEXFILE))
+        return self._search_index
+
+    def relog(self, generation: int = None):
+        super().relog(generation)
 
     def login(self):
         if self.credentials is None:
@@ -42,39 +60,106 @@ class FandomClient(WikiClient):
             self.url = self.url.replace('gamepedia', 'fandom')
             self.relog()
 
-    def search(self, search_term: str, title_list: List[str], limit: int = 500):
+    def search(self, search_term: Union[str, Iterable[str]], title_list: Iterable[str], limit: int = 500,
+               max_workers: int = 4, regex: bool = False, ignore_case: bool = False, jsonl_file: str = None,
+               processes: int = 0):
         """
         Searches a specified list of titles for a given term. A replacement for Fandom's lack of insource search.
 
-        This method paginates the requests to fetch page sources, so it's relatively efficient, especially if you are
-        logged in as an administrator with apihighlimits.
+        This method paginates the requests to fetch page sources and runs several of them at once, so it's relatively
+        efficient, especially if you are logged in as an administrator with apihighlimits.
 
-        :param search_term: The term to search
+        Prints the names of the pages with matches; see ``iter_search`` for the matches themselves.
+
+        :param search_term: The term to search, or a list of terms to search at once.
         :param title_list: A list of page titles.
         :param limit: The pagination limit when querying for page texts. If you are logged out or not a systop, probably 50.
+        :param max_workers: The maximum number of page text requests in flight.
+        :param regex: Whether the terms are regular expressions.
+        :param ignore_case: Whether to match the terms case-insensitively.
+        :param jsonl_file: Optional. Full path of a file to write every match to, as one JSON object per line.
+        :param processes: Optional. Number of worker processes to match the texts in, see ``text_search.search_pages``.
         :return:
         """
 
-        # TODO: Add regex support
-
-        page_list = self.get_simple_pages(title_list, limit=limit)
-        for page in page_list:
-            if search_term in page.text:
+        jsonl = open(jsonl_file, 'w', encoding='utf-8') if jsonl_file is not None else None
+        try:
+            for page, matches in self.iter_search(search_term, title_list, limit=limit, max_workers=max_workers,
+                                                  regex=regex, ignore_case=ignore_case, processes=processes):
                 print(page.name)
+                if jsonl is not None:
+                    for match in matches:
+                        jsonl.write(json.dumps(dict(title=page.name, **match.to_dict()), ensure_ascii=False) + '\n')
+                    jsonl.flush()
+        finally:
+            if jsonl is not None:
+                jsonl.close()
+
+    def iter_search(self, search_term: Union[str, Iterable[str]], title_list: Iterable[str], limit: int = 500,
+                    max_workers: int = 4, regex: bool = False, ignore_case: bool = False, context: int = 40,
+                    processes: int = 0) -> Iterator[Tuple[SimplePage, List[TextMatch]]]:
+        """
+        Searches a specified list of titles for one or many terms at once, and yields ``(page, matches)`` for every
+        page with matches, as soon as it is fetched.
 
-    def search_namespace(self, search_term: str, namespace: Union[int, str], limit: int = 500):
+        All terms are matched in a single pass over each page text (see ``text_search.TextSearcher``), while the next
+        page texts are being fetched. The parameters are as in ``search``; ``context`` is the number of characters
+        around each match that are kept.
+        """
+
+        terms = [search_term] if isinstance(search_term, str) else list(search_term)
+        if regex:
+            searcher = TextSearcher(regexes=terms, ignore_case=ignore_case, context=context)
+        else:
+            searcher = TextSearcher(patterns=terms, ignore_case=ignore_case, context=context)
+        pages = self.iter_simple_pages(title_list, limit=limit, max_workers=max_workers)
+        yield from search_pages(searcher, pages, processes=processes)
+
+    def search_namespace(self, search_term: Union[str, Iterable[str]], namespace: Union[int, str], limit: int = 500,
+                         use_index: bool = True, verify: bool = True, max_age: float = 300, **kwargs):
         """
         Searches a specified namespace for a search term.
 
+        If the namespace is in the local search index (see ``SearchIndex.build``), the candidates are looked up there,
+        without downloading any page. Otherwise, or for regexes, every page of the namespace is searched.
+
         If you want to search the entire wiki, use search instead.
-        :param search_term: The term to search
+        :param search_term: The term to search, or a list of terms to search at once.
         :param namespace: The namespace within which to search for the term.
         :param limit: The pagination limit when querying for page texts. If you are logged out or not a systop, probably 50.
+        :param use_index: Whether to use the local search index, if it has the namespace.
+        :param verify: Whether to download the candidates from the index and search them like ``search``, so that only
+        the pages that contain the term are printed. Without it, all candidates are printed: the index is
+        case-insensitive and only knows the words of each page, so these also include pages that don't contain the
+        term, and ``ignore_case`` doesn't apply. A ``jsonl_file`` needs the matches, so the candidates are always
+        verified if it is given.
+        :param max_age: Update the index from the recent changes first if its last update is older than this many seconds.
+        :param kwargs: Passed on to ``search``, e.g. ``regex=True``.
         :return:
         """
         if isinstance(namespace, str):
             namespace = self.get_ns_number(namespace)
-        self.search(search_term, self.client.allpages(namespace=namespace, generator=False), limit=limit)
+
+        index = self.search_index if use_index and not kwargs.get('regex') else None
+        if index is not None and index.has_namespace(namespace):
+            index.update(max_age=max_age, limit=limit)
+            terms = [search_term] if isinstance(search_term, str) else list(search_term)
+            candidates = set()
+            for term in terms:
+                titles = index.search(term, namespace)
+                if titles is None:
+                    break
+                candidates.update(titles)
+            else:
+                if verify or kwargs.get('jsonl_file') is not None:
+                    self.search(search_term, sorted(candidates), limit=limit, **kwargs)
+                else:
+                    for title in sorted(candidates):
+                        print(title)
+                return
+
+        titles = crawl_titles(self, namespace)
+        self.search(search_term, titles, limit=limit, **kwargs)
 
 
     ##### Wiki-specific functions
@@ -94,7 +179,9 @@ class FandomClient(WikiClient):
 
         wikis = []
         try:
-            valid_wikis = str_to_list(self.client.expandtemplates(text='{{langList|offWiki}}')) # dynamic list
+            valid_wikis = str_to_list(self.siteinfo.get_extra(
+                'langList|offWiki', lambda: self.client.expandtemplates(text='{{langList|offWiki}}')
+            )) # dynamic list
         except KeyboardInterrupt:
             raise
         except:
@@ -0,0 +1,147 @@
+import datetime
+import os
+import time
+from typing import Iterator, Optional
+
+from custom_mwclient.wiki_client import WikiClient
+
+from .checkpoint import Checkpoint
+
+
+# Names of the files in the wiki's localdata directory that hold the positions of the followers
+RECENTCHANGESCHECKPOINTFILE = '.recentchanges.checkpoint'
+LOGEVENTSCHECKPOINTFILE = '.logevents.checkpoint'
+
+# Number of seconds before the newest consumed event that are polled again, for events that are inserted late with an
+# earlier timestamp (e.g. due to replication lag)
+OVERLAP_SECONDS = 300
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+
+class _Follower(object):
+    """
+    Tails a list of the API that is ordered by timestamp, oldest first, from a persistent checkpoint.
+
+    The checkpoint holds the timestamp of the newest consumed event and the IDs of all consumed events of the
+    ``OVERLAP_SECONDS`` before it. Each poll starts that far before the timestamp and skips the events by their IDs, so
+    that every event is yielded once, even if it was inserted after newer ones, and even across restarts of the process.
+    """
+
+    list_name = None
+    prefix = None
+    id_key = None
+    required_props = ('ids', 'timestamp')
+    default_checkpoint_file = None
+
+    def __init__(self, site: WikiClient, checkpoint_file: Optional[str] = '', start: datetime.datetime = None,
+                 prop: str = None, **kwargs):
+        """
+        :param site: The client of the wiki to follow.
+        :param checkpoint_file: Full path of the checkpoint file. Defaults to a file in the wiki's localdata directory,
+        if there is one. Use ``None`` to not persist the checkpoint.
+        :param start: Optional. Where to start if there is no checkpoint yet. Defaults to the current time, i.e. only
+        new events are followed.
+        :param prop: Optional. The properties of the events to query (without prefix); the IDs and timestamp are
+        always added.
+        :param kwargs: Additional parameters of the list query, with prefix (e.g. ``rcnamespace`` or ``letype``).
+        """
+
+        self.site = site
+        self.kwargs = kwargs
+        props = prop.split('|') if prop else []
+        props += [p for p in self.required_props if p not in props]
+        self.prop = '|'.join(props)
+
+        if checkpoint_file == '':
+            directory = site.localdata_directory
+            checkpoint_file = os.path.join(directory, self.default_checkpoint_file) if directory is not None else None
+        self.checkpoint = Checkpoint(checkpoint_file)
+        if self.checkpoint.get('timestamp') is None:
+            start = start or datetime.datetime.utcnow()
+            self.checkpoint.update(timestamp=start.strftime(TIMESTAMP_FORMAT), seen={})
+
+    def _seen(self) -> dict:
+        """The IDs (as strings) of the consumed events in the overlap, mapped to their timestamps."""
+
+        if 'seen' not in self.checkpoint.state:
+            # checkpoint of an older version, with only the IDs of the events at its timestamp
+            timestamp = self.checkpoint.get('timestamp')
+            self.checkpoint.update(seen={str(id_): timestamp for id_ in self.checkpoint.state.pop('ids', [])})
+        return self.checkpoint.get('seen')
+
+    def _overlap_start(self) -> str:
+        timestamp = datetime.datetime.strptime(self.checkpoint.get('timestamp'), TIMESTAMP_FORMAT)
+        return (timestamp - datetime.timedelta(seconds=OVERLAP_SECONDS)).strftime(TIMESTAMP_FORMAT)
+
+    def _is_consumed(self, event: dict) -> bool:
+        return str(event[self.id_key]) in self._seen()
+
+    def _consume(self, event: dict):
+        """Record the event as consumed, in memory; ``_trim`` and save the checkpoint after each batch."""
+
+        self._seen()[str(event[self.id_key])] = event['timestamp']
+        if event['timestamp'] > self.checkpoint.get('timestamp'):
+            self.checkpoint.update(timestamp=event['timestamp'])
+
+    def _trim(self):
+        """Forget the IDs of the consumed events before the overlap, which the next poll doesn't return anymore."""
+
+        start = self._overlap_start()
+        self.checkpoint.update(seen={id_: timestamp for id_, timestamp in self._seen().items() if timestamp >= start})
+
+    def poll(self) -> Iterator[dict]:
+        """Yield all events since the checkpoint, oldest first.
+
+        The checkpoint moves past an event once the consumer asks for the next one, and is saved after each batch of
+        the API, so the events of the batch that was being processed when the process stopped are yielded again after
+        the restart.
+        """
+
+        params = {
+            'list': self.list_name,
+            self.prefix + 'dir': 'newer',
+            self.prefix + 'limit': 'max',
+            self.prefix + 'prop': self.prop,
+            self.prefix + 'start': self._overlap_start(),
+        }
+        params.update(self.kwargs)
+        try:
+            for batch in self.site.api_continue_iter('query', **params):
+                events = sorted(batch.get(self.list_name, []),
+                                key=lambda event: (event['timestamp'], event[self.id_key]))
+                for event in events:
+                    if self._is_consumed(event):
+                        continue
+                    yield event
+                    self._consume(event)
+                self._trim()
+                self.checkpoint.save()
+        finally:
+            # keep the events that were consumed before the consumer stopped, e.g. with ``break``
+            self.checkpoint.save()
+
+    def follow(self, poll_interval: float = 60) -> Iterator[dict]:
+        """Yield the events forever, polling the API every ``poll_interval`` seconds."""
+
+        while True:
+            yield from self.poll()
+            time.sleep(poll_interval)
+
+
+class RecentChangesFollower(_Follower):
+    """Follows the recent changes of a wiki, see ``_Follower``."""
+
+    list_name = 'recentchanges'
+    prefix = 'rc'
+    id_key = 'rcid'
+    default_checkpoint_file = RECENTCHANGESCHECKPOINTFILE
+
+
+class LogFollower(_Follower):
+    """Follows the log events of a wiki, see ``_Follower``."""
+
+    list_name = 'logevents'
+    prefix = 'le'
+    id_key = 'logid'
+    default_checkpoint_file = LOGEVENTSCHECKPOINTFILE
@@ -0,0 +1,132 @@
+import threading
+import weakref
+from typing import Iterable, List
+
+from mwclient.errors import InvalidPageTitle
+from mwclient.image import Image
+from mwclient.listing import Category
+from mwclient.page import Page
+
+from custom_utils.iter_util import chunked
+
+
+class LazyPage(object):
+    """
+    Stand-in for an mwclient page object that is only created when it is first used.
+
+    Creating an mwclient page sends an info query for it right away. A lazy page defers that, and the first access to
+    any of its attributes loads all pending lazy pages of the same loader together, in batches of titles. After that,
+    all attribute accesses go to the real page object.
+    """
+
+    def __init__(self, loader: 'PageLoader', title: str):
+        self._loader = loader
+        self._title = title
+        self._page = None
+        self._error = None
+
+    @property
+    def name(self) -> str:
+        """The title of the page. This is the normalized title once the page was loaded, and doesn't load it."""
+        return self._page.name if self._page is not None else self._title
+
+    @property
+    def loaded(self) -> bool:
+        return self._page is not None or self._error is not None
+
+    def get_page(self) -> Page:
+        """Return the mwclient page object, loading it (and all other pending lazy pages) first if necessary."""
+        # not a property, so that an AttributeError while loading isn't mistaken for a missing attribute
+        if not self.loaded:
+            self._loader.load(self)
+        if self._error is not None:
+            raise self._error
+        return self._page
+
+    def _set(self, page: Page = None, error: Exception = None):
+        self._page = page
+        self._error = error
+
+    def __getattr__(self, name):
+        # only called for attributes that aren't defined on the lazy page itself
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.get_page(), name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.get_page(), name, value)
+
+    def __repr__(self):
+        if self._page is not None:
+            return repr(self._page)
+        return '<LazyPage object \'{}\' (not loaded)>'.format(self._title)
+
+
+class PageLoader(object):
+    """Creates lazy pages for a wiki and loads the pending ones in batches."""
+
+    def __init__(self, site):
+        """
+        :param site: The ``WikiClient`` to load the pages with. Its current site object is used for every batch,
+        so pages loaded after a relog use the new session.
+        """
+        self.site = site
+        self._pending: List[weakref.ref] = []
+        self._lock = threading.RLock()
+
+    def page(self, title: str) -> LazyPage:
+        lazy_page = LazyPage(self, title)
+        with self._lock:
+            # lazy pages that are dropped without ever being used don't need to be loaded
+            self._pending.append(weakref.ref(lazy_page))
+        return lazy_page
+
+    def pages(self, titles: Iterable[str]) -> List[LazyPage]:
+        return [self.page(title) for title in titles]
+
+    def load(self, lazy_page: LazyPage = None):
+        """Load all pending lazy pages, and the ``lazy_page`` if it isn't pending (anymore)."""
+
+        with self._lock:
+            pending = [page for page in (ref() for ref in self._pending) if page is not None]
+            self._pending = []
+            if lazy_page is not None and lazy_page not in pending:
+                pending.append(lazy_page)
+
+            by_title = {}
+            for page in pending:
+                if not page.loaded:
+                    by_title.setdefault(page._title, []).append(page)
+            for titles in chunked(by_title, self.site.max_titles):
+                self._load_batch(titles, by_title)
+
+    def _load_batch(self, titles: List[str], by_title: dict):
+        client = self.site.client
+        result = client.get('query', prop='info', inprop='protection', titles='|'.join(titles))
+        # the API returns the pages keyed by ID and with normalized titles, so map them back to our input titles
+        info_by_title = {info['title']: info for info in result['query'].get('pages', {}).values()}
+        title_map = {}
+        for key in ('normalized', 'converted'):
+            for entry in result['query'].get(key, []):
+                title_map[entry['from']] = entry['to']
+
+        for title in titles:
+            name = title_map.get(title, title)
+            name = title_map.get(name, name) # normalized titles might have been converted as well
+            info = info_by_title.get(name)
+            for lazy_page in by_title[title]:
+                if info is None:
+                    lazy_page._set(error=InvalidPageTitle(title))
+                    continue
+                try:
+                    lazy_page._set(page=self._create_page(client, info))
+                except InvalidPageTitle as e:
+                    lazy_page._set(error=e)
+
+    @staticmethod
+    def _create_page(client, info: dict) -> Page:
+        cls = {14: Category, 6: Image}.get(info.get('ns', 0), Page)
+        return cls(client, info['title'], info)
@@ -6,7 +6,7 @@ class LogEntry(object):
         self.site = site
         self.log_type = log['type']
         self.title = log['title']
-        self.page = site.client.pages[self.title]
+        self.page = site.lazy_page(self.title)
         self.logid = log['logid']
         self.comment = log['comment']
         self.user = log['user']
\ No newline at end of file
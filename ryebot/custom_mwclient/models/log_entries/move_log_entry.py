@@ -6,4 +6,4 @@ class MoveLogEntry(LogEntry):
     def __init__(self, log, site: WikiClient):
         super().__init__(log, site)
         self.title = log['params']['target_title']
-        self.page = site.client.pages[self.title]
\ No newline at end of file
+        self.page = site.lazy_page(self.title)
\ No newline at end of file
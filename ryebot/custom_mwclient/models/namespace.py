@@ -1,8 +1,10 @@
 class Namespace(object):
-    """A data container holding the id, name, canonical name, and aliases of a namespace. Not capable of any operations."""
+    """A data container holding the id, name, canonical name, aliases, and case rule of a namespace. Not capable of any operations."""
 
-    def __init__(self, id_number: int = None, name: str = None, canonical_name: str = None, aliases: list = None):
+    def __init__(self, id_number: int = None, name: str = None, canonical_name: str = None, aliases: list = None,
+                 case: str = None):
         self.id = id_number
         self.name = name
         self.canonical_name = canonical_name
-        self.aliases = aliases or []
\ No newline at end of file
+        self.aliases = aliases or []
+        self.case = case # 'first-letter' or 'case-sensitive'
\ No newline at end of file
@@ -1,7 +1,9 @@
 class SimplePage:
-    """A data container holding the name of a page and its text. Not capable of any operations."""
+    """A data container holding the name of a page, its text, and its latest revision. Not capable of any operations."""
 
-    def __init__(self, name: str, text: str, exists: bool):
+    def __init__(self, name: str, text: str, exists: bool, revid: int = None, sha1: str = None):
         self.name = name
         self.text = text
-        self.exists = exists
\ No newline at end of file
+        self.exists = exists
+        self.revid = revid
+        self.sha1 = sha1
\ No newline at end of file
@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from custom_mwclient.models.simple_page import SimplePage
+
+
+# Name of the file in the wiki's localdata directory that holds the stored page texts
+PAGESTOREFILE = '.pages.sqlite3'
+
+# Maximum number of SQL variables per statement (SQLite's default limit is 999)
+_MAX_VARIABLES = 900
+
+
+class PageStore(object):
+    """
+    Persistent storage of page texts, keyed by title and revision ID.
+
+    The store doesn't know whether its contents are up to date; the WikiClient compares the stored revision IDs
+    with the current ones on the wiki before serving any text from here.
+    """
+
+    def __init__(self, filename: str):
+        """
+        Open (and create, if necessary) the page store.
+        :param filename: Full path of the SQLite database file
+        """
+
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        with self._lock, self._connection:
+            # WAL allows other processes on the same wiki to read while we write
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS pages (title TEXT PRIMARY KEY, revid INTEGER NOT NULL, sha1 TEXT, text TEXT NOT NULL)'
+            )
+
+    def get(self, title: str) -> Optional[SimplePage]:
+        """Return the stored page with the given ``title``, or ``None`` if there is none."""
+
+        return self.get_many([title]).get(title)
+
+    def get_many(self, titles: Iterable[str]) -> Dict[str, SimplePage]:
+        """Return a dict of all stored pages with any of the ``titles``, keyed by title."""
+
+        titles = list(titles)
+        pages = {}
+        with self._lock:
+            for i in range(0, len(titles), _MAX_VARIABLES):
+                chunk = titles[i:i + _MAX_VARIABLES]
+                rows = self._connection.execute(
+                    'SELECT title, revid, sha1, text FROM pages WHERE title IN ({})'.format(','.join('?' * len(chunk))),
+                    chunk
+                )
+                for title, revid, sha1, text in rows:
+                    pages[title] = SimplePage(name=title, text=text, exists=True, revid=revid, sha1=sha1)
+        return pages
+
+    def get_revids(self, titles: Iterable[str]) -> Dict[str, int]:
+        """Return a dict of the stored revision IDs of any of the ``titles``, without loading their texts."""
+
+        titles = list(titles)
+        revids = {}
+        with self._lock:
+            for i in range(0, len(titles), _MAX_VARIABLES):
+                chunk = titles[i:i + _MAX_VARIABLES]
+                rows = self._connection.execute(
+                    'SELECT title, revid FROM pages WHERE title IN ({})'.format(','.join('?' * len(chunk))),
+                    chunk
+                )
+                revids.update(rows)
+        return revids
+
+    def get_sha1s(self, titles: Iterable[str]) -> Dict[str, Tuple[int, str]]:
+        """Return a dict of the stored revision IDs and SHA-1 hashes of any of the ``titles``, without loading their texts."""
+
+        titles = list(titles)
+        hashes = {}
+        with self._lock:
+            for i in range(0, len(titles), _MAX_VARIABLES):
+                chunk = titles[i:i + _MAX_VARIABLES]
+                rows = self._connection.execute(
+                    'SELECT title, revid, sha1 FROM pages WHERE title IN ({})'.format(','.join('?' * len(chunk))),
+                    chunk
+                )
+                for title, revid, sha1 in rows:
+                    hashes[title] = (revid, sha1)
+        return hashes
+
+    def put(self, page: SimplePage):
+        """Store the text of the ``page``, replacing any older revision of it."""
+
+        self.put_many([page])
+
+    def put_many(self, pages: Iterable[SimplePage]):
+        """Store the texts of all ``pages`` in a single transaction. Pages that don't exist are removed instead."""
+
+        pages = list(pages)
+        with self._lock, self._connection:
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO pages (title, revid, sha1, text) VALUES (?, ?, ?, ?)',
+                [(page.name, page.revid, page.sha1, page.text) for page in pages if page.exists]
+            )
+            self._connection.executemany(
+                'DELETE FROM pages WHERE title = ?',
+                [(page.name,) for page in pages if not page.exists]
+            )
+
+    def remove(self, titles: Iterable[str]):
+        """Remove the pages with any of the ``titles`` from the store."""
+
+        with self._lock, self._connection:
+            self._connection.executemany('DELETE FROM pages WHERE title = ?', [(title,) for title in titles])
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,143 @@
+import threading
+import time
+from typing import Dict
+
+READ = 'read'
+WRITE = 'write'
+
+
+class TokenBucket(object):
+    """A token bucket that refills with ``rate`` tokens per second, up to ``burst`` tokens."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take one token and return the number of seconds to wait until it is actually available."""
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class AdaptiveRateLimiter(object):
+    """
+    Throttles the requests to one host, with separate rates for reads and writes.
+
+    The rates adapt to the server: every successful request increases its rate a little (up to a maximum), and
+    every throttling response (replication lag above ``maxlag``, HTTP 429, or a "ratelimited" API error) halves it
+    and pauses all requests of that kind for as long as the server's ``Retry-After`` header asks for.
+    """
+
+    def __init__(self, read_rate: float = 10.0, write_rate: float = 1.0,
+                 max_read_rate: float = 50.0, max_write_rate: float = 10.0, min_rate: float = 0.1):
+        """
+        :param read_rate: Initial number of read requests per second.
+        :param write_rate: Initial number of write requests per second.
+        :param max_read_rate: Upper bound for the read rate.
+        :param max_write_rate: Upper bound for the write rate.
+        :param min_rate: Lower bound for both rates.
+        """
+
+        self.min_rate = min_rate
+        self.max_rates = {READ: max_read_rate, WRITE: max_write_rate}
+        self.buckets = {
+            READ: TokenBucket(read_rate, burst=max(1.0, read_rate)),
+            WRITE: TokenBucket(write_rate, burst=1.0),
+        }
+        self._blocked_until = {READ: 0.0, WRITE: 0.0}
+        self._waited = {READ: 0.0, WRITE: 0.0}
+        self._requests = {READ: 0, WRITE: 0}
+        self._throttled = {READ: 0, WRITE: 0}
+        self._lag = None
+        self._lock = threading.Lock()
+        # kind of the request that the current thread is performing, see Site.raw_call
+        self.current = threading.local()
+
+    def acquire(self, kind: str) -> float:
+        """Block until a request of the ``kind`` (``read`` or ``write``) may be sent. Returns the number of seconds waited."""
+
+        wait = self.reserve(kind)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def reserve(self, kind: str) -> float:
+        """Reserve a request of the ``kind`` and return the number of seconds to wait before sending it, without blocking."""
+
+        wait = self.buckets[kind].reserve()
+        with self._lock:
+            wait = max(wait, self._blocked_until[kind] - time.monotonic(), 0.0)
+            self._requests[kind] += 1
+            self._waited[kind] += wait
+        return wait
+
+    def on_success(self, kind: str):
+        bucket = self.buckets[kind]
+        with self._lock:
+            bucket.rate = min(self.max_rates[kind], bucket.rate + self.max_rates[kind] / 100)
+
+    def on_throttled(self, kind: str, retry_after: float = None, lag: float = None):
+        bucket = self.buckets[kind]
+        with self._lock:
+            bucket.rate = max(self.min_rate, bucket.rate / 2)
+            self._throttled[kind] += 1
+            if lag is not None:
+                self._lag = lag
+            if retry_after:
+                self._blocked_until[kind] = max(self._blocked_until[kind], time.monotonic() + retry_after)
+
+    def observe_response(self, response, *args, **kwargs):
+        """Response hook for a ``requests.Session`` that adjusts the rates to the server's feedback."""
+
+        self.observe(getattr(self.current, 'kind', READ), response.status_code, response.headers)
+
+    def observe(self, kind: str, status_code: int, headers):
+        """Adjust the rate of the ``kind`` to the status code and headers of a response."""
+
+        lag = headers.get('X-Database-Lag')
+        retry_after = headers.get('Retry-After')
+        try:
+            retry_after = float(retry_after) if retry_after is not None else None
+        except ValueError:
+            # Retry-After might also be an HTTP date, so just use a safe default
+            retry_after = 5.0
+        if lag is not None or status_code == 429:
+            self.on_throttled(kind, retry_after=retry_after, lag=float(lag) if lag is not None else None)
+        elif status_code == 200:
+            self.on_success(kind)
+
+    def metrics(self) -> Dict[str, float]:
+        """Return the current rates, the number of requests and throttling responses, and the time spent waiting."""
+
+        with self._lock:
+            result = {}
+            for kind in (READ, WRITE):
+                result[f'{kind}_rate'] = self.buckets[kind].rate
+                result[f'{kind}_requests'] = self._requests[kind]
+                result[f'{kind}_throttled'] = self._throttled[kind]
+                result[f'{kind}_waited_seconds'] = self._waited[kind]
+            result['last_lag'] = self._lag
+            return result
+
+
+_rate_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(host: str) -> AdaptiveRateLimiter:
+    """Return the rate limiter of the ``host``, which is shared by all site objects of this process."""
+
+    with _rate_limiters_lock:
+        if host not in _rate_limiters:
+            _rate_limiters[host] = AdaptiveRateLimiter()
+        return _rate_limiters[host]
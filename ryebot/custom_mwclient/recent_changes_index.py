@@ -0,0 +1,129 @@
+import copy
+import json
+import sqlite3
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+from custom_mwclient.wiki_client import WikiClient
+
+from .followers import RecentChangesFollower
+
+
+class RecentChangesIndex(object):
+    """
+    Base class of the local indexes of a wiki (see ``SearchIndex`` and ``TransclusionIndex``) that are stored in an
+    SQLite database and kept current by following the recent changes.
+
+    The database has a ``meta`` table with the namespaces that were built completely, the time of the last update, and
+    the position in the recent changes. Building a namespace starts following the recent changes at the time before the
+    crawl, so the changes during the crawl are applied by the next update. An update saves the new position after it
+    applied the changes, in a separate transaction; if the process stops in between, the next update applies some of
+    the changes again, which is harmless. If applying the changes fails, the position stays where it was, so the next
+    update polls the same changes again.
+    """
+
+    def __init__(self, site: Optional[WikiClient], filename: str):
+        """
+        :param site: The client of the wiki. Only needed for building and updating the index.
+        :param filename: Full path of the SQLite database file.
+        """
+
+        self.site = site
+        self.filename = filename
+        self._lock = threading.RLock()
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self._create_tables()
+
+        self._follower = RecentChangesFollower(site, checkpoint_file=None, prop='title|loginfo',
+                                               rctype='edit|new|log')
+        checkpoint = self._get_meta('checkpoint')
+        if checkpoint is not None:
+            self._follower.checkpoint.update(**checkpoint)
+
+    def _create_tables(self):
+        """Create the tables of the index, if they don't exist yet. Called in a transaction."""
+
+    def _get_meta(self, key: str, default=None):
+        row = self._connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def _set_meta(self, key: str, value):
+        self._connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    @property
+    def namespaces(self) -> List[int]:
+        """The namespaces that were built completely."""
+        with self._lock:
+            return self._get_meta('namespaces', [])
+
+    @property
+    def last_update(self) -> float:
+        """Time (as returned by ``time.time()``) of the last build or update."""
+        with self._lock:
+            return self._get_meta('last_update', 0.0)
+
+    def _start_following(self):
+        """Start following the recent changes from now on, if the index doesn't follow them yet."""
+
+        with self._lock, self._connection:
+            if self._get_meta('checkpoint') is None:
+                self._set_meta('checkpoint', self._follower.checkpoint.state)
+
+    def mark_built(self, namespaces: Iterable[int], since: str = None):
+        """Record that all pages of the ``namespaces`` are indexed.
+
+        :param since: Optional. The timestamp (``YYYY-MM-DDTHH:MM:SSZ``) up to which the pages are current, if the
+        index doesn't follow the recent changes yet, e.g. the time of the newest revision in a dump.
+        """
+
+        with self._lock, self._connection:
+            if since is not None and self._get_meta('checkpoint') is None:
+                self._follower.checkpoint.update(timestamp=since, seen={})
+                self._set_meta('checkpoint', self._follower.checkpoint.state)
+            built = self._get_meta('namespaces', [])
+            self._set_meta('namespaces', built + [namespace for namespace in namespaces if namespace not in built])
+            self._set_meta('last_update', time.time())
+
+    def _is_current(self, max_age: float) -> bool:
+        return time.time() - self.last_update < max_age
+
+    def _update(self, apply: Callable[[List[str]], None]):
+        """Poll the titles of the pages that changed since the last update, pass them to ``apply``, and save the new
+        position in the recent changes.
+
+        Polling moves the follower's position forward, so it is reset if ``apply`` raises.
+        """
+
+        position = copy.deepcopy(self._follower.checkpoint.state)
+        try:
+            apply(self._poll_changed_titles())
+        except BaseException:
+            self._follower.checkpoint.state = position
+            raise
+        self._save_position()
+
+    def _poll_changed_titles(self) -> List[str]:
+        """Return the titles of the pages that changed since the last update, including the targets of moves."""
+
+        changed = []
+        for event in self._follower.poll():
+            changed.append(event['title'])
+            target = event.get('logparams', {}).get('target_title') if event.get('type') == 'log' else None
+            if target is not None:
+                changed.append(target)
+        return list(dict.fromkeys(changed))
+
+    def _save_position(self):
+        """Save the position in the recent changes, once the changes up to it are applied."""
+
+        with self._lock, self._connection:
+            self._set_meta('checkpoint', self._follower.checkpoint.state)
+            self._set_meta('last_update', time.time())
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
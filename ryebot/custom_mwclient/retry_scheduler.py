@@ -0,0 +1,203 @@
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Tuple, Type
+
+from .errors import CircuitOpen, RetriedLoginAndStillFailed
+
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+def backoff_delay(retry: int, interval: float, jitter: float = 0.5) -> float:
+    """Return the number of seconds to wait before the retry with the (zero-based) number ``retry``.
+
+    The delay grows like ``(2 ** retry - 1) * interval``, so the first retry is immediate. Up to the ``jitter``
+    fraction of the delay is randomized, so that clients that failed at the same time don't retry in lockstep.
+    """
+
+    delay = (2 ** retry - 1) * interval
+    return delay * (1 - jitter) + random.uniform(0, delay * jitter)
+
+
+class CircuitBreaker(object):
+    """
+    Stops retrying actions on a wiki after too many consecutive retry sequences failed.
+
+    After ``failure_threshold`` failures, the circuit is "open" and actions fail immediately for ``reset_timeout``
+    seconds. After that, a single action is let through again ("half-open"); if it succeeds, the circuit is closed,
+    otherwise it is opened again.
+    """
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 5 * 60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def retry_in(self) -> float:
+        """Number of seconds until the open circuit lets an action through again."""
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and self.retry_in == 0:
+                # let exactly one trial action through
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+
+
+class RetryScheduler(object):
+    """
+    Runs the retries of failed actions at their backoff times.
+
+    Waiting retries are kept in a heap that a single dispatcher thread works through, and only the attempts themselves
+    run on the worker threads. This way, an action that waits for its next attempt doesn't occupy a worker, and other
+    retries keep moving in the meantime.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._executor = None
+        self._heap = []  # (due time, sequence number, function, future)
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._dispatcher = None
+
+    def call_later(self, delay: float, f: Callable, *args, **kwargs) -> Future:
+        """Run ``f`` on a worker thread after ``delay`` seconds. Returns a future of its result."""
+
+        future = Future()
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._counter), lambda: f(*args, **kwargs), future))
+            self._ensure_dispatcher()
+            self._condition.notify()
+        return future
+
+    def _ensure_dispatcher(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='retry-worker')
+        if self._dispatcher is None or not self._dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch, name='retry-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._condition.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, call, future = heapq.heappop(self._heap)
+            if future.set_running_or_notify_cancel():
+                self._executor.submit(self._run, call, future)
+
+    @staticmethod
+    def _run(call: Callable, future: Future):
+        try:
+            future.set_result(call())
+        except BaseException as e:
+            future.set_exception(e)
+
+    def retry(self, f: Callable, failure_type: str, before_attempt: Callable = None, max_retries: int = 3,
+              retry_interval: float = 10, retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+              breaker: CircuitBreaker = None, wiki: str = None, **kwargs) -> Future:
+        """Retry ``f(**kwargs)`` up to ``max_retries`` times with jittered exponential backoff.
+
+        Parameters
+        ----------
+        1. f : function
+            - The action to retry.
+        2. failure_type : str
+            - Name of the action, for the error message.
+        3. before_attempt : function
+            - Optional. Called on the worker thread before every attempt, e.g. to relog.
+        4. max_retries : int, retry_interval : float
+            - The number of attempts, and the base interval of the backoff in seconds.
+        5. retry_on : tuple
+            - The exceptions that cause another attempt. Any other exception fails the future immediately.
+        6. breaker : CircuitBreaker
+            - Optional. The circuit breaker to report the outcome to. If it's open, the future fails with ``CircuitOpen``
+              without any attempt.
+        7. wiki : str
+            - Optional. Name of the wiki, for the error message of ``CircuitOpen``.
+
+        Returns
+        -------
+        A future that resolves to the result of the first successful attempt, or fails with
+        ``RetriedLoginAndStillFailed`` if all attempts failed.
+        """
+
+        result = Future()
+        if breaker is not None and not breaker.allow():
+            result.set_exception(CircuitOpen(failure_type, wiki, breaker.retry_in))
+            return result
+        codes = []
+
+        def attempt(retry: int):
+            try:
+                if before_attempt is not None:
+                    before_attempt()
+                value = f(**kwargs)
+            except retry_on as e:
+                code = getattr(e, 'code', None)
+                if code is not None:
+                    codes.append(code)
+                if retry + 1 < max_retries:
+                    schedule(retry + 1)
+                    return
+                if breaker is not None:
+                    breaker.record_failure()
+                result.set_exception(RetriedLoginAndStillFailed(failure_type, codes))
+            except BaseException as e:
+                # an error that retrying can't fix (e.g. a protected page) still completes the attempt, so that a
+                # half-open circuit is closed again instead of staying half-open forever
+                if breaker is not None:
+                    breaker.record_success()
+                result.set_exception(e)
+            else:
+                if breaker is not None:
+                    breaker.record_success()
+                result.set_result(value)
+
+        def schedule(retry: int):
+            self.call_later(backoff_delay(retry, retry_interval), attempt, retry)
+
+        schedule(0)
+        return result
+
+
+retry_scheduler = RetryScheduler()
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(wiki: str) -> CircuitBreaker:
+    """Return the circuit breaker of the ``wiki``, which is shared by all clients of this process."""
+
+    with _circuit_breakers_lock:
+        if wiki not in _circuit_breakers:
+            _circuit_breakers[wiki] = CircuitBreaker()
+        return _circuit_breakers[wiki]
@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+
+# names of the counters that the WikiClient increments
+EDITS = 'edits'
+EDITS_SKIPPED = 'edits_skipped_unchanged'
+TOUCHES = 'touches'
+PURGES = 'purges'
+MOVES = 'moves'
+DELETIONS = 'deletions'
+
+
+class RunMetrics(object):
+    """Thread-safe counters of the actions of a run, e.g. the number of saved and skipped edits."""
+
+    def __init__(self):
+        self.started = time.time()
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self._counters[name]
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return a copy of all counters."""
+        with self._lock:
+            return dict(self._counters)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self.started = time.time()
+
+    def __str__(self):
+        counters = self.snapshot()
+        if not counters:
+            return 'No actions in {:.1f} s.'.format(time.time() - self.started)
+        return '{} in {:.1f} s.'.format(
+            ', '.join('{}: {}'.format(name, count) for name, count in sorted(counters.items())), time.time() - self.started)
@@ -0,0 +1,239 @@
+import bisect
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Set
+
+from custom_mwclient.models.simple_page import SimplePage
+from custom_mwclient.wiki_client import WikiClient
+from custom_utils.iter_util import chunked
+
+from .crawler import crawl_titles
+from .recent_changes_index import RecentChangesIndex
+
+
+# Name of the file in the wiki's localdata directory that holds the search index
+SEARCHINDEXFILE = '.search_index.sqlite3'
+
+_TOKEN = re.compile(r'\w+')
+# longer "words" are usually base64 data or similar, which nobody searches for
+_MAX_TOKEN_LENGTH = 64
+_MAX_VARIABLES = 900
+
+
+def tokenize(text: str) -> Set[str]:
+    """Return the set of words of the ``text`` under which it is indexed (lowercase)."""
+    return {token for token in _TOKEN.findall(text.lower()) if len(token) <= _MAX_TOKEN_LENGTH}
+
+
+def encode_postings(ids: Iterable[int]) -> bytes:
+    """Compress a list of document IDs: sorted, delta-encoded as variable-length integers, and zlib-compressed."""
+
+    data = bytearray()
+    previous = 0
+    for doc_id in sorted(ids):
+        delta = doc_id - previous
+        previous = doc_id
+        while delta >= 0x80:
+            data.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return zlib.compress(bytes(data))
+
+
+def decode_postings(blob: bytes) -> List[int]:
+    ids = []
+    value = shift = previous = 0
+    for byte in zlib.decompress(blob):
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        ids.append(previous)
+        value = shift = 0
+    return ids
+
+
+class SearchIndex(RecentChangesIndex):
+    """
+    Persistent inverted index (word -> pages) of the texts of whole namespaces, to search them without downloading
+    every page for every query.
+
+    Each batch of indexed pages adds a block of compressed postings per word. A page that changes gets a new document
+    ID, and the postings of its old ID are ignored from then on (and dropped by ``compact``), so updates never have to
+    rewrite existing postings.
+
+    The index is built with ``build`` and kept current with ``update``, which applies the recent changes since the
+    last update. Searches only return candidates: the index doesn't know where the words are in a text, so a page
+    that contains all words of a term might still not contain the term itself.
+    """
+
+    def __init__(self, site: Optional[WikiClient], filename: str):
+        """
+        :param site: The client of the wiki whose pages are indexed. Only needed for ``build`` and ``update``.
+        :param filename: Full path of the SQLite database file.
+        """
+
+        super().__init__(site, filename)
+        self._vocabulary = None # sorted list of all indexed words, loaded on first use
+
+    def _create_tables(self):
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS docs (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT UNIQUE NOT NULL, '
+            'namespace INTEGER NOT NULL, revid INTEGER)'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS docs_namespace ON docs (namespace)')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS postings (token TEXT NOT NULL, data BLOB NOT NULL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS postings_token ON postings (token)')
+
+    def has_namespace(self, namespace: int) -> bool:
+        return namespace in self.namespaces
+
+    def build(self, namespace: int, limit: int = 500, max_workers: int = 4, batch_size: int = 500):
+        """Index all pages of the ``namespace``.
+
+        :param namespace: The number of the namespace.
+        :param limit: The pagination limit when querying for page texts.
+        :param max_workers: The maximum number of page text requests in flight.
+        :param batch_size: Number of pages per block of postings.
+        """
+
+        self._start_following()
+        titles = crawl_titles(self.site, namespace, max_workers=max_workers)
+        pages = self.site.iter_simple_pages(titles, limit=limit, max_workers=max_workers)
+        for batch in chunked(pages, batch_size):
+            self.add_pages(batch, {page.name: namespace for page in batch})
+
+        self.mark_built([namespace])
+        self.compact()
+
+    def update(self, max_age: float = 0, limit: int = 500, max_workers: int = 4):
+        """Reindex the pages of the indexed namespaces that changed since the last update, according to the recent changes.
+
+        :param max_age: Don't update if the last update is more recent than this many seconds.
+        :param limit: The pagination limit when querying for page texts.
+        :param max_workers: The maximum number of page text requests in flight.
+        """
+
+        if self._is_current(max_age):
+            return
+        self._update(lambda changed: self._reindex(changed, limit, max_workers))
+
+    def _reindex(self, changed: List[str], limit: int, max_workers: int):
+        namespaces = set(self.namespaces)
+        titles = [title for title in changed if self.site.title_normalizer.split(title)[0] in namespaces]
+        for batch in chunked(self.site.iter_simple_pages(titles, limit=limit, max_workers=max_workers), limit):
+            self.add_pages(batch, {page.name: self.site.title_normalizer.split(page.name)[0] for page in batch})
+
+    def add_pages(self, pages: List[SimplePage], namespaces: Dict[str, int], only_newer: bool = False):
+        """Index the ``pages`` (in the namespaces with the numbers in ``namespaces``, by title), replacing older
+        revisions of them. Pages that don't exist are removed from the index.
+
+        :param only_newer: Whether to skip pages whose indexed revision is newer, e.g. when importing an older dump.
+        """
+
+        with self._lock, self._connection:
+            stored = {}
+            titles = [page.name for page in pages]
+            for i in range(0, len(titles), _MAX_VARIABLES):
+                chunk = titles[i:i + _MAX_VARIABLES]
+                stored.update(self._connection.execute(
+                    'SELECT title, revid FROM docs WHERE title IN ({})'.format(','.join('?' * len(chunk))), chunk
+                ))
+
+            postings: Dict[str, List[int]] = {}
+            for page in pages:
+                if page.exists and page.name in stored and stored[page.name] == page.revid:
+                    continue
+                if only_newer and stored.get(page.name) is not None and page.revid is not None and stored[page.name] > page.revid:
+                    continue
+                self._connection.execute('DELETE FROM docs WHERE title = ?', (page.name,))
+                if not page.exists:
+                    continue
+                doc_id = self._connection.execute(
+                    'INSERT INTO docs (title, namespace, revid) VALUES (?, ?, ?)',
+                    (page.name, namespaces[page.name], page.revid)
+                ).lastrowid
+                for token in tokenize(page.text):
+                    postings.setdefault(token, []).append(doc_id)
+
+            self._connection.executemany(
+                'INSERT INTO postings (token, data) VALUES (?, ?)',
+                ((token, encode_postings(ids)) for token, ids in postings.items())
+            )
+            self._vocabulary = None
+
+    def compact(self):
+        """Merge the blocks of postings of every word and drop the IDs of documents that were reindexed or removed."""
+
+        with self._lock, self._connection:
+            live = {row[0] for row in self._connection.execute('SELECT id FROM docs')}
+            merged: Dict[str, List[int]] = {}
+            for token, data in self._connection.execute('SELECT token, data FROM postings'):
+                merged.setdefault(token, []).extend(doc_id for doc_id in decode_postings(data) if doc_id in live)
+            self._connection.execute('DELETE FROM postings')
+            self._connection.executemany(
+                'INSERT INTO postings (token, data) VALUES (?, ?)',
+                ((token, encode_postings(ids)) for token, ids in merged.items() if ids)
+            )
+            self._vocabulary = None
+
+    def _matching_tokens(self, word: str, complete_start: bool, complete_end: bool) -> List[str]:
+        """Return the indexed words that the ``word`` of a search term can be part of."""
+
+        if complete_start and complete_end:
+            return [word]
+        if self._vocabulary is None:
+            self._vocabulary = [row[0] for row in self._connection.execute('SELECT DISTINCT token FROM postings ORDER BY token')]
+        if complete_start:
+            first = bisect.bisect_left(self._vocabulary, word)
+            last = bisect.bisect_left(self._vocabulary, word + '\U0010ffff')
+            return self._vocabulary[first:last]
+        if complete_end:
+            return [token for token in self._vocabulary if token.endswith(word)]
+        return [token for token in self._vocabulary if word in token]
+
+    def _lookup(self, tokens: List[str]) -> Set[int]:
+        ids = set()
+        for i in range(0, len(tokens), _MAX_VARIABLES):
+            chunk = tokens[i:i + _MAX_VARIABLES]
+            rows = self._connection.execute(
+                'SELECT data FROM postings WHERE token IN ({})'.format(','.join('?' * len(chunk))), chunk
+            )
+            for (data,) in rows:
+                ids.update(decode_postings(data))
+        return ids
+
+    def search(self, term: str, namespace: int = None) -> Optional[List[str]]:
+        """Return the titles of the pages that might contain the ``term`` (case-insensitively), sorted.
+
+        The first and the last word of the term might be part of longer words in the text, so they are looked up as
+        suffix and prefix; a term of a single word is looked up as part of any word. Returns ``None`` if the index
+        can't narrow down the pages, i.e. if the term has no words.
+        """
+
+        term = term.lower()
+        words = [match for match in _TOKEN.finditer(term) if len(match.group()) <= _MAX_TOKEN_LENGTH]
+        if not words:
+            return None
+
+        with self._lock:
+            candidates = None
+            # the complete words first, since they are the cheapest to look up
+            for match in sorted(words, key=lambda match: (match.start() == 0) + (match.end() == len(term))):
+                # a word in the term is only a complete word of the text if something other than a word character
+                # is next to it in the term
+                tokens = self._matching_tokens(match.group(), match.start() > 0, match.end() < len(term))
+                ids = self._lookup(tokens)
+                candidates = ids if candidates is None else candidates & ids
+                if not candidates:
+                    return []
+            if namespace is None:
+                rows = self._connection.execute('SELECT id, title FROM docs')
+            else:
+                rows = self._connection.execute('SELECT id, title FROM docs WHERE namespace = ?', (namespace,))
+            return sorted(title for doc_id, title in rows if doc_id in candidates)
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
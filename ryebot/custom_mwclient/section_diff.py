@@ -0,0 +1,145 @@
+import re
+from typing import List, Optional, Tuple
+
+import mwparserfromhell
+from mwparserfromhell.nodes import Heading
+
+
+FULL = 'text'
+SECTION = 'section'
+APPEND = 'appendtext'
+PREPEND = 'prependtext'
+
+# lines that might start a heading
+_HEADING_LINE = re.compile(r'^=', re.MULTILINE)
+# tags that change what MediaWiki considers part of the page when it is edited
+_INCLUSION_TAGS = re.compile(r'<(?:noinclude|includeonly|onlyinclude)\b', re.IGNORECASE)
+
+
+def mw_rtrim(text: str) -> str:
+    """Strip trailing whitespace like PHP's ``rtrim``, which MediaWiki applies to every saved text."""
+    return text.rstrip(' \t\n\r\0\x0b')
+
+
+class PlannedEdit(object):
+    """An edit request that changes a page from one text to another."""
+
+    def __init__(self, mode: str, text: str, section: int = None):
+        """
+        :param mode: ``text`` (the full page text), ``section``, ``appendtext``, or ``prependtext``.
+        :param text: The text to send.
+        :param section: The number of the section, if ``mode`` is ``section``.
+        """
+        self.mode = mode
+        self.text = text
+        self.section = section
+
+    def __repr__(self):
+        return '<PlannedEdit {}{} ({} characters)>'.format(
+            self.mode, '={}'.format(self.section) if self.section is not None else '', len(self.text))
+
+
+def mw_sections(text: str) -> Optional[List[Tuple[int, int]]]:
+    """Return the ``(start, end)`` positions of the sections of the ``text`` in MediaWiki's numbering.
+
+    Section 0 is the text before the first heading. Every other section reaches up to the next heading of the same
+    or a higher level, i.e. it includes its subsections. Returns ``None`` if the headings of the text are ambiguous,
+    e.g. because there are headings inside of templates or tags.
+    """
+
+    if _INCLUSION_TAGS.search(text):
+        return None
+    wikicode = mwparserfromhell.parse(text)
+    headings = []
+    position = 0
+    for node in wikicode.nodes:
+        if isinstance(node, Heading):
+            headings.append((position, node.level))
+        position += len(str(node))
+    if len(headings) != len(_HEADING_LINE.findall(text)):
+        # a line that starts like a heading but isn't a top-level heading
+        return None
+
+    sections = [(0, headings[0][0] if headings else len(text))]
+    for i, (start, level) in enumerate(headings):
+        end = len(text)
+        for next_start, next_level in headings[i + 1:]:
+            if next_level <= level:
+                end = next_start
+                break
+        sections.append((start, end))
+    return sections
+
+
+def replace_section(text: str, sections: List[Tuple[int, int]], section: int, section_text: str) -> str:
+    """Return the text that MediaWiki saves when the ``section`` of the ``text`` is replaced with the ``section_text``."""
+
+    start, end = sections[section]
+    before, after = text[:start], text[end:]
+    # MediaWiki strips the trailing whitespace of the new section, and separates it from the next section by an
+    # empty line
+    section_text = mw_rtrim(section_text)
+    if section_text:
+        section_text += '\n\n'
+    return mw_rtrim(before + section_text + after)
+
+
+def plan_edit(old_text: str, new_text: str) -> PlannedEdit:
+    """Return the smallest edit request that changes the page text from ``old_text`` to ``new_text``.
+
+    Every candidate (appending, prepending, or replacing a single section) is verified by simulating how MediaWiki
+    applies it, and only used if the result is the same as saving the full ``new_text``. Otherwise, the full text is
+    sent.
+    """
+
+    expected = mw_rtrim(new_text)
+    candidates = [PlannedEdit(FULL, new_text)]
+
+    if new_text.startswith(old_text) and mw_rtrim(old_text + new_text[len(old_text):]) == expected:
+        candidates.append(PlannedEdit(APPEND, new_text[len(old_text):]))
+    if new_text.endswith(old_text) and mw_rtrim(new_text[:len(new_text) - len(old_text)] + old_text) == expected:
+        candidates.append(PlannedEdit(PREPEND, new_text[:len(new_text) - len(old_text)]))
+
+    if len(candidates) == 1:
+        # finding the sections takes a full parse, so only do it if appending or prepending isn't possible
+        section_edit = _plan_section_edit(old_text, new_text, expected)
+        if section_edit is not None:
+            candidates.append(section_edit)
+
+    return min(candidates, key=lambda edit: len(edit.text))
+
+
+def _plan_section_edit(old_text: str, new_text: str, expected: str) -> Optional[PlannedEdit]:
+    # the changed range: everything between the common prefix and the common suffix of both texts
+    prefix = _common_length(lambda n: old_text[:n] == new_text[:n], min(len(old_text), len(new_text)))
+    max_suffix = min(len(old_text), len(new_text)) - prefix
+    suffix = _common_length(lambda n: old_text[len(old_text) - n:] == new_text[len(new_text) - n:], max_suffix)
+    changed_end = len(old_text) - suffix
+
+    sections = mw_sections(old_text)
+    if sections is None:
+        return None
+
+    # try the sections that contain the changed range, smallest first
+    containing = [i for i, (start, end) in enumerate(sections) if start <= prefix and changed_end <= end]
+    for section in sorted(containing, key=lambda i: sections[i][1] - sections[i][0]):
+        start, end = sections[section]
+        section_text = new_text[start:len(new_text) - (len(old_text) - end)]
+        if end < len(old_text) and section_text.endswith('\n\n'):
+            # MediaWiki adds the empty line before the next section itself
+            section_text = section_text[:-2]
+        if replace_section(old_text, sections, section, section_text) == expected:
+            return PlannedEdit(SECTION, section_text, section)
+    return None
+
+
+def _common_length(is_common, maximum: int) -> int:
+    """Return the largest ``n <= maximum`` for which ``is_common(n)`` is true, by binary search."""
+    low, high = 0, maximum
+    while low < high:
+        middle = (low + high + 1) // 2
+        if is_common(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
@@ -1,26 +1,140 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import requests
+from mwclient.client import USER_AGENT
+from requests.adapters import HTTPAdapter
+
 from .auth_credentials import AuthCredentials
 from .site import Site
 
 
 class SessionManager(object):
     """
-    Manages instances of WikiClient
+    Manages a pool of site objects, keyed by scheme, host, path, and user.
+
+    Each site object gets its own HTTP connection pool with keep-alive and gzip. Sessions that haven't been used for
+    a while are health-checked with a cheap request before they are handed out again, so that a session that was
+    logged out by the server is replaced before a write fails on it. Idle and least recently used sessions are
+    evicted when the pool is full.
     """
-    existing_wikis = {}
+
+    def __init__(self, max_sessions: int = 16, idle_timeout: float = 60 * 60, health_check_interval: float = 5 * 60,
+                 pool_connections: int = 10, pool_maxsize: int = 10):
+        """
+        :param max_sessions: Maximum number of sessions to keep.
+        :param idle_timeout: Number of seconds after which an unused session is evicted.
+        :param health_check_interval: Number of seconds of inactivity after which a session is health-checked before reuse.
+        :param pool_connections: Number of connection pools of each session's HTTP adapter.
+        :param pool_maxsize: Maximum number of connections kept alive per connection pool.
+        """
+
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.existing_wikis = OrderedDict() # key -> {'client', 'credentials', 'last_used'}, least recently used first
+        # the same entries, but for every site object that is still in use, even if it was evicted from the pool
+        self._entries_by_client = weakref.WeakKeyDictionary()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(url: str, path: str, scheme: str, credentials: AuthCredentials) -> Tuple:
+        user = credentials.username if credentials is not None else None
+        return (scheme or 'https', url, path, user)
 
     def get_client(self, url: str = None, path: str = None, scheme = None,
                    credentials: AuthCredentials = None, force_new = False,
                    **kwargs):
-        if url in self.existing_wikis and not force_new:
-            return self.existing_wikis[url]['client']
+        key = self._key(url, path, scheme, credentials)
+        with self._lock:
+            self._evict_idle()
+            entry = self.existing_wikis.get(key)
+        if entry is not None and not force_new and self._is_healthy(entry):
+            with self._lock:
+                if self.existing_wikis.get(key) is entry:
+                    self.existing_wikis.move_to_end(key)
+            return entry['client']
+
+        client = self._new_client(url, path, scheme, credentials, **kwargs)
+
+        with self._lock:
+            if key in self.existing_wikis:
+                self._evict(key)
+            entry = {'client': client, 'credentials': credentials, 'last_used': time.monotonic()}
+            self.existing_wikis[key] = entry
+            self._entries_by_client[client] = entry
+            while len(self.existing_wikis) > self.max_sessions:
+                self._evict(next(iter(self.existing_wikis)))
+        return client
+
+    def check_client(self, client: Site) -> bool:
+        """Return whether the session of the ``client`` is still usable, health-checking it if it was idle for a while.
+
+        Clients that aren't managed by this session manager are always considered usable.
+        """
+
+        with self._lock:
+            entry = self._entries_by_client.get(client)
+        if entry is None:
+            return True
+        return self._is_healthy(entry)
+
+    def _new_client(self, url: str, path: str, scheme: str, credentials: Optional[AuthCredentials], **kwargs) -> Site:
+        if 'pool' not in kwargs and 'httpauth' not in kwargs and 'consumer_token' not in kwargs:
+            kwargs['pool'] = self._new_http_session(kwargs.pop('clients_useragent', None), kwargs.pop('custom_headers', None))
         if scheme is not None:
             client = Site(url, path=path, scheme=scheme, **kwargs)
         else:
             client = Site(url, path=path, **kwargs)
         if credentials:
             client.login(username=credentials.username, password=credentials.password)
-        self.existing_wikis[url] = {'client': client}
         return client
 
+    def _new_http_session(self, clients_useragent: str = None, custom_headers: dict = None) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        # mwclient only sets these headers on sessions that it creates itself
+        session.headers['User-Agent'] = (clients_useragent + ' ' + USER_AGENT) if clients_useragent else USER_AGENT
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
+        session.headers['Connection'] = 'keep-alive'
+        if custom_headers:
+            session.headers.update(custom_headers)
+        return session
+
+    def _is_healthy(self, entry: dict) -> bool:
+        # must be called without holding the lock: the health check is a request, and the other sessions shouldn't
+        # wait for it
+        with self._lock:
+            now = time.monotonic()
+            if now - entry['last_used'] < self.health_check_interval:
+                entry['last_used'] = now
+                return True
+        try:
+            result = entry['client'].api('query', meta='userinfo')
+        except Exception:
+            return False
+        if entry['credentials'] is not None and 'anon' in result['query']['userinfo']:
+            # the server dropped our login
+            return False
+        with self._lock:
+            entry['last_used'] = time.monotonic()
+        return True
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for key in [key for key, entry in self.existing_wikis.items() if now - entry['last_used'] > self.idle_timeout]:
+            self._evict(key)
+
+    def _evict(self, key: Tuple):
+        # the connections are not closed here, since a WikiClient might still be using the site object
+        self.existing_wikis.pop(key)
+
 
-session_manager = SessionManager()
\ No newline at end of file
+session_manager = SessionManager()
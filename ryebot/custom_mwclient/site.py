@@ -1,8 +1,102 @@
 from mwclient import Site as MwclientSite
+from mwclient.errors import APIError
+
+from .rate_limiter import AdaptiveRateLimiter, READ, WRITE, get_rate_limiter
+from .token_cache import TokenCache
 
 
 class Site(MwclientSite):
     """
-    Wrap mwclient since we might include a site object in constructors
+    Wrap mwclient since we might include a site object in constructors.
+
+    Tokens are cached for the entire session and only fetched again when the API rejects them as "badtoken".
+    All requests pass through the rate limiter of the host, and API requests carry the ``maxlag`` parameter.
     """
-    pass
+
+    # token types that weren't merged into the "csrf" token in MediaWiki 1.24
+    non_csrf_token_types = {'watch', 'patrol', 'rollback', 'userrights', 'login'}
+
+    # how often to retry a request that failed with a "ratelimited" error, and how long to pause before that
+    ratelimited_retries = 3
+    ratelimited_pause = 10
+
+    def __init__(self, *args, rate_limiter: AdaptiveRateLimiter = None, rate_limit=True, **kwargs):
+        # the parent constructor already makes requests, so these have to exist beforehand
+        self.token_cache = TokenCache()
+        if rate_limit:
+            host = kwargs['host'] if 'host' in kwargs else args[0]
+            self.rate_limiter = rate_limiter or get_rate_limiter(host)
+        else:
+            self.rate_limiter = None
+        super().__init__(*args, **kwargs)
+
+    def site_init(self):
+        super().site_init()
+        # a new session (e.g. after login) invalidates all tokens of the previous one
+        self.token_cache.invalidate()
+
+    def get_token(self, type, force=False, title=None):
+        if self.version is None or self.version[:2] >= (1, 24):
+            if type not in self.non_csrf_token_types:
+                type = 'csrf'
+
+        if not force:
+            token = self.token_cache.get(type)
+            if token is not None:
+                return token
+
+        with self.token_cache.fetch_lock(type):
+            if not force:
+                # another thread might have fetched the token while we waited for the lock
+                token = self.token_cache.get(type)
+                if token is not None:
+                    return token
+            token = super().get_token(type, force=True, title=title)
+            self.token_cache.set(type, token)
+        return token
+
+    def api(self, action, http_method='POST', *args, **kwargs):
+        ratelimited_retries = 0
+        while True:
+            try:
+                return super().api(action, http_method, *args, **kwargs)
+            except APIError as e:
+                if e.code == 'ratelimited' and self.rate_limiter is not None and ratelimited_retries < self.ratelimited_retries:
+                    # the user's rate limit was hit, so slow down the writes and try again after a pause
+                    ratelimited_retries += 1
+                    self.rate_limiter.on_throttled(WRITE, retry_after=self.ratelimited_pause)
+                    continue
+                if e.code != 'badtoken' or 'token' not in kwargs:
+                    raise
+                token_type = self.token_cache.type_of(kwargs['token'])
+                if token_type is None:
+                    raise
+                # the cached token is invalid, so get a new one and retry once
+                self.token_cache.invalidate(token_type)
+                kwargs['token'] = self.get_token(token_type)
+                return super().api(action, http_method, *args, **kwargs)
+
+    def raw_api(self, action, http_method='POST', retry_on_error=True, *args, **kwargs):
+        # let the server reject requests while its replication lag is high, see https://www.mediawiki.org/wiki/Manual:Maxlag_parameter
+        kwargs.setdefault('maxlag', self.max_lag)
+        return super().raw_api(action, http_method, retry_on_error, *args, **kwargs)
+
+    def raw_call(self, script, data, files=None, retry_on_error=True, http_method='POST'):
+        limiter = self.rate_limiter
+        if limiter is None:
+            return super().raw_call(script, data, files=files, retry_on_error=retry_on_error, http_method=http_method)
+
+        hooks = self.connection.hooks['response']
+        if limiter.observe_response not in hooks:
+            hooks.append(limiter.observe_response)
+
+        kind = WRITE if 'token' in data and data.get('action') != 'login' else READ
+        limiter.acquire(kind)
+        limiter.current.kind = kind
+        return super().raw_call(script, data, files=files, retry_on_error=retry_on_error, http_method=http_method)
+
+    def rate_limit_metrics(self) -> dict:
+        """Return the current request rates and the time spent waiting for the rate limiter of this host."""
+        if self.rate_limiter is None:
+            return {}
+        return self.rate_limiter.metrics()
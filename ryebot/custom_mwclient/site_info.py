@@ -0,0 +1,128 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from custom_utils.file_util import read_json, write_json_atomic
+
+
+# Name of the file in the wiki's localdata directory that holds the siteinfo snapshot
+SITEINFOFILE = '.siteinfo.json'
+
+# Number of seconds after which a snapshot is refreshed
+DEFAULT_TTL = 24 * 60 * 60
+
+
+class SiteInfo(object):
+    """
+    Snapshot of a wiki's metadata: general info, and namespaces and their aliases.
+
+    The snapshot is stored on disk and shared between all processes working on the wiki, so that they don't have to
+    query this metadata again on startup. A snapshot that is older than its TTL is still served, but refreshed in a
+    background thread. Since every account on the wiki shares it, it only holds site-wide data; the rights of the
+    logged-in user are taken from the session (see ``WikiClient.max_titles``).
+    """
+
+    def __init__(self, fetch: Callable[[], dict], filename: str = None, ttl: float = DEFAULT_TTL):
+        """
+        Create the snapshot and load it from disk, if possible. This doesn't make any API requests.
+        :param fetch: Function that queries the API and returns the snapshot data (see ``WikiClient._fetch_siteinfo``).
+        :param filename: Optional. Full path of the file to persist the snapshot in.
+        :param ttl: Number of seconds after which the snapshot is refreshed.
+        """
+
+        self._fetch = fetch
+        self.filename = filename
+        self.ttl = ttl
+        self._data = None
+        self._lock = threading.Lock()
+        # held while fetching the first snapshot, so that concurrent first users make only one request
+        self._first_fetch_lock = threading.Lock()
+        self._refresh_thread = None
+        self.load()
+
+    def load(self):
+        """Load the snapshot from disk."""
+
+        if self.filename is None:
+            return
+        data = read_json(self.filename)
+        if isinstance(data, dict) and 'fetched' in data:
+            self._data = data
+
+    def refresh(self):
+        """Query the API for a new snapshot and persist it."""
+
+        data = self._fetch()
+        with self._lock:
+            # keep values that were computed on demand, but not the ones that expired
+            extras = (self._data or {}).get('extras', {})
+            data['extras'] = {key: value for key, value in extras.items() if not self._is_expired(value['fetched'])}
+            data['fetched'] = time.time()
+            self._data = data
+            if self.filename is not None:
+                write_json_atomic(self.filename, data)
+
+    def refresh_in_background(self):
+        """Start refreshing the snapshot in a background thread, unless that is already happening."""
+
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(target=self._refresh_quietly, name='siteinfo-refresh', daemon=True)
+            self._refresh_thread.start()
+
+    def _refresh_quietly(self):
+        try:
+            self.refresh()
+        except Exception:
+            # the old snapshot stays in use; the next access will try again
+            pass
+
+    def _is_expired(self, fetched: float) -> bool:
+        return time.time() - fetched > self.ttl
+
+    @property
+    def is_stale(self) -> bool:
+        return self._data is None or self._is_expired(self._data['fetched'])
+
+    @property
+    def data(self) -> dict:
+        """The complete snapshot. Only blocks on an API request if there is no snapshot at all yet."""
+
+        if self._data is None:
+            with self._first_fetch_lock:
+                # another thread might have fetched it while this one was waiting
+                if self._data is None:
+                    self.refresh()
+        elif self.is_stale:
+            self.refresh_in_background()
+        return self._data
+
+    @property
+    def general(self) -> dict:
+        return self.data['general']
+
+    @property
+    def namespaces(self) -> dict:
+        return self.data['namespaces']
+
+    @property
+    def namespacealiases(self) -> list:
+        return self.data['namespacealiases']
+
+    def get_extra(self, key: str, compute: Callable[[], object]):
+        """Return an additional value of the snapshot, computing (and persisting) it if it's missing or expired.
+
+        This is meant for wiki-specific metadata that is as static as the siteinfo, e.g. expanded configuration templates.
+        """
+
+        extra: Optional[dict] = self.data.get('extras', {}).get(key)
+        if extra is not None and not self._is_expired(extra['fetched']):
+            return extra['value']
+
+        value = compute()
+        with self._lock:
+            self._data.setdefault('extras', {})[key] = {'value': value, 'fetched': time.time()}
+            if self.filename is not None:
+                write_json_atomic(self.filename, self._data)
+        return value
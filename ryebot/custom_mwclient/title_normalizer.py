@@ -0,0 +1,80 @@
+import functools
+import re
+from typing import Dict, Optional, Tuple
+
+
+FIRST_LETTER = 'first-letter'
+
+_WHITESPACE = re.compile(r'[ _]+')
+
+
+class TitleNormalizer(object):
+    """
+    Normalizes page titles the way MediaWiki does, without asking the API.
+
+    This replaces underscores with spaces, resolves namespace names, canonical names and aliases case-insensitively to
+    the local namespace name, and applies the first-letter capitalization of namespaces that use it. Interwiki prefixes
+    and language variants are not known locally; titles with them are only normalized as far as possible.
+    """
+
+    def __init__(self, namespaces: dict, namespacealiases: list, cache_size: int = 65536):
+        """
+        :param namespaces: The ``namespaces`` of the siteinfo, keyed by ID.
+        :param namespacealiases: The ``namespacealiases`` of the siteinfo.
+        :param cache_size: Number of normalized titles to memoize.
+        """
+
+        self._names: Dict[int, str] = {}
+        self._cases: Dict[int, str] = {}
+        self._ids: Dict[str, int] = {}
+        for ns_str, ns_data in namespaces.items():
+            ns = int(ns_str)
+            self._names[ns] = ns_data['*']
+            self._cases[ns] = ns_data.get('case', FIRST_LETTER)
+            self._ids[self._key(ns_data['*'])] = ns
+            if ns_data.get('canonical') is not None:
+                self._ids[self._key(ns_data['canonical'])] = ns
+        for alias in namespacealiases:
+            self._ids[self._key(alias['*'])] = alias['id']
+
+        self.normalize = functools.lru_cache(maxsize=cache_size)(self._normalize)
+
+    @staticmethod
+    def _key(name: str) -> str:
+        return _WHITESPACE.sub(' ', name).strip().casefold()
+
+    def namespace_id(self, name: str) -> Optional[int]:
+        """Return the ID of the namespace with the ``name`` (local name, canonical name, or alias, in any case)."""
+        return self._ids.get(self._key(name))
+
+    def namespace_name(self, ns: int) -> str:
+        return self._names[ns]
+
+    def split(self, title: str) -> Tuple[int, str]:
+        """Return the namespace ID and the normalized title without namespace prefix of the ``title``."""
+
+        title = _WHITESPACE.sub(' ', title).strip()
+        if title.startswith(':'):
+            title = title[1:].lstrip()
+        ns = 0
+        if ':' in title:
+            prefix, rest = title.split(':', 1)
+            prefix_ns = self._ids.get(self._key(prefix))
+            if prefix_ns is not None and prefix_ns != 0:
+                ns = prefix_ns
+                title = rest.lstrip()
+        if title and self._cases.get(ns, FIRST_LETTER) == FIRST_LETTER:
+            first = title[0].upper()
+            # MediaWiki keeps letters whose uppercase form has more than one character, e.g. "ß"
+            if len(first) == 1:
+                title = first + title[1:]
+        return (ns, title)
+
+    def _normalize(self, title: str) -> str:
+        ns, title = self.split(title)
+        if ns == 0:
+            return title
+        return self._names[ns] + ':' + title
+
+    def same_title(self, title1: str, title2: str) -> bool:
+        return self.normalize(title1) == self.normalize(title2)
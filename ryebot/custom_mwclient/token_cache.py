@@ -0,0 +1,50 @@
+import threading
+from typing import Dict, Optional
+
+
+class TokenCache(object):
+    """
+    Thread-safe cache of the API tokens of one session.
+
+    Tokens stay valid for the entire session, so they only need to be fetched again when the API rejects them
+    with a "badtoken" error, or when the session changes (e.g. on login).
+    """
+
+    def __init__(self):
+        self._tokens: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._fetch_locks: Dict[str, threading.Lock] = {}
+
+    def get(self, token_type: str) -> Optional[str]:
+        """Return the cached token of the ``token_type``, or ``None`` if there is none."""
+
+        with self._lock:
+            return self._tokens.get(token_type)
+
+    def set(self, token_type: str, token: str):
+        with self._lock:
+            self._tokens[token_type] = token
+
+    def invalidate(self, token_type: str = None):
+        """Remove the token of the ``token_type`` from the cache, or all tokens if no type is specified."""
+
+        with self._lock:
+            if token_type is None:
+                self._tokens.clear()
+            else:
+                self._tokens.pop(token_type, None)
+
+    def type_of(self, token: str) -> Optional[str]:
+        """Return the type of the cached ``token``, or ``None`` if it isn't in the cache."""
+
+        with self._lock:
+            for token_type, cached_token in self._tokens.items():
+                if cached_token == token:
+                    return token_type
+        return None
+
+    def fetch_lock(self, token_type: str) -> threading.Lock:
+        """Return a lock to hold while fetching a token of the ``token_type``, so that concurrent callers only fetch it once."""
+
+        with self._lock:
+            return self._fetch_locks.setdefault(token_type, threading.Lock())
@@ -0,0 +1,173 @@
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from custom_utils.iter_util import chunked, imap_ordered
+
+from .crawler import crawl_titles
+from .recent_changes_index import RecentChangesIndex
+
+
+# Name of the file in the wiki's localdata directory that holds the transclusion index
+TRANSCLUSIONINDEXFILE = '.transclusions.sqlite3'
+
+# Seconds after which the pages that use a changed template are refetched once more, when the refreshLinks jobs of
+# the change have (most likely) run
+RECHECK_DELAY = 15 * 60
+
+_MAX_VARIABLES = 900
+
+
+class TransclusionIndex(RecentChangesIndex):
+    """
+    Persistent graph of the transclusions of a wiki (template -> pages and page -> templates), to answer
+    ``pages_using`` without querying ``embeddedin`` every time.
+
+    The index is built per namespace of the transcluding pages with ``build``, and kept current with ``update``, which
+    refetches the templates of the pages from the recent changes since the last update. A change to a template
+    (or any other transcluded page) can change what the pages using it transclude, so their templates are refetched
+    as well.
+
+    The wiki only updates what these pages transclude in the refreshLinks jobs of the change, which usually run some
+    time after it. So the pages are refetched once more by the first update at least ``RECHECK_DELAY`` seconds later.
+    Until then, and if the job queue of the wiki is even slower than that, the index might still have their old
+    templates.
+    """
+
+    def _create_tables(self):
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS pages (title TEXT PRIMARY KEY, pageid INTEGER, namespace INTEGER NOT NULL, '
+            'redirect INTEGER NOT NULL)'
+        )
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS links (page TEXT NOT NULL, template TEXT NOT NULL, PRIMARY KEY (page, template))'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS links_template ON links (template)')
+        # pages whose templates are refetched again by the first update after the time in "due"
+        self._connection.execute('CREATE TABLE IF NOT EXISTS recheck (title TEXT PRIMARY KEY, due REAL NOT NULL)')
+
+    def covers(self, namespace: Optional[int]) -> bool:
+        """Return whether the index has all pages of the ``namespace``, or of all namespaces of the wiki if it is ``None``."""
+
+        namespaces = self.namespaces
+        if namespace is not None:
+            return namespace in namespaces
+        return all(ns.id in namespaces for ns in self.site.namespaces if ns.id >= 0)
+
+    def _fetch_templates(self, titles: List[str]) -> Dict[str, Optional[Tuple[int, int, bool, Set[str]]]]:
+        """Return the page ID, namespace, redirect status, and templates of the pages, or ``None`` for missing pages."""
+
+        result = {title: None for title in titles}
+        # the templates of a page might be split over several continuations
+        for page in self.site.api_continue_iter('query', item_key='pages', prop='templates|info', tllimit='max',
+                                                titles='|'.join(titles)):
+            if 'missing' in page or 'invalid' in page:
+                continue
+            entry = result.get(page['title'])
+            if entry is None:
+                entry = result[page['title']] = (page['pageid'], page['ns'], 'redirect' in page, set())
+            entry[3].update(template['title'] for template in page.get('templates', []))
+        return result
+
+    def _store(self, fetched: Dict[str, Optional[Tuple[int, int, bool, Set[str]]]]):
+        with self._lock, self._connection:
+            titles = list(fetched)
+            self._connection.executemany('DELETE FROM links WHERE page = ?', ((title,) for title in titles))
+            self._connection.executemany('DELETE FROM pages WHERE title = ?', ((title,) for title in titles))
+            for title, entry in fetched.items():
+                if entry is None:
+                    continue
+                pageid, namespace, redirect, templates = entry
+                self._connection.execute('INSERT INTO pages (title, pageid, namespace, redirect) VALUES (?, ?, ?, ?)',
+                                         (title, pageid, namespace, int(redirect)))
+                self._connection.executemany('INSERT INTO links (page, template) VALUES (?, ?)',
+                                             ((title, template) for template in templates))
+
+    def _refresh(self, titles: Iterable[str], max_workers: int):
+        for fetched in imap_ordered(self._fetch_templates, chunked(titles, self.site.max_titles),
+                                    max_workers=max_workers):
+            self._store(fetched)
+
+    def build(self, namespace: int, max_workers: int = 4):
+        """Index the templates of all pages of the ``namespace``, querying many pages per request."""
+
+        self._start_following()
+        self._refresh(crawl_titles(self.site, namespace, max_workers=max_workers), max_workers)
+        self.mark_built([namespace])
+
+    def update(self, max_age: float = 0, max_workers: int = 4):
+        """Refetch the templates of the pages that changed since the last update, according to the recent changes,
+        and of the pages that use a changed page (now, and again after ``RECHECK_DELAY``).
+
+        :param max_age: Don't update if the last update is more recent than this many seconds.
+        :param max_workers: The maximum number of requests in flight.
+        """
+
+        if self._is_current(max_age):
+            return
+        self._update(lambda changed: self._apply_changes(changed, max_workers))
+
+    def _apply_changes(self, changed: List[str], max_workers: int):
+        namespaces = set(self.namespaces)
+        titles = [title for title in changed if self.site.title_normalizer.split(title)[0] in namespaces]
+        users = self.pages_using(changed)
+        now = time.time()
+        with self._lock:
+            due = [row[0] for row in self._connection.execute('SELECT title FROM recheck WHERE due <= ?', (now,))]
+        self._refresh(dict.fromkeys(titles + users + due), max_workers)
+
+        with self._lock, self._connection:
+            self._connection.executemany('DELETE FROM recheck WHERE title = ?', ((title,) for title in due))
+            self._connection.executemany('INSERT OR REPLACE INTO recheck (title, due) VALUES (?, ?)',
+                                         ((title, now + RECHECK_DELAY) for title in users))
+
+    def pages_using(self, templates: Iterable[str], namespace: int = None, filterredir: str = 'all') -> List[str]:
+        """Return the titles of the indexed pages that transclude any of the ``templates`` (full titles), sorted.
+
+        :param namespace: Optional. Only return pages in this namespace.
+        :param filterredir: ``all``, ``redirects``, or ``nonredirects``.
+        """
+
+        templates = list(templates)
+        conditions = ''
+        parameters = []
+        if namespace is not None:
+            conditions += ' AND pages.namespace = ?'
+            parameters.append(namespace)
+        if filterredir == 'redirects':
+            conditions += ' AND pages.redirect = 1'
+        elif filterredir == 'nonredirects':
+            conditions += ' AND pages.redirect = 0'
+
+        titles = set()
+        with self._lock:
+            for i in range(0, len(templates), _MAX_VARIABLES):
+                chunk = templates[i:i + _MAX_VARIABLES]
+                rows = self._connection.execute(
+                    'SELECT DISTINCT links.page FROM links JOIN pages ON pages.title = links.page '
+                    'WHERE links.template IN ({}){}'.format(','.join('?' * len(chunk)), conditions),
+                    chunk + parameters
+                )
+                titles.update(row[0] for row in rows)
+        return sorted(titles)
+
+    def templates_of(self, title: str) -> List[str]:
+        """Return the titles of the pages that the page with the ``title`` transcludes, sorted."""
+        with self._lock:
+            rows = self._connection.execute('SELECT template FROM links WHERE page = ? ORDER BY template', (title,))
+            return [row[0] for row in rows]
+
+    def get_pageids(self, titles: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+        """Return the page IDs and namespaces of the indexed pages with the ``titles``."""
+
+        titles = list(titles)
+        result = {}
+        with self._lock:
+            for i in range(0, len(titles), _MAX_VARIABLES):
+                chunk = titles[i:i + _MAX_VARIABLES]
+                rows = self._connection.execute(
+                    'SELECT title, pageid, namespace FROM pages WHERE title IN ({})'.format(','.join('?' * len(chunk))),
+                    chunk
+                )
+                for title, pageid, namespace in rows:
+                    result[title] = (pageid, namespace)
+        return result
@@ -1,5 +1,7 @@
 import datetime
-import time
+import hashlib
+import os
+import threading
 import logging
 
 from mwclient.page import Page
@@ -7,16 +9,26 @@ from mwclient.errors import AssertUserFailedError
 from mwclient.errors import APIError
 from mwclient.errors import ProtectedPageError
 from requests.exceptions import ReadTimeout
-from typing import Optional, Union, List, Dict
-import mwparserfromhell
+from typing import Callable, Optional, Union, List, Dict, Iterable, Iterator, Tuple
 
 from custom_mwclient.models.simple_page import SimplePage
 from custom_mwclient.models.namespace import Namespace
+from custom_utils import section_util
+from custom_utils.iter_util import chunked, imap_ordered
+from custom_utils.parse_cache import parse_cache
 
 from .auth_credentials import AuthCredentials
-from .errors import RetriedLoginAndStillFailed, InvalidNamespaceName, PatrolRevisionNotSpecified, PatrolRevisionInvalid
+from .lazy_page import LazyPage, PageLoader
+from .errors import InvalidNamespaceName, PatrolRevisionNotSpecified, PatrolRevisionInvalid
+from .page_store import PageStore, PAGESTOREFILE
+from .retry_scheduler import retry_scheduler, get_circuit_breaker
+from . import run_metrics
+from .run_metrics import RunMetrics
+from . import section_diff
 from .session_manager import session_manager
 from .site import Site
+from .site_info import SiteInfo, SITEINFOFILE
+from .title_normalizer import TitleNormalizer
 
 
 class WikiClient(object):
@@ -30,7 +42,8 @@ class WikiClient(object):
     client = None
     write_errors = (AssertUserFailedError, ReadTimeout, APIError)
 
-    def __init__(self, url: str, path='/', credentials: AuthCredentials = None, client: Site = None, max_retries=3, retry_interval=10, **kwargs):
+    def __init__(self, url: str, path='/', credentials: AuthCredentials = None, client: Site = None, max_retries=3, retry_interval=10,
+                 wikiname: str = None, localdata_directory: str = None, use_page_store=True, **kwargs):
         self.scheme = None
         if 'http://' in url:
             self.scheme = 'http'
@@ -52,9 +65,27 @@ class WikiClient(object):
         self.kwargs = kwargs
         self.max_retries = max_retries
         self.retry_interval = retry_interval
+        self.wikiname = wikiname
+        self._localdata_directory = localdata_directory
+        self.use_page_store = use_page_store
 
+        self._page_store = None
+        self._transclusion_index = None
         self._namespaces = None
         self._ns_name_to_ns = None
+        self._title_normalizer = None
+        self._title_normalizer_source = None
+        self._relog_lock = threading.Lock()
+        self._login_generation = 0
+        self._page_loader = PageLoader(self)
+        # titles that are known not to exist, see pages_exist
+        self._missing_titles = set()
+        self._missing_titles_lock = threading.Lock()
+        self.metrics = RunMetrics()
+
+        directory = self.localdata_directory
+        siteinfo_file = os.path.join(directory, SITEINFOFILE) if directory is not None else None
+        self.siteinfo = SiteInfo(self._fetch_siteinfo, filename=siteinfo_file)
 
         if client:
             self.client = client
@@ -70,10 +101,55 @@ class WikiClient(object):
         self.client.login(username=self.credentials.username, password=self.credentials.password)
 
 
-    def relog(self):
-        """Completely discards pre-existing session and creates a new site object."""
-        # The session manager will log in for us too
-        self.client = session_manager.get_client(url=self.url, path=self.path, credentials=self.credentials, **self.kwargs, force_new=True)
+    def relog(self, generation: int = None):
+        """Completely discards pre-existing session and creates a new site object.
+
+        Concurrent relogs are coalesced: if ``generation`` (the value of ``login_generation`` when the caller
+        noticed the failure) is given and another thread has relogged since, the new session is used as it is.
+        """
+        with self._relog_lock:
+            if generation is not None and generation != self._login_generation:
+                return
+            # The session manager will log in for us too
+            self.client = session_manager.get_client(url=self.url, path=self.path, scheme=self.scheme, credentials=self.credentials, **self.kwargs, force_new=True)
+            self._login_generation += 1
+
+    @property
+    def login_generation(self) -> int:
+        """Number of relogs of this client so far."""
+        return self._login_generation
+
+    def _check_session(self):
+        """Relog if the session was dropped by the server, so that the next write doesn't fail on it.
+
+        The session manager only health-checks sessions that haven't been used for a while, so this is cheap.
+
+        Returns the login generation of the session that the write is then sent on, to pass to ``schedule_retry`` if
+        it fails. It is read before the write, so that a failure that only arrives after another thread relogged
+        doesn't cause a second relog.
+        """
+        generation = self._login_generation
+        if not session_manager.check_client(self.client):
+            self.relog(generation)
+        return self._login_generation
+
+    @property
+    def localdata_directory(self) -> Optional[str]:
+        """The directory with the local data of this wiki (as passed to the constructor), or ``None`` if there is none."""
+        directory = self._localdata_directory
+        if directory is None or not os.path.isdir(directory):
+            return None
+        return directory
+
+    @property
+    def page_store(self) -> Optional[PageStore]:
+        """The persistent store of page texts for this wiki, or ``None`` if it is disabled or there is no local data directory."""
+        if self._page_store is not None or not self.use_page_store:
+            return self._page_store
+        directory = self.localdata_directory
+        if directory is not None:
+            self._page_store = PageStore(os.path.join(directory, PAGESTOREFILE))
+        return self._page_store
 
     @property
     def namespaces(self):
@@ -90,22 +166,54 @@ class WikiClient(object):
         self._ns_name_to_ns: Dict[str, Namespace]
         return self._ns_name_to_ns
 
+    @property
+    def title_normalizer(self) -> TitleNormalizer:
+        """Normalizes titles locally, using the namespaces of the siteinfo. It is rebuilt when the siteinfo is refreshed."""
+        data = self.siteinfo.data
+        if self._title_normalizer is None or self._title_normalizer_source is not data:
+            self._title_normalizer = TitleNormalizer(data['namespaces'], data['namespacealiases'])
+            self._title_normalizer_source = data
+        return self._title_normalizer
+
+    def _fetch_siteinfo(self) -> dict:
+        # only site-wide data, since the snapshot is shared by all accounts on the wiki
+        result = self.client.api('query', meta='siteinfo', siprop='general|namespaces|namespacealiases')
+        return {
+            'general': result['query']['general'],
+            'namespaces': result['query']['namespaces'],
+            'namespacealiases': result['query']['namespacealiases'],
+        }
+
+    @property
+    def has_apihighlimits(self) -> bool:
+        """Whether the logged-in user has the higher API limits, according to the rights of the current session."""
+        return 'apihighlimits' in self.client.rights
+
+    @property
+    def max_titles(self) -> int:
+        """The maximum number of titles (or IDs) per API request for the logged-in user."""
+        return 500 if self.has_apihighlimits else 50
+
+    @property
+    def max_list_items(self) -> int:
+        """The maximum ``limit`` of list queries for the logged-in user."""
+        return 5000 if self.has_apihighlimits else 500
+
     def _populate_namespaces(self):
-        result = self.client.api('query', meta='siteinfo', siprop="namespaces|namespacealiases")
         ns_aliases = {}
-        for alias in result['query']['namespacealiases']:
+        for alias in self.siteinfo.namespacealiases:
             alias_key = str(alias['id'])
             if alias_key not in ns_aliases:
                 ns_aliases[alias_key] = []
             ns_aliases[alias_key].append(alias['*'])
         ns_list = []
         ns_map = {}
-        for ns_str, ns_data in result['query']['namespaces'].items():
+        for ns_str, ns_data in self.siteinfo.namespaces.items():
             ns = int(ns_str)
             canonical = ns_data.get('canonical')
             aliases = ns_aliases.get(ns_str)
             ns_obj = Namespace(id_number=ns, name=ns_data['*'],
-                               canonical_name=canonical, aliases=aliases)
+                               canonical_name=canonical, aliases=aliases, case=ns_data.get('case'))
             ns_list.append(ns_obj)
             ns_map[ns_data['*']] = ns_obj
             if canonical is not None:
@@ -117,13 +225,30 @@ class WikiClient(object):
         self._ns_name_to_ns = ns_map
 
     def get_ns_number(self, ns: str):
-        ns_obj = self.ns_name_to_namespace.get(ns)
-        if ns_obj is None:
+        """Return the ID of the namespace with the name, canonical name, or alias ``ns``, ignoring case and underscores."""
+        ns_id = self.title_normalizer.namespace_id(ns)
+        if ns_id is None:
             raise InvalidNamespaceName
-        return ns_obj.id
+        return ns_id
 
-    def pages_using(self, template, namespace: Optional[Union[int, str]] = None, filterredir='all', limit=None, generator=True):
-        """Return a list of ``mwclient.page`` objects that are transcluding the specified page."""
+    @property
+    def transclusion_index(self):
+        """The local transclusion index of this wiki (see ``pages_using``), or ``None`` if there is no localdata
+        directory for it."""
+        if self._transclusion_index is None and self.localdata_directory is not None:
+            # imported here because the index uses a follower of the recent changes, whose module imports this one
+            from .transclusion_index import TransclusionIndex, TRANSCLUSIONINDEXFILE
+            self._transclusion_index = TransclusionIndex(self, os.path.join(self.localdata_directory, TRANSCLUSIONINDEXFILE))
+        return self._transclusion_index
+
+    def pages_using(self, template, namespace: Optional[Union[int, str]] = None, filterredir='all', limit=None, generator=True,
+                    max_age: Optional[float] = 300):
+        """Return a list of ``mwclient.page`` objects that are transcluding the specified page.
+
+        If the namespace is in the local transclusion index (see ``TransclusionIndex.build``), the pages are taken from
+        there, after updating the index from the recent changes if its last update is older than ``max_age`` seconds.
+        If that update fails, or with ``max_age=None``, the wiki is queried directly.
+        """
 
         if isinstance(namespace, str):
             namespace = self.get_ns_number(namespace)
@@ -133,9 +258,30 @@ class WikiClient(object):
             title = template[1:]
         else:
             title = template
+
+        index = self.transclusion_index if max_age is not None else None
+        if index is not None and index.covers(namespace):
+            try:
+                index.update(max_age=max_age)
+            except KeyboardInterrupt:
+                raise
+            except Exception:
+                logging.getLogger(__name__).warning('Could not update the transclusion index; querying the wiki instead.', exc_info=True)
+            else:
+                titles = index.pages_using([self.title_normalizer.normalize(title)], namespace=namespace, filterredir=filterredir)
+                if generator:
+                    return self.lazy_pages(titles)
+                pageids = index.get_pageids(titles)
+                return [{'pageid': pageids[t][0], 'ns': pageids[t][1], 'title': t} for t in titles if t in pageids]
+
         return self.client.pages[title].embeddedin(namespace=namespace, filterredir=filterredir, limit=limit, generator=generator)
 
     def recentchanges_by_interval(self, minutes, offset=0, prop='title|ids|tags|user|patrolled', **kwargs):
+        """Return the recent changes of the last ``minutes`` minutes.
+
+        Watchers that poll repeatedly should use ``followers.RecentChangesFollower`` instead, which doesn't download
+        any change twice or miss changes between polls.
+        """
         now = datetime.datetime.utcnow() - datetime.timedelta(minutes=offset)
         then = now - datetime.timedelta(minutes=minutes)
         result = self.client.recentchanges(
@@ -153,10 +299,20 @@ class WikiClient(object):
         return titles
 
     def recent_pages_by_interval(self, *args, **kwargs):
-        revisions = self.recent_titles_by_interval(*args, **kwargs)
-        titles = [rev['title'] for rev in revisions]
-        for title in titles:
-            yield self.client.pages[title]
+        titles = self.recent_titles_by_interval(*args, **kwargs)
+        yield from self.lazy_pages(titles)
+
+    def lazy_page(self, title: str) -> LazyPage:
+        """Return a page object that is only loaded when it is first used.
+
+        All lazy pages that haven't been used yet are loaded together at that point, in batches of titles, so creating
+        many pages at once only takes a few requests. See ``LazyPage``.
+        """
+        return self._page_loader.page(title)
+
+    def lazy_pages(self, titles: Iterable[str]) -> List[LazyPage]:
+        """Return lazy page objects for all of the ``titles``, see ``lazy_page``."""
+        return self._page_loader.pages(titles)
 
     def target(self, name: str):
         """Return the name of a page's redirect target.
@@ -172,57 +328,179 @@ class WikiClient(object):
         """
         if name is None or name == '':
             return None
-        return self.client.pages[name].resolve_redirect().name
-
-    def get_simple_pages(self, title_list: List[str], limit: int) -> List[SimplePage]:
-        titles_paginated = []
-        i = 0
-        paginated_element = []
-        for title in title_list:
-            if i == limit:
-                titles_paginated.append(paginated_element)
-                paginated_element = []
-                i = 0
-            paginated_element.append(title)
-            i += 1
-        ret = []
-        titles_paginated.append(paginated_element)
-        for query in titles_paginated:
-            result = self.client.api('query', prop='revisions', titles='|'.join(query), rvprop='content',
-                                     rvslots='main')
-            unsorted_pages = []
-            for pageid in result['query']['pages']:
-                row = result['query']['pages'][pageid]
-                name = row['title']
-                text = row['revisions'][0]['slots']['main']['*'] if row.get('revisions') else ''
-                exists = True if row.get('revisions') else False
-                unsorted_pages.append(SimplePage(name=name, text=text, exists=exists))
-
-            # de-alphabetize & sort according to our initial order
-            capitalization_corrected_query = []
-            for title in query:
-                capitalization_corrected_query.append(title[0].upper() + title[1:])
-                # We don't know if the : is actually separating a namespace or not. So we'll put both in our lookup for
-                # the purpose of re-ordering the response that the api gave us. This is a safe thing to do AS LONG AS
-                # both capitalizations didn't previously exist in the original query given to us by the user
-                # So along the way just double check that wasn't the case.
-
-                # This might be a bit of a hack but it works out pretty nicely; there's only two possible ways the title
-                # could be capitalized, and they end up consecutive in our list (again unless the user specifically
-                # specified both separately), so when we reorder later we're guaranteed to look up and find the entry,
-                # and have it be in the right order.
-                if ':' in title:
-                    p = title.index(':')
-                    ns_ucfirst_title = title[0].upper() + title[1:p + 1] + title[p + 1].upper() + title[p + 2:]
-                    if not any([ns_ucfirst_title in q for q in titles_paginated]):
-                        capitalization_corrected_query.append(ns_ucfirst_title)
-            unsorted_pages.sort(key=lambda x: capitalization_corrected_query.index(x.name))
-            ret += unsorted_pages
-        return ret
+        return self.targets([name])[name]
+
+    def targets(self, names: Iterable[str]) -> Dict[str, Optional[str]]:
+        """Return the names of the redirect targets of many pages, querying them in batches of the API limit.
+
+        Returns
+        -------
+        - A dict of each name to the name of its redirect target. Pages that aren't redirects map to their own
+          (normalized) name, and invalid titles map to ``None``.
+        """
+        names = list(names)
+        result = {}
+        for title, name, page, query in self._query_by_title(names, prop='info', redirects=''):
+            if page is None or 'invalid' in page:
+                result[title] = None
+            else:
+                result[title] = page['title']
+        for name in names:
+            result.setdefault(name, None)
+        return result
+
+    def _query_by_title(self, titles: Iterable[str], on_error: Callable[[List[str]], None] = None,
+                        **kwargs) -> Iterator[Tuple[str, str, Optional[dict], dict]]:
+        """Query the titles in batches of the API limit and yield ``(title, name, page, query)`` for each of them.
+
+        ``name`` is the normalized title, ``page`` is the entry of the title in the ``pages`` of the result (following
+        the redirects if the ``redirects`` parameter is passed), and ``query`` is the ``query`` part of the result
+        of the title's batch. Duplicate titles are only yielded once.
+
+        If ``on_error`` is given, it is called with the titles of a batch whose request failed (while the exception is
+        being handled), and the next batches are still queried. Otherwise, the error is raised.
+        """
+        titles = list(dict.fromkeys(title for title in titles if title))
+        for batch in chunked(titles, self.max_titles):
+            try:
+                query = self.client.api('query', titles='|'.join(batch), **kwargs).get('query', {})
+            except KeyboardInterrupt:
+                raise
+            except:
+                if on_error is None:
+                    raise
+                on_error(batch)
+                continue
+            pages_by_title = {page['title']: page for page in query.get('pages', {}).values()}
+            title_map = {}
+            for key in ('normalized', 'converted'):
+                for entry in query.get(key, []):
+                    title_map[entry['from']] = entry['to']
+            redirect_map = {entry['from']: entry['to'] for entry in query.get('redirects', [])}
+            normalize = self.title_normalizer.normalize
+            for title in batch:
+                name = normalize(title)
+                if name not in pages_by_title and name not in redirect_map:
+                    # e.g. language variants, which are only known to the API
+                    name = title_map.get(title, title)
+                    name = title_map.get(name, name) # normalized titles might have been converted as well
+                target = redirect_map.get(name, name)
+                yield (title, name, pages_by_title.get(target), query)
+
+    def get_simple_pages(self, title_list: List[str], limit: int, max_workers: int = 4) -> List[SimplePage]:
+        """Return a list of ``SimplePage`` objects for the titles in the ``title_list``, in the same order.
+
+        See ``iter_simple_pages`` for the parameters.
+        """
+        return list(self.iter_simple_pages(title_list, limit, max_workers=max_workers))
+
+    def iter_simple_pages(self, title_list: Iterable[str], limit: int, max_workers: int = 4) -> Iterator[SimplePage]:
+        """Fetch the texts of the titles in the ``title_list`` and yield them as ``SimplePage`` objects, in the same order.
+
+        The titles are queried in batches of ``limit``, and up to ``max_workers`` batches are fetched at the same time.
+        Pages are yielded as soon as their batch (and all batches before it) has arrived. Duplicate titles within a
+        batch are only yielded once.
+
+        If the wiki has a page store, only the revision IDs are queried first, and the full texts are only downloaded
+        for pages that changed since they were stored.
+
+        Parameters
+        ----------
+        1. title_list : Iterable[str]
+            - The page titles. May be a generator; it is consumed lazily.
+        2. limit : int
+            - The number of titles per API request. If you are logged out or not a sysop, probably 50.
+        3. max_workers : int
+            - The maximum number of API requests in flight.
+        """
+
+        for pages in imap_ordered(self._fetch_simple_pages_batch, chunked(title_list, limit), max_workers=max_workers):
+            yield from pages
+
+    def _fetch_simple_pages_batch(self, titles: List[str]) -> List[SimplePage]:
+        if self.page_store is None:
+            return self._query_simple_pages(titles, rvprop='content|ids|sha1')
+
+        # only check the current revision IDs first, and download the texts of the pages that changed since we stored them
+        current_pages = self._query_simple_pages(titles, rvprop='ids|sha1')
+        stored_revids = self.page_store.get_revids(page.name for page in current_pages if page.exists)
+        outdated_titles = [page.name for page in current_pages if page.exists and stored_revids.get(page.name) != page.revid]
+        fetched_pages = {}
+        if outdated_titles:
+            fetched_pages = {page.name: page for page in self._query_simple_pages(outdated_titles, rvprop='content|ids|sha1')}
+        self.page_store.put_many(list(fetched_pages.values()) + [page for page in current_pages if not page.exists])
+        stored_pages = self.page_store.get_many(title for title in stored_revids if title not in fetched_pages)
+
+        result = []
+        for page in current_pages:
+            if page.name in fetched_pages:
+                result.append(fetched_pages[page.name])
+            elif page.name in stored_pages:
+                result.append(stored_pages[page.name])
+            else:
+                result.append(page) # page doesn't exist
+        return result
+
+    def _query_simple_pages(self, titles: List[str], rvprop: str) -> List[SimplePage]:
+        result = self.client.api('query', prop='revisions', titles='|'.join(titles), rvprop=rvprop,
+                                 rvslots='main')
+        return self._simple_pages_from_result(result, titles, normalize=self.title_normalizer.normalize)
+
+    @staticmethod
+    def _simple_pages_from_result(result: dict, titles: List[str], normalize=None) -> List[SimplePage]:
+        # the API returns the pages keyed by ID and with normalized titles, so map them back to our input titles
+        pages_by_title = {}
+        for row in result['query'].get('pages', {}).values():
+            name = row['title']
+            revision = row['revisions'][0] if row.get('revisions') else {}
+            text = revision['slots']['main']['*'] if 'slots' in revision else ''
+            exists = True if revision else False
+            pages_by_title[name] = SimplePage(name=name, text=text, exists=exists,
+                                              revid=revision.get('revid'), sha1=revision.get('sha1'))
+        title_map = {}
+        for key in ('normalized', 'converted'):
+            for entry in result['query'].get(key, []):
+                title_map[entry['from']] = entry['to']
+
+        ordered_pages = []
+        seen = set()
+        for title in titles:
+            name = normalize(title) if normalize is not None else title
+            if name not in pages_by_title:
+                # e.g. language variants, which are only known to the API
+                name = title_map.get(title, title)
+                name = title_map.get(name, name) # normalized titles might have been converted as well
+            if name in seen or name not in pages_by_title:
+                continue
+            seen.add(name)
+            ordered_pages.append(pages_by_title[name])
+        return ordered_pages
+
+    def get_page_text(self, page: Union[Page, str]) -> str:
+        """Return the current text of a page, from the page store if it is up to date there.
+
+        Returns an empty string if the page doesn't exist.
+        """
+        simple_page = self.get_simple_page(page)
+        return simple_page.text if simple_page is not None else ''
+
+    def get_simple_page(self, page: Union[Page, str]) -> Optional[SimplePage]:
+        """Return the current revision of a page as ``SimplePage``, from the page store if it is up to date there.
+
+        Returns ``None`` if the title is invalid.
+        """
+        title = page if isinstance(page, str) else page.name
+        for simple_page in self._fetch_simple_pages_batch([title]):
+            return simple_page
+        return None
 
     def logs_by_interval(self, minutes, offset=0,
                          lelimit="max",
                          leprop='details|type|title|tags', **kwargs):
+        """Return the log events of the last ``minutes`` minutes, newest first.
+
+        Watchers that poll repeatedly should use ``followers.LogFollower`` instead.
+        """
         now = datetime.datetime.utcnow() - datetime.timedelta(minutes=offset)
         then = now - datetime.timedelta(minutes=minutes)
         logs = self.client.api('query', format='json',
@@ -239,26 +517,28 @@ class WikiClient(object):
     def patrol(self, revid=None, rcid=None, **kwargs):
         if revid is None and rcid is None:
             raise PatrolRevisionNotSpecified
+        generation = self._check_session()
+        # the token is cached by the site object, so this only makes a request for the first patrol of the session
         patrol_token = self.client.get_token('patrol')
         try:
             self.client.api('patrol', revid=revid, rcid=rcid, **kwargs, token=patrol_token)
-        except APIError as e:
-            if e.code == 'nosuchrevid' or e.code == 'nosuchrcid':
+        except self.write_errors as e:
+            if isinstance(e, APIError) and e.code in ('nosuchrevid', 'nosuchrcid'):
                 raise PatrolRevisionInvalid
-            self._retry_login_action(self._retry_patrol, 'patrol',
-                                     revid=revid, rcid=rcid, token=patrol_token, **kwargs)
+            self._retry_login_action(generation, self._retry_patrol, 'patrol', revid=revid, rcid=rcid, **kwargs)
 
     def _retry_patrol(self, **kwargs):
         # one of these two must be provided but not both
         revid = kwargs.pop('revid') if 'revid' in kwargs else None
         rcid = kwargs.pop('rcid') if 'rcid' in kwargs else None
 
-        # token is mandatory
-        token = kwargs.pop('token')
+        # the token of the old session isn't valid anymore, so get one from the new site object, post-relog
+        token = self.client.get_token('patrol')
         self.client.api('patrol', revid=revid, rcid=rcid, token=token, **kwargs)
 
 
-    def save(self, page: Page, text, summary=u'', minor=False, bot=True, section=None, log=None, **kwargs):
+    def save(self, page: Page, text, summary=u'', minor=False, bot=True, section=None, log=None,
+             skip_unchanged=True, **kwargs):
         """Performs a page edit, retrying the login once if the edit fails due to the user being logged out.
 
         This function hopefully makes it easy to workaround the lag and frequent login timeouts
@@ -270,8 +550,19 @@ class WikiClient(object):
             - The page object of the page to save.
         2.–8.
             - As in mwclient.Page.save().
+        9. skip_unchanged : bool
+            - Don't send the edit if the text is the same as the current revision's, according to the SHA-1 hash
+              of the page store. Skipped edits are counted in ``metrics``.
         """
+        if skip_unchanged and section is None and self._is_unchanged(page, text):
+            self.metrics.increment(run_metrics.EDITS_SKIPPED)
+            return
+        generation = self._check_session()
+        self._forget_missing(page.name)
+        self.metrics.increment(run_metrics.EDITS)
         try:
+            # the page might be from a site object from before a relog
+            page.site = self.client
             page.edit(text, summary=summary, minor=minor, bot=bot, section=section, **kwargs)
         except ProtectedPageError:
             if log:
@@ -279,13 +570,26 @@ class WikiClient(object):
             else:
                 raise
         except self.write_errors:
-            self._retry_login_action(self._retry_save, 'edit', page=page, text=text, summary=summary, minor=minor,
-                                     bot=bot, section=section, log=log, **kwargs)
+            self._retry_login_action(generation, self._retry_save, 'edit', page=page, text=text, summary=summary,
+                                     minor=minor, bot=bot, section=section, log=log, **kwargs)
+
+    def _is_unchanged(self, page: Page, text: str) -> bool:
+        """Return whether the ``text`` is the text of the current revision of the ``page``, without downloading it.
+
+        This is only known if the page store has the current revision of the page.
+        """
+        if self.page_store is None or not page.exists or not page.revision:
+            return False
+        stored = self.page_store.get_sha1s([page.name]).get(page.name)
+        if stored is None or stored[0] != page.revision or not stored[1]:
+            return False
+        # MediaWiki strips trailing whitespace from every saved text
+        return hashlib.sha1(section_diff.mw_rtrim(text).encode('utf-8')).hexdigest() == stored[1]
 
     def _retry_save(self, **kwargs):
         old_page: Page = kwargs.pop('page')
         # recreate the page object so that we're using the new site object, post-relog
-        page = self.client.pages[old_page.name]
+        page = self.lazy_page(old_page.name)
         text = kwargs.pop('text')
         log = kwargs.pop('log')
         try:
@@ -296,99 +600,203 @@ class WikiClient(object):
             else:
                 raise
 
+    def save_diff(self, page: Page, text, summary=u'', minor=False, bot=True, log=None, old_text=None,
+                  skip_unchanged=True, **kwargs):
+        """Like ``save``, but only sends the part of the text that changed.
+
+        The old and the new text are compared, and the smallest request that results in the new text is used: appending,
+        prepending, replacing a single section, or the full text (see ``section_diff.plan_edit``). Edit conflicts are
+        still detected, since the timestamp of the revision that the old text is from is sent along.
+
+        Parameters
+        ----------
+        1. page : Page
+            - The page object of the page to save.
+        2.–5.
+            - As in mwclient.Page.save().
+        6. log : function
+            - As in ``save``.
+        7. old_text : str
+            - Optional. The current text of the page, if it was already retrieved with ``page.text()``.
+        8. skip_unchanged : bool
+            - As in ``save``; if ``old_text`` is given, it is compared instead of the page store.
+        """
+        if skip_unchanged:
+            if old_text is not None:
+                unchanged = section_diff.mw_rtrim(old_text) == section_diff.mw_rtrim(text)
+            else:
+                unchanged = self._is_unchanged(page, text)
+            if unchanged:
+                self.metrics.increment(run_metrics.EDITS_SKIPPED)
+                return
+        generation = self._check_session()
+        self._forget_missing(page.name)
+        self.metrics.increment(run_metrics.EDITS)
+        try:
+            page.site = self.client
+            self._edit_diff(page, text, old_text, summary=summary, minor=minor, bot=bot, **kwargs)
+        except ProtectedPageError:
+            if log:
+                log(exc_info=True, s='Error while saving page {}: Page is protected!'.format(page.name))
+            else:
+                raise
+        except self.write_errors:
+            self._retry_login_action(generation, self._retry_save_diff, 'edit', page=page, text=text, summary=summary,
+                                     minor=minor, bot=bot, log=log, **kwargs)
+
+    @staticmethod
+    def _edit_diff(page: Page, text, old_text=None, **kwargs):
+        if old_text is None:
+            # this also sets the base timestamp of the edit
+            old_text = page.text()
+        edit = section_diff.plan_edit(old_text, text)
+        if edit.mode == section_diff.APPEND:
+            return page.append(edit.text, **kwargs)
+        if edit.mode == section_diff.PREPEND:
+            return page.prepend(edit.text, **kwargs)
+        return page.edit(edit.text, section=edit.section, **kwargs)
+
+    def _retry_save_diff(self, **kwargs):
+        old_page: Page = kwargs.pop('page')
+        # recreate the page object so that we're using the new site object, post-relog
+        page = self.lazy_page(old_page.name)
+        text = kwargs.pop('text')
+        log = kwargs.pop('log')
+        old_text = page.text()
+        # keep the base timestamp of the original attempt, so that edits since then are still detected as conflicts
+        if old_page.last_rev_time:
+            page.last_rev_time = old_page.last_rev_time
+            page.edit_time = old_page.edit_time
+        try:
+            self._edit_diff(page, text, old_text, **kwargs)
+        except ProtectedPageError:
+            if log:
+                log(exc_info=True, s='Error while saving page {}: Page is protected!'.format(page.name))
+            else:
+                raise
+
     def touch(self, page: Page, summary: str = u''):
         """Perform a null-edit on the page.
 
         The summary will be used in case of edit conflicts, i.e.
         when the null-edit unintentionally reverts someone's edits.
+
+        Pages that don't exist are left alone by the wiki (``nocreate``), so the page doesn't have to be queried
+        beforehand.
         """
+        generation = self._check_session()
+        self.metrics.increment(run_metrics.TOUCHES)
         try:
             page.site = self.client
-            if page.exists:
-                page.append('', summary, minor=True)
+            self._null_edit(page, summary)
         except self.write_errors:
-            self._retry_login_action(self._retry_touch, 'touch', page=page, summary=summary)
+            self._retry_login_action(generation, self._retry_touch, 'touch', page=page, summary=summary)
+
+    @staticmethod
+    def _null_edit(page: Page, summary: str):
+        try:
+            page.append('', summary, minor=True, nocreate=True)
+        except APIError as e:
+            if e.code != 'missingtitle':
+                raise
 
     def _retry_touch(self, **kwargs):
         old_page = kwargs['page']
-        page = self.client.pages[old_page.name]
-        page.touch()
+        page = self.lazy_page(old_page.name)
+        self._null_edit(page, kwargs['summary'])
 
     def purge_title(self, title: str):
-        self.purge(self.client.pages[title])
+        self.purge(self.lazy_page(title))
 
     def purge(self, page: Page):
+        generation = self._check_session()
+        self.metrics.increment(run_metrics.PURGES)
         try:
             page.site = self.client
             page.purge()
         except self.write_errors:
-            self._retry_login_action(self._retry_purge, 'purge', page=page)
+            self._retry_login_action(generation, self._retry_purge, 'purge', page=page)
 
     def _retry_purge(self, **kwargs):
         old_page = kwargs['page']
-        page = self.client.pages[old_page.name]
+        page = self.lazy_page(old_page.name)
         page.purge()
 
 
     def move(self, page: Page, new_title, reason='', move_talk=True, no_redirect=False,
              move_subpages=False, ignore_warnings=False):
+        generation = self._check_session()
+        self._forget_missing(new_title)
+        self.metrics.increment(run_metrics.MOVES)
         try:
             page.site = self.client
             page.move(new_title, reason=reason, move_talk=move_talk, no_redirect=no_redirect,
                       move_subpages=move_subpages, ignore_warnings=ignore_warnings)
         except APIError as e:
             if e.code == 'badtoken':
-                self._retry_login_action(self._retry_move, 'move', page=page, new_title=new_title,
-                                         reason=reason, move_talk=move_talk, no_redirect=no_redirect,
-                                         move_subpages=move_subpages, ignore_warnings=ignore_warnings)
+                self._retry_login_action(generation, self._retry_move, 'move', page=page, new_title=new_title,
+                                                     reason=reason, move_talk=move_talk, no_redirect=no_redirect,
+                                                     move_subpages=move_subpages, ignore_warnings=ignore_warnings)
             else:
                 raise e
 
     def _retry_move(self, **kwargs):
         old_page: Page = kwargs.pop('page')
-        page = self.client.pages[old_page.name]
+        page = self.lazy_page(old_page.name)
         new_title = kwargs.pop('new_title')
         page.move(new_title, **kwargs)
 
 
     def delete(self, page: Page, reason='', watch=False, unwatch=False, oldimage=False):
+        generation = self._check_session()
+        self.metrics.increment(run_metrics.DELETIONS)
         try:
             page.site = self.client
             page.delete(reason=reason, watch=watch, unwatch=unwatch, oldimage=oldimage)
         except APIError as e:
             if e.code == 'badtoken':
-                self._retry_login_action(self._retry_delete, 'delete', page=page, reason=reason,
-                                         watch=watch, unwatch=unwatch, oldimage=oldimage)
+                self._retry_login_action(generation, self._retry_delete, 'delete', page=page, reason=reason,
+                                                     watch=watch, unwatch=unwatch, oldimage=oldimage)
             else:
                 raise e
 
     def _retry_delete(self, **kwargs):
         old_page: Page = kwargs.pop('page')
-        page = self.client.pages[old_page.name]
+        page = self.lazy_page(old_page.name)
         page.delete(**kwargs)
 
 
-    def _retry_login_action(self, f, failure_type, **kwargs):
-        was_successful = False
-        codes = []
-        for retry in range(self.max_retries):
-            self.relog()
-            # don't sleep at all the first retry, and then increment in retry_interval intervals
-            # default interval is 10, default retries is 3
-            time.sleep((2 ** retry - 1) * self.retry_interval)
-            try:
-                f(**kwargs)
-                was_successful = True
-                break
-            except self.write_errors as e:
-                if isinstance(e, APIError):
-                    codes.append(e.code)
-                continue
-        if not was_successful:
-            raise RetriedLoginAndStillFailed(failure_type, codes)
+    def _retry_login_action(self, generation: int, f, failure_type, **kwargs):
+        self.schedule_retry(f, failure_type, generation=generation, **kwargs).result()
+
+    def schedule_retry(self, f, failure_type, generation: int = None, **kwargs):
+        """Relog and retry a failed action in the background, without blocking the calling thread.
+
+        The attempts are run by the retry scheduler with jittered exponential backoff, and all actions that failed
+        on the same session share a single relog. If too many actions on this wiki failed all their retries, the
+        circuit breaker of the wiki fails further ones immediately with ``CircuitOpen``.
+
+        ``generation`` is the ``login_generation`` from before the failed attempt was sent (see ``_check_session``).
+        Defaults to the current one.
+
+        Returns
+        -------
+        A future that resolves once an attempt succeeded, or fails with ``RetriedLoginAndStillFailed``.
+        """
+        # the session that the action failed on; only the first relog after its failure creates a new one
+        generation = [generation if generation is not None else self._login_generation]
+
+        def before_attempt():
+            self.relog(generation[0])
+            generation[0] = self._login_generation
+
+        wiki = self.wikiname or self.url
+        return retry_scheduler.retry(f, failure_type, before_attempt=before_attempt, max_retries=self.max_retries,
+                                     retry_interval=self.retry_interval, retry_on=self.write_errors,
+                                     breaker=get_circuit_breaker(wiki), wiki=wiki, **kwargs)
 
     def save_title(self, title: str, text, summary=None, minor=False, bot=True, section=None, **kwargs):
-        self.save(self.client.pages[title], text,
+        self.save(self.lazy_page(title), text,
                   summary=summary, minor=minor, bot=bot, section=section, **kwargs)
 
     def get_last_rev(self, page: Page, log, query='revid'):
@@ -399,30 +807,47 @@ class WikiClient(object):
         1. page : mwclient.Page
             - The name of the page to get the revision for.
         """
-        try:
-            api_result = self.client.api('query', prop='revisions', titles=page.name, rvlimit=1) # https://terraria.gamepedia.com/api.php?action=query&prop=revisions&titles=User:Rye_Greenwood/Sandbox&rvlimit=1
-        except KeyboardInterrupt:
-            raise
-        except:
+        return self.get_last_revs([page.name], log, query=query).get(page.name)
+
+    def get_last_revs(self, titles: Iterable[str], log=None, query='revid') -> Dict[str, object]:
+        """Get the latest revision (rev) id or timestamp for many pages, querying them in batches of the API limit.
+
+        Parameters
+        ----------
+        1. titles : iterable of str
+            - The names of the pages to get the revisions for.
+        2. log : function
+            - Optional. Function to log errors to; the other batches are still queried after a failed one. Without it,
+              errors are raised.
+        3. query : str
+            - The property of the revision to return, e.g. ``revid`` or ``timestamp``.
+
+        Returns
+        -------
+        - A dict of each title to its revision's property, or ``None`` if the page doesn't exist. Titles of a batch that
+          failed are missing from the dict.
+        """
+        def log_error(batch: List[str]):
             log('\n***ERROR*** while getting last revision!')
             log(exc_info=True, s='Error message:\n')
-            return None
-        page_ids = api_result['query']['pages']
-        page_id = -1
-        for id in page_ids:
-            page_id = id
-        try:
-            rev = page_ids[page_id]['revisions'][0][query]
-        except KeyError: # specified key doesn't exist, either because of invalid "query" arg or nonexistent page
-            rev = None
 
-        # rev = [revision for revision in page.revisions(limit=1, prop='ids')][0]['revid'] # this is a shorter alternative, but much much slower, since the limit=1 isn't recognized for some reason, and instead all revs are gathered
-        return rev
+        result = {}
+        for title, name, page, _ in self._query_by_title(titles, on_error=log_error if log else None, prop='revisions'):
+            if page is None or 'missing' in page:
+                self._remember_missing(title, name)
+            try:
+                result[title] = page['revisions'][0][query]
+            except (KeyError, TypeError): # specified key doesn't exist, either because of invalid "query" arg or nonexistent page
+                result[title] = None
+        return result
 
 
-    def get_last_section(self, page: Page, log, output_as_Wikicode=False, strip=True, anchor=False):
+    def get_last_section(self, page: Page, log, output_as_Wikicode=False, strip=True, anchor=False, fetch_section_only=False):
         """Get the heading and wikitext of the last section of the given page.
 
+        The last section is found by scanning the text from its end, and its anchor is computed locally if the
+        heading is plain text; the page is only parsed completely (or by the wiki) if that is ambiguous.
+
         Parameters
         ----------
         1. page : mwclient.Page
@@ -433,6 +858,10 @@ class WikiClient(object):
             - Whether to trim the output (only valid if not output_as_Wikicode).
         4. anchor : bool
             - Whether to include the anchor of the heading in the output.
+        5. fetch_section_only : bool
+            - Whether to download only the last section instead of the whole page. This takes an additional request
+              for the section index, so it's only faster for long pages that aren't in the page store. The wiki
+              strips trailing whitespace from the section, so the content might differ in that if not ``strip``.
 
         Returns
         -------
@@ -443,8 +872,16 @@ class WikiClient(object):
         """
 
         result = None
+        anchor_str = None
+        title = revid = None
         try:
-            wikitext = mwparserfromhell.parse(page.text())
+            if fetch_section_only:
+                text, anchor_str = self._fetch_last_section_text(page)
+            else:
+                simple_page = self.get_simple_page(page)
+                text = simple_page.text if simple_page is not None else ''
+                if simple_page is not None:
+                    title, revid = simple_page.name, simple_page.revid
         except KeyboardInterrupt:
             raise
         except:
@@ -452,15 +889,16 @@ class WikiClient(object):
             log(exc_info=True, s='Error message:\n')
             return None
 
-        # Get heading:
-        secs_whead = wikitext.get_sections(include_lead=False)
-        if secs_whead: # if there are no sections, just return None
-            lastsec = secs_whead[len(secs_whead) - 1]
-            heading = None
-            anchor_str = None
-            for head in lastsec.ifilter_headings():
-                heading = head
-            if anchor:
+        if output_as_Wikicode:
+            # keyed by revision, so that inspecting the same revision again doesn't parse it again
+            last_section = parse_cache.get(text, title=title, revid=revid).last_section()
+        else:
+            last_section = section_util.last_section(text)
+        if last_section: # if there are no sections, just return None
+            heading, content = last_section
+            if anchor and anchor_str is None:
+                anchor_str = section_util.last_section_anchor(text)
+            if anchor and anchor_str is None:
                 try:
                     api_result = self.client.api('parse', page=page.name, prop='sections')
                 except KeyboardInterrupt:
@@ -474,11 +912,6 @@ class WikiClient(object):
                     return None
                 anchor_str = secs[len(secs) - 1]['anchor']
 
-            # Get content:
-            secs_nohead = wikitext.get_sections(include_headings=False)
-            lastsec = secs_nohead[len(secs_nohead) - 1]
-            content = lastsec
-
             # Format:
             if not output_as_Wikicode:
                 content = str(content)
@@ -493,6 +926,21 @@ class WikiClient(object):
 
         return result
 
+    def _fetch_last_section_text(self, page: Page):
+        """Return the wikitext of only the last section of the page, and its anchor."""
+
+        secs = self.client.api('parse', page=page.name, prop='sections')['parse']['sections']
+        # sections that are transcluded from other pages have indexes like "T-1"
+        indexes = [sec['index'] for sec in secs if sec['index'].isdigit()]
+        if not indexes:
+            return ('', None)
+        api_result = self.client.api('query', prop='revisions', titles=page.name, rvprop='content', rvslots='main',
+                                     rvsection=indexes[-1])
+        for row in api_result['query']['pages'].values():
+            for revision in row.get('revisions', []):
+                return (revision['slots']['main']['*'], secs[-1]['anchor'])
+        return ('', None)
+
 
     def find_summmary_in_revs(self, page: Page, summary: str, log, user='Ryebot', limit=5, for_undo=False):
         """Get the revision ID of a revision with a specified summary from the specified user in a specified number of last revisions.
@@ -563,7 +1011,7 @@ class WikiClient(object):
 
         result_namespaces = []
         try:
-            api_result = self.client.api('query', meta='siteinfo', siprop='namespaces') # https://terraria.gamepedia.com/api.php?action=query&meta=siteinfo&siprop=namespaces
+            all_namespaces = self.siteinfo.namespaces
         except KeyboardInterrupt:
             raise
         except:
@@ -571,7 +1019,6 @@ class WikiClient(object):
             log(exc_info=True, s='Error message:\n')
             return None
 
-        all_namespaces = api_result['query']['namespaces']
         for ns in all_namespaces:
             if all_namespaces[ns]['*'] in namespaces:
                 result_namespaces.append(ns)
@@ -582,32 +1029,71 @@ class WikiClient(object):
     # calls to this function should be able to be replaced with "page.exists"
     def page_exists(self, pagename: str, log):
         """Check whether a page with the specified name exists on the wiki."""
-        try:
-            api_result = self.client.api('query', prop='info', titles=pagename)
-        except KeyboardInterrupt:
-            raise
-        except:
-            log('\n***ERROR*** while checking whether the page "{}" exists!'.format(pagename))
+        return self.pages_exist([pagename], log).get(pagename, False)
+
+    def pages_exist(self, titles: Iterable[str], log=None) -> Dict[str, bool]:
+        """Check which of the titles exist on the wiki, querying them in batches of the API limit.
+
+        Missing titles are remembered until they are saved or moved to with this client, so checking them again
+        doesn't make any requests.
+
+        Parameters
+        ----------
+        1. titles : iterable of str
+            - The names of the pages to check.
+        2. log : function
+            - Optional. Function to log errors to; the other batches are still queried after a failed one. Without it,
+              errors are raised.
+
+        Returns
+        -------
+        - A dict of each title to whether the page exists. Titles of a batch that failed map to ``False``.
+        """
+        result = {}
+        with self._missing_titles_lock:
+            unknown = []
+            for title in titles:
+                if self._missing_titles and self.title_normalizer.normalize(title) in self._missing_titles:
+                    result[title] = False
+                else:
+                    unknown.append(title)
+
+        def log_error(batch: List[str]):
+            log('\n***ERROR*** while checking whether the pages exist!')
             log(exc_info=True, s='Error message:\n')
-            return False
-        try:
-            if not '-1' in api_result['query']['pages']:
-                return True
-        except KeyError: # api_result doesn't contain "pages"
-            pass
 
-        return False
+        for title, name, page, _ in self._query_by_title(unknown, on_error=log_error if log else None, prop='info'):
+            exists = page is not None and 'missing' not in page and 'invalid' not in page
+            if not exists:
+                self._remember_missing(title, name)
+            result[title] = exists
+        for title in unknown:
+            result.setdefault(title, False)
+        return result
+
+    def _remember_missing(self, *titles: str):
+        normalize = self.title_normalizer.normalize
+        with self._missing_titles_lock:
+            self._missing_titles.update(normalize(title) for title in titles)
+
+    def _forget_missing(self, title: str):
+        """Remove the title from the negative existence cache, e.g. because the page is about to be created."""
+        if not self._missing_titles:
+            return
+        name = self.title_normalizer.normalize(title)
+        with self._missing_titles_lock:
+            self._missing_titles.discard(name)
 
 
     def get_current_wiki_name(self):
         """Return the name of the current host, without ``.gamepedia.com`` and ``.fandom.com``, and with ``/<lang>`` appended, if not English."""
 
-        api_result = self.client.api('query', meta='siteinfo', siprop='general')
+        general = self.siteinfo.general
 
-        sitename = api_result['query']['general']['servername']
+        sitename = general['servername']
         sitename = sitename.replace('.gamepedia.com', '').replace('.fandom.com', '')
 
-        sitelang = api_result['query']['general']['lang']
+        sitelang = general['lang']
         if sitelang != "en" and sitelang != '':
             sitename += '/' + sitelang
 
@@ -622,99 +1108,120 @@ class WikiClient(object):
         return wiki_user
 
 
+    def rate_limit_metrics(self) -> dict:
+        """Return the current request rates, the number of throttled requests, and the time spent waiting for the rate limiter."""
+
+        if not isinstance(self.client, Site):
+            # e.g. a plain mwclient site that was passed to the constructor
+            return {}
+        return self.client.rate_limit_metrics()
+
+
     def get_csrf_token(self, log):
-        """Get a CSRF token for a POST request."""
+        """Get a CSRF token for a POST request. The token is cached for the session, see ``Site.get_token``."""
 
         try:
-            api_result = self.client.api('query', meta='tokens')
+            token = self.client.get_token('csrf')
         except KeyboardInterrupt:
             raise
         except:
             log('\n***ERROR*** while getting CSRF token!')
             log(exc_info=True, s='Error message:\n')
             return None
-        token = api_result['query']['tokens']['csrftoken']
         return token
 
 
-    def api_continue(self, log, action: str, continue_name: str='', i: int=0, **kwargs):
+    def api_continue(self, log, action: str, continue_name: str='', **kwargs):
         """
-        Provides an API call with recursive, thus unlimited "continue" capability (e.g. for when the number of category members may exceed the bot limit (5000) but we want to get all >5000 of them).
-        Returns an array with the contents of each "action" (e.g. "query") call.
+        Provides an API call with unlimited "continue" capability (e.g. for when the number of category members may exceed the bot limit (5000) but we want to get all >5000 of them).
+        Returns a list with the contents of each "action" (e.g. "query") call, in the order in which they were fetched.
+
+        This collects the entire result in memory; use ``api_continue_iter`` to process the batches as they arrive.
 
         Parameters
         ----------
         1. action : str
             - API action module (e.g. ``query``).
         2. continue_name: str
-            - Name of the ``continue`` attribute for the specified action (e.g. ``cmcontinue``). Defaults to first element in the ``continue`` array of the API result.
-        3. i: int
-            - Internally used by the recursion for debug. Do not use from outside!
+            - Name of the ``continue`` attribute for the specified action (e.g. ``cmcontinue``). Defaults to the full ``continue`` array of the API result.
         """
 
-        i += 1
-        #log('\n[%s] Enter api_continue().' % i)
+        result = []
         try:
-            api_result = self.client.api(action, **kwargs)
-            #log('[{}] API result: {}'.format(i, api_result))
+            for batch in self.api_continue_iter(action, continue_name=continue_name, **kwargs):
+                result.append(batch)
+        except KeyboardInterrupt:
+            raise
         except:
-            log('\n[{}] ***ERROR*** while executing continued API call (parameters: action=\'{}\', {})'.format(i, action, kwargs))
-            log(exc_info=True, s='[{}] Error message:\n'.format(i))
-            log('[{}] Aborted API call.'.format(i))
+            log('\n***ERROR*** while executing continued API call (parameters: action=\'{}\', {})'.format(action, kwargs))
+            log(exc_info=True, s='Error message:\n')
+            log('Aborted API call.')
             return
+        return result
 
-        flag = True
-        try:
-            _ = api_result['continue']
-        except KeyError: # continue doesn't exist
-            flag = False
-        if flag:
-            if not continue_name:
-                #log(list(api_result['continue'].keys()))
-                continue_name = list(api_result['continue'].keys())[0]
-            if api_result['continue'][continue_name]:
-                #log('[{}] continue = {}'.format(i, api_result['continue'][continue_name]))
-                kwargs.__setitem__(continue_name, api_result['continue'][continue_name]) # add the continue parameter to the next API call
-                #log('[{}] Fetching new api result with the following parameters: action=\'{}\', {}'.format(i, action, kwargs))
-                next_api_result = self.api_continue(log, action, continue_name, i, **kwargs) # do recursion
-                #log('[{}] Received api result from previous call: {}'.format(i, next_api_result))
-                if next_api_result:
-                    #log('- Append this previous api result to api result from this call:')
-                    #log('--- This api result: %s' % [api_result[action]])
-                    #log('--- Previous api result that will be appended to above: %s' % next_api_result)
-
-                    if isinstance(next_api_result, dict):
-                        next_api_result = [next_api_result]
-                    result = next_api_result
-                    result.append(api_result[action])
-                    #log('- Appended.')
-                    #log('[{}] Return:'.format(i))
-                    #log('-- %s' % result)
-                    #for x in result:
-                    #    log('---- %s' % x)
-                    return result
-                else: # error during API call
-                    #log('[%s] Return nothing.\n' % i)
-                    return
-        else: # reached top of the stack
-            #log('[{}] Return {}.\n'.format(i, api_result[action]))
-            if i == 1: # still in the first call, no continues were necessary at all
-                return [api_result[action]]
+
+    def api_continue_iter(self, action: str, continue_name: str='', item_key: str=None, **kwargs):
+        """Perform an API call and follow its "continue" chain iteratively, yielding each batch as soon as it arrives.
+
+        Only one batch is held in memory at a time. All parameters of the ``continue`` array of each result are passed
+        on to the next call, so this works for generators and for combined ``list``/``prop`` queries as well.
+
+        Parameters
+        ----------
+        1. action : str
+            - API action module (e.g. ``query``).
+        2. continue_name : str
+            - Optional. Only continue as long as this attribute (e.g. ``cmcontinue``) is in the ``continue`` array.
+        3. item_key : str
+            - Optional. Yield the single items of this key of each batch (e.g. ``categorymembers`` or ``pages``)
+            instead of the batches themselves.
+
+        Yields
+        ------
+        The contents of each "action" call, or the single items of ``item_key`` in them.
+        """
+
+        while True:
+            api_result = self.client.api(action, **kwargs)
+            batch = api_result.get(action, {})
+            if item_key is None:
+                yield batch
             else:
-                return api_result[action]
+                items = batch.get(item_key, [])
+                if isinstance(items, dict):
+                    # e.g. "pages", which is keyed by page ID
+                    items = items.values()
+                yield from items
+
+            continue_params = api_result.get('continue')
+            if not continue_params:
+                return
+            if continue_name and not continue_params.get(continue_name):
+                return
+            kwargs.update(continue_params) # add the continue parameters to the next API call
 
 
     def redirects_to_inclfragment(self, pagename: str):
         """Similar to ``mwclient.Site.redirects_to()``, but also returns the fragment of the redirect target."""
 
-        api_result = self.client.api('query', prop='pageprops', titles=pagename, redirects='')
-        if 'redirects' in api_result['query']:
-            for page in api_result['query']['redirects']:
-                if page['from'] == pagename:
-                    if 'tofragment' in page:
-                        return (page['to'], page['tofragment'])
-                    else:
-                        return (page['to'], None)
-                        
-        return (None, None)
+        return self.redirects_to_inclfragment_many([pagename])[pagename]
+
+    def redirects_to_inclfragment_many(self, pagenames: Iterable[str]) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """Like ``redirects_to_inclfragment``, for many pages, querying them in batches of the API limit.
+
+        Returns
+        -------
+        - A dict of each page name to ``(target, fragment)``, or to ``(None, None)`` if the page isn't a redirect.
+        """
+        pagenames = list(pagenames)
+        result = {}
+        for title, name, page, query in self._query_by_title(pagenames, prop='pageprops', redirects=''):
+            result[title] = (None, None)
+            for redirect in query.get('redirects', []):
+                if redirect['from'] == name:
+                    result[title] = (redirect['to'], redirect.get('tofragment'))
+                    break
+        for title in pagenames:
+            result.setdefault(title, (None, None))
+        return result
 
@@ -0,0 +1,82 @@
+import json
+import os
+import pickle
+import tempfile
+
+
+def read_json(filename: str, default=None):
+    """Return the contents of the JSON file, or ``default`` if the file doesn't exist or doesn't contain valid JSON."""
+
+    try:
+        with open(filename, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def write_json_atomic(filename: str, data):
+    """Write the ``data`` to the JSON file in a way that other processes never see a partially written file.
+
+    The data is written to a temporary file in the same directory first, which then replaces the target file.
+    """
+
+    _write_atomic(filename, lambda f: json.dump(data, f), suffix='.json', mode='w', encoding='utf-8')
+
+
+def read_json_lines(filename: str) -> list:
+    """Return the objects of the JSON Lines file, skipping lines that aren't valid JSON (e.g. a partially written
+    last line). Returns an empty list if the file doesn't exist.
+    """
+
+    objects = []
+    try:
+        with open(filename, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    objects.append(json.loads(line))
+                except ValueError:
+                    pass
+    except OSError:
+        pass
+    return objects
+
+
+def write_json_lines_atomic(filename: str, objects):
+    """Write the ``objects`` to the JSON Lines file, one per line, like ``write_json_atomic``."""
+
+    def write(f):
+        for data in objects:
+            f.write(json.dumps(data, ensure_ascii=False) + '\n')
+
+    _write_atomic(filename, write, suffix='.jsonl', mode='w', encoding='utf-8')
+
+
+def read_pickle(filename: str, default=None):
+    """Return the object pickled in the file, or ``default`` if the file doesn't exist or can't be unpickled."""
+
+    try:
+        with open(filename, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return default
+
+
+def write_pickle_atomic(filename: str, data):
+    """Pickle the ``data`` to the file, like ``write_json_atomic``."""
+
+    _write_atomic(filename, lambda f: pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL), suffix='.pickle', mode='wb')
+
+
+def _write_atomic(filename: str, write, suffix: str, **open_kwargs):
+    directory = os.path.dirname(filename) or '.'
+    fd, tmp_filename = tempfile.mkstemp(dir=directory, prefix='.tmp', suffix=suffix)
+    try:
+        with os.fdopen(fd, **open_kwargs) as f:
+            write(f)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,62 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
+from collections import deque
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Split the ``iterable`` into lists of at most ``size`` elements each, without loading it into memory completely."""
+
+    if size < 1:
+        raise ValueError(f'Chunk size must be at least 1, not {size}!')
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def imap_ordered(func: Callable, iterable: Iterable, max_workers: int=4, executor: Executor=None, prefetch: int=None):
+    """Apply ``func`` to every element of the ``iterable`` concurrently and yield the results in the input order.
+
+    Works like ``Executor.map()``, but does not consume the entire ``iterable`` up front: at most ``prefetch`` calls
+    are in flight at any time, so memory stays bounded no matter how long the input is, and results are yielded
+    as soon as they (and all results before them) are ready.
+
+    Parameters
+    ----------
+    1. func : Callable
+        - The function to apply to each element. Exceptions raised by it are re-raised when its result is due.
+    2. iterable : Iterable
+        - The input elements.
+    3. max_workers : int
+        - Number of worker threads, if no ``executor`` is provided.
+    4. executor : concurrent.futures.Executor
+        - Optional. An existing executor (e.g. a ``ProcessPoolExecutor``) to run the calls in. It is not shut down afterwards.
+    5. prefetch : int
+        - Maximum number of calls in flight. Defaults to twice the number of workers.
+    """
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    if prefetch is None:
+        prefetch = 2 * max_workers
+
+    pending = deque()
+    iterator = iter(iterable)
+    try:
+        for element in islice(iterator, prefetch):
+            pending.append(executor.submit(func, element))
+        while pending:
+            result = pending.popleft().result()
+            for element in islice(iterator, 1):
+                pending.append(executor.submit(func, element))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=True)
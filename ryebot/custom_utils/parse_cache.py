@@ -0,0 +1,188 @@
+import copy
+import hashlib
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import mwparserfromhell
+from mwparserfromhell.nodes import Heading, Template
+from mwparserfromhell.wikicode import Wikicode
+
+from custom_utils.file_util import read_pickle, write_pickle_atomic
+
+
+def template_key(name) -> str:
+    """Return the name of a template in the form that the template index of ``ParsedText`` uses as key."""
+
+    name = str(name).strip().replace('_', ' ')
+    if name.lower().startswith('template:'):
+        name = name[len('template:'):].strip()
+    return name[:1].upper() + name[1:]
+
+
+class ParsedText(object):
+    """
+    The parsed wikitext of one revision, with indexes of its sections and templates that are computed on first use.
+
+    The cached parse tree is shared by everyone who gets this object from a cache, so it must never be modified.
+    The accessors return copies of their nodes; use ``copy`` to get a parse tree that is safe to modify.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self._wikicode = mwparserfromhell.parse(text)
+        self._sections = None
+        self._templates = None
+        self._templates_by_name = None
+
+    def copy(self) -> Wikicode:
+        """Return a copy of the parse tree that can be modified."""
+        return copy.deepcopy(self._wikicode)
+
+    def _section_index(self) -> List[Tuple[Heading, Wikicode]]:
+        if self._sections is None:
+            sections = []
+            for section in self._wikicode.get_sections(include_lead=False):
+                heading = section.get(0)
+                sections.append((heading, section))
+            self._sections = sections
+        return self._sections
+
+    @property
+    def section_count(self) -> int:
+        return len(self._section_index())
+
+    def headings(self) -> List[Heading]:
+        return [copy.deepcopy(heading) for heading, _ in self._section_index()]
+
+    def last_section(self) -> Optional[Tuple[Heading, Wikicode]]:
+        """Return the heading and the content (without heading) of the last section, or ``None`` if there is none."""
+
+        sections = self._section_index()
+        if not sections:
+            return None
+        _, section = sections[-1]
+        # the last section never has subsections, so its content is everything after its heading; the heading that is
+        # returned is the last one in the section, even if it is nested (e.g. in a template)
+        heading = None
+        for heading in section.ifilter_headings():
+            pass
+        content = Wikicode(list(section.nodes[1:]))
+        return (copy.deepcopy(heading), copy.deepcopy(content))
+
+    def _template_index(self):
+        if self._templates is None:
+            templates = self._wikicode.filter_templates()
+            templates_by_name: Dict[str, List[Template]] = {}
+            for template in templates:
+                templates_by_name.setdefault(template_key(template.name), []).append(template)
+            self._templates = templates
+            self._templates_by_name = templates_by_name
+
+    def templates(self, name: str = None) -> List[Template]:
+        """Return all templates (recursively), or only those with the ``name``, in the order of the text."""
+
+        self._template_index()
+        if name is None:
+            templates = self._templates
+        else:
+            templates = self._templates_by_name.get(template_key(name), [])
+        return [copy.deepcopy(template) for template in templates]
+
+    def first_template(self) -> Optional[Template]:
+        self._template_index()
+        return copy.deepcopy(self._templates[0]) if self._templates else None
+
+
+class ParseCache(object):
+    """
+    Size-bounded cache of parsed wikitext, evicting the least recently used texts.
+
+    Texts are keyed by title and revision ID if they are known, and by a hash of their content otherwise. The cache
+    can be persisted to a pickle file, so that texts don't have to be parsed again in the next run.
+    """
+
+    def __init__(self, max_size: int = 256, filename: str = None):
+        """
+        :param max_size: Maximum number of parsed texts to keep.
+        :param filename: Optional. Full path of the pickle file to load the cache from and save it to.
+        """
+
+        self.max_size = max_size
+        self.filename = filename
+        self._entries = OrderedDict() # key -> ParsedText, or its pickled form if it was loaded from disk
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if filename is not None:
+            self.load()
+
+    @staticmethod
+    def _key(text: str, title: str = None, revid: int = None) -> Hashable:
+        if title is not None and revid is not None:
+            return (title, revid)
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get(self, text: str, title: str = None, revid: int = None) -> ParsedText:
+        """Return the parsed ``text``, parsing it only if it isn't cached yet."""
+
+        key = self._key(text, title, revid)
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+                if isinstance(parsed, bytes):
+                    parsed = pickle.loads(parsed)
+                    self._entries[key] = parsed
+                self.hits += 1
+                return parsed
+            self.misses += 1
+
+        # parse outside of the lock, so that other threads can use the cache in the meantime
+        parsed = ParsedText(text)
+        with self._lock:
+            self._entries[key] = parsed
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return parsed
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        entries = read_pickle(self.filename)
+        if not isinstance(entries, OrderedDict):
+            return
+        with self._lock:
+            # unpickled on first use; newer entries of this session take precedence
+            for key, data in entries.items():
+                self._entries.setdefault(key, data)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        """Persist the cache to its file. Texts that are nested too deeply to be pickled are left out."""
+
+        if self.filename is None:
+            return
+        with self._lock:
+            entries = list(self._entries.items())
+        data = OrderedDict()
+        for key, parsed in entries:
+            if isinstance(parsed, bytes):
+                data[key] = parsed
+                continue
+            try:
+                data[key] = pickle.dumps(parsed, protocol=pickle.HIGHEST_PROTOCOL)
+            except RecursionError:
+                pass
+        write_pickle_atomic(self.filename, data)
+
+
+# the cache shared by WikiClient and wiki_util
+parse_cache = ParseCache()
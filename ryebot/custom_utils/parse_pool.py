@@ -0,0 +1,107 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+import mwparserfromhell
+from mwparserfromhell.nodes import Template
+from mwparserfromhell.wikicode import Wikicode
+
+from custom_mwclient.models.simple_page import SimplePage
+from custom_utils.iter_util import chunked, imap_ordered
+from custom_utils.parse_cache import template_key
+
+
+# The tasks have to be top-level functions, so that they can be pickled and sent to the worker processes.
+
+def _parse(text: str) -> Wikicode:
+    return mwparserfromhell.parse(text)
+
+
+def _filter_templates(text: str, name: str = None) -> List[Template]:
+    templates = mwparserfromhell.parse(text).filter_templates()
+    if name is not None:
+        key = template_key(name)
+        templates = [template for template in templates if template_key(template.name) == key]
+    return templates
+
+
+def _transform(func: Callable[[Wikicode], object], text: str):
+    return func(mwparserfromhell.parse(text))
+
+
+def _run_batch(task: Callable, texts: List[str]) -> list:
+    return [task(text) for text in texts]
+
+
+class ParsePool(object):
+    """
+    Parses wikitext in a pool of worker processes, so that parsing many pages uses all cores.
+
+    The texts are sent to the workers in batches and the results are yielded in the input order, as soon as they
+    are ready; the input is consumed lazily, so it can be a stream of pages that are still being downloaded, e.g.::
+
+        with ParsePool() as pool:
+            titles = (page.name for page in site.pages_using('Infobox'))
+            for page, infoboxes in pool.transform_pages(find_infoboxes, site.iter_simple_pages(titles, 50)):
+                ...
+
+    Functions passed to the pool have to be picklable, i.e. defined at the top level of a module, and so do their
+    results. The results are copies: modifying them doesn't change anything in the caller's objects.
+    """
+
+    def __init__(self, max_workers: int = None, batch_size: int = 20, prefetch: int = None):
+        """
+        :param max_workers: Number of worker processes. Defaults to the number of cores.
+        :param batch_size: Number of texts per task. Larger batches reduce the overhead of sending them to the workers.
+        :param prefetch: Maximum number of batches in flight. Defaults to twice the number of workers.
+        """
+
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def map(self, task: Callable[[str], object], texts: Iterable[str]) -> Iterator:
+        """Apply the ``task`` to every text in a worker process and yield the results in the input order."""
+
+        batches = imap_ordered(partial(_run_batch, task), chunked(texts, self.batch_size),
+                               max_workers=self.max_workers, executor=self._executor, prefetch=self.prefetch)
+        for results in batches:
+            yield from results
+
+    def parse(self, texts: Iterable[str]) -> Iterator[Wikicode]:
+        return self.map(_parse, texts)
+
+    def filter_templates(self, texts: Iterable[str], name: str = None) -> Iterator[List[Template]]:
+        """Yield the list of templates of every text, optionally only those with the ``name``."""
+
+        return self.map(partial(_filter_templates, name=name), texts)
+
+    def transform(self, func: Callable[[Wikicode], object], texts: Iterable[str]) -> Iterator:
+        """Parse every text and yield the result of ``func`` on the parsed wikitext."""
+
+        return self.map(partial(_transform, func), texts)
+
+    def transform_pages(self, func: Callable[[Wikicode], object], pages: Iterable[SimplePage]) -> Iterator[Tuple[SimplePage, object]]:
+        """Like ``transform``, for ``SimplePage`` objects. Yields ``(page, result)`` for each of the pages."""
+
+        buffer = deque()
+
+        def texts():
+            for page in pages:
+                buffer.append(page)
+                yield page.text
+
+        for result in self.transform(func, texts()):
+            yield (buffer.popleft(), result)
@@ -0,0 +1,184 @@
+import html
+import re
+from collections import Counter
+from typing import Optional, Tuple
+
+import mwparserfromhell
+from mwparserfromhell.nodes import Heading
+
+
+# lines that might start a heading
+_HEADING_LINE = re.compile(r'^=.*$', re.MULTILINE)
+_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+# tags whose contents aren't parsed
+_OPAQUE_TAG = re.compile(r'<(nowiki|pre|math|source|syntaxhighlight|code)\b[^<>]*?>.*?</\1\s*>', re.DOTALL | re.IGNORECASE)
+_OPENERS_AND_CLOSERS = re.compile(r'(\{\{\{|\{\{|\[\[|^[ \t]*\{\|)|(\}\}\}|\}\}|\]\]|^[ \t]*\|\})|<(/?)([a-zA-Z][a-zA-Z0-9]*)\b[^<>]*?(/?)>', re.MULTILINE)
+_CLOSER_OF = {'}}}': '{{{', '}}': '{{', ']]': '[['}
+# bold and italic markup, which the parser matches across lines
+_APOSTROPHES = re.compile(r"'{2,}")
+_VOID_TAGS = {'br', 'hr', 'img', 'wbr'}
+
+# headings whose anchor can be computed locally: plain text and simple links
+_SIMPLE_LINK = re.compile(r'\[\[:?([^\[\]|{}<>]+)(?:\|([^\[\]{}<>]*))?\]\]')
+_UNSUPPORTED_IN_ANCHOR = re.compile(r"[\[\]{}<>~]|''|__")
+
+
+def _is_balanced(wikitext: str) -> bool:
+    """Return whether nothing is left open at the end of the ``wikitext`` that a following heading could be part of.
+
+    This errs on the side of caution: it returns ``False`` for some texts that are actually fine.
+    """
+
+    wikitext = _COMMENT.sub('', wikitext)
+    if '<!--' in wikitext:
+        return False
+    wikitext = _OPAQUE_TAG.sub('', wikitext)
+
+    # the parser might match closers without an opener with an opener elsewhere, so they are ambiguous as well
+    depth = Counter()
+    for opener, closer, closing, name, self_closing in _OPENERS_AND_CLOSERS.findall(wikitext):
+        if opener:
+            depth[opener.strip()] += 1
+        elif closer:
+            closer = closer.strip()
+            kind = _CLOSER_OF.get(closer, '{|')
+            if depth[kind] == 0:
+                return False
+            depth[kind] -= 1
+        else:
+            name = name.lower()
+            if self_closing or name in _VOID_TAGS:
+                continue
+            if not closing:
+                depth['<' + name] += 1
+            elif depth['<' + name] == 0:
+                return False
+            else:
+                depth['<' + name] -= 1
+    if any(depth.values()):
+        return False
+
+    italic = bold = False
+    for apostrophes in _APOSTROPHES.findall(wikitext):
+        if len(apostrophes) == 2:
+            italic = not italic
+        elif len(apostrophes) == 3:
+            bold = not bold
+        else:
+            # the parser resolves these differently depending on the markup around them
+            return False
+    return not italic and not bold
+
+
+def find_last_heading(wikitext: str) -> Optional[Tuple[Heading, int]]:
+    """Find the heading of the last section of the ``wikitext`` by scanning it from the end.
+
+    Only the line of the heading is parsed, and the text before it is only checked for unclosed templates, tags,
+    tables, links, and comments that the heading could be part of. The line itself is checked as well, since anything
+    it leaves open (e.g. a ``<pre>`` tag) can extend the heading into the following lines.
+
+    Returns
+    -------
+    - ``(heading, position)``: The heading node and the position of its first character in the ``wikitext``.
+    - ``None`` if the ``wikitext`` has no sections.
+
+    Raises ``ValueError`` if the last section can't be determined this way. In that case, the ``wikitext`` has to be
+    parsed completely.
+    """
+
+    newline = wikitext.rfind('\n=')
+    if newline != -1:
+        start = newline + 1
+    elif wikitext.startswith('='):
+        start = 0
+    else:
+        return None
+    end = wikitext.find('\n', start)
+    line = wikitext[start:end] if end != -1 else wikitext[start:]
+
+    nodes = mwparserfromhell.parse(line).nodes
+    if not nodes or not isinstance(nodes[0], Heading) or not _is_balanced(line) or not _is_balanced(wikitext[:start]):
+        raise ValueError('Last section of the wikitext is ambiguous.')
+    return (nodes[0], start)
+
+
+def last_section(wikitext: str) -> Optional[Tuple[str, str]]:
+    """Return the heading and the content (without heading) of the last section of the ``wikitext``, as strings.
+
+    This gives the same result as ``mwparserfromhell`` (``get_sections()``), but usually without parsing the
+    ``wikitext``. Returns ``None`` if the ``wikitext`` has no sections.
+    """
+
+    try:
+        found = find_last_heading(wikitext)
+    except ValueError:
+        parsed = mwparserfromhell.parse(wikitext)
+        sections = parsed.get_sections(include_lead=False)
+        if not sections:
+            return None
+        section = sections[-1]
+        # the heading is the last one in the section, even if it is nested (e.g. in a template)
+        heading = None
+        for heading in section.ifilter_headings():
+            pass
+        return (str(heading), str(section)[len(str(section.get(0))):])
+
+    if found is None:
+        return None
+    heading, start = found
+    heading = str(heading)
+    return (heading, wikitext[start + len(heading):])
+
+
+def last_section_anchor(wikitext: str) -> Optional[str]:
+    """Return the anchor of the heading of the last section of the ``wikitext``, computed locally.
+
+    Returns ``None`` if the anchor can't be determined locally, i.e. if the heading isn't plain text (see
+    ``heading_anchor``), if the last section is ambiguous, or if an earlier heading might have the same anchor (which
+    MediaWiki would then number).
+    """
+
+    try:
+        found = find_last_heading(wikitext)
+    except ValueError:
+        return None
+    if found is None:
+        return None
+    heading, start = found
+    anchor = heading_anchor(str(heading.title))
+    if anchor is None:
+        return None
+
+    key = anchor_key(anchor)
+    for line in _HEADING_LINE.finditer(wikitext, 0, start):
+        nodes = mwparserfromhell.parse(line.group()).nodes
+        if not nodes or not isinstance(nodes[0], Heading):
+            # might be the start of a heading that spans multiple lines
+            return None
+        other_anchor = heading_anchor(str(nodes[0].title))
+        if other_anchor is None:
+            return None
+        other_key = anchor_key(other_anchor)
+        if other_key == key or other_key.startswith(key + '_') or key.startswith(other_key + '_'):
+            return None
+    return anchor
+
+
+def heading_anchor(title: str) -> Optional[str]:
+    """Return the anchor that MediaWiki generates for a heading with the ``title`` (with ``$wgFragmentMode = html5``).
+
+    Only titles of plain text and simple links are supported; returns ``None`` for all others (e.g. titles with
+    templates, HTML, or formatting), whose anchors can only be computed by the wiki.
+    """
+
+    title = _SIMPLE_LINK.sub(lambda m: m.group(2) if m.group(2) is not None else m.group(1), title)
+    if _UNSUPPORTED_IN_ANCHOR.search(title):
+        return None
+    title = html.unescape(title)
+    title = re.sub(r'[ _]+', ' ', title).strip()
+    return re.sub(r'[\t\n\f\r ]', '_', title)
+
+
+def anchor_key(anchor: str) -> str:
+    """Return the key under which MediaWiki detects duplicate anchors (byte-wise lowercase)."""
+    return re.sub(r'[A-Z]+', lambda m: m.group().lower(), anchor)
@@ -0,0 +1,199 @@
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+from custom_mwclient.models.simple_page import SimplePage
+from custom_utils.iter_util import chunked, imap_ordered
+
+
+class TextMatch(object):
+    """One occurrence of a search pattern in a text."""
+
+    def __init__(self, pattern: str, start: int, end: int, text: str, context: int = 40):
+        """
+        :param pattern: The literal pattern or the regex (as string) that matched.
+        :param start: Position of the first character of the match in the ``text``.
+        :param end: Position after the last character of the match.
+        :param text: The text that was searched; only the match and its context are kept.
+        :param context: Number of characters of context to keep on each side of the match.
+        """
+
+        self.pattern = pattern
+        self.start = start
+        self.end = end
+        self.match = text[start:end]
+        self.before = text[max(0, start - context):start]
+        self.after = text[end:end + context]
+        self.line = text.count('\n', 0, start) + 1
+
+    def to_dict(self) -> dict:
+        return {
+            'pattern': self.pattern,
+            'start': self.start,
+            'end': self.end,
+            'line': self.line,
+            'match': self.match,
+            'before': self.before,
+            'after': self.after,
+        }
+
+    def __repr__(self):
+        return '<TextMatch {!r} at {}-{} (line {})>'.format(self.pattern, self.start, self.end, self.line)
+
+
+class AhoCorasick(object):
+    """
+    Finds all occurrences of many literal patterns in a single pass over a text (Aho-Corasick automaton).
+
+    The time per text doesn't depend on the number of patterns, only on the length of the text and the number of
+    matches. Overlapping occurrences are all found.
+    """
+
+    def __init__(self, patterns: Iterable[str], ignore_case: bool = False):
+        self.ignore_case = ignore_case
+        self.patterns = list(dict.fromkeys(pattern for pattern in patterns if pattern))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]] # state -> indexes of the patterns that end in it
+
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for char in self._fold(pattern):
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(index)
+
+        # breadth-first, so that the failure links of shorter prefixes are known first
+        todo = deque(self._goto[0].values())
+        while todo:
+            state = todo.popleft()
+            for char, next_state in self._goto[state].items():
+                todo.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                fail = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = fail if fail != next_state else 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+        # skips the parts of the text in which no pattern can start
+        self._first_chars = re.compile('[{}]'.format(''.join(re.escape(char) for char in self._goto[0]))) if self._goto[0] else None
+
+    def _fold(self, text: str) -> str:
+        if not self.ignore_case:
+            return text
+        folded = text.lower()
+        if len(folded) == len(text):
+            return folded
+        # some characters become longer when lowercased, which would shift the positions of the matches
+        return ''.join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Yield ``(start, end, pattern)`` for every occurrence of a pattern in the ``text``, ordered by end."""
+
+        if self._first_chars is None:
+            return
+        text = self._fold(text)
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self.patterns
+        state = 0
+        i = 0
+        length = len(text)
+        while i < length:
+            if state == 0:
+                found = self._first_chars.search(text, i)
+                if found is None:
+                    return
+                i = found.start()
+            char = text[i]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                pattern = patterns[index]
+                yield (i + 1 - len(pattern), i + 1, pattern)
+            i += 1
+
+
+class TextSearcher(object):
+    """
+    Searches texts for many literal patterns and regexes at once.
+
+    Literal patterns are matched by a single ``AhoCorasick`` automaton, so searching for a long list of terms (e.g.
+    the names of deprecated templates) takes one pass over each text. Searchers can be pickled, so they can be used
+    in worker processes (see ``search_pages``).
+    """
+
+    def __init__(self, patterns: Iterable[str] = (), regexes: Iterable[Union[str, re.Pattern]] = (),
+                 ignore_case: bool = False, context: int = 40):
+        """
+        :param patterns: Literal strings to search for.
+        :param regexes: Regular expressions to search for, as strings or compiled.
+        :param ignore_case: Whether to match the patterns and the regexes (if given as strings) case-insensitively.
+        :param context: Number of characters of context of each match on each side.
+        """
+
+        self.automaton = AhoCorasick(patterns, ignore_case=ignore_case)
+        flags = re.IGNORECASE if ignore_case else 0
+        self.regexes = [regex if isinstance(regex, re.Pattern) else re.compile(regex, flags) for regex in regexes]
+        self.context = context
+
+    def finditer(self, text: str) -> Iterator[TextMatch]:
+        """Yield all matches in the ``text``, ordered by position."""
+
+        found = list(self.automaton.finditer(text))
+        for regex in self.regexes:
+            found.extend((m.start(), m.end(), regex.pattern) for m in regex.finditer(text))
+        found.sort(key=lambda match: (match[0], match[1]))
+        for start, end, pattern in found:
+            yield TextMatch(pattern, start, end, text, self.context)
+
+    def findall(self, text: str) -> List[TextMatch]:
+        return list(self.finditer(text))
+
+
+def _findall_batch(searcher: TextSearcher, texts: List[str]) -> List[List[TextMatch]]:
+    return [searcher.findall(text) for text in texts]
+
+
+def search_pages(searcher: TextSearcher, pages: Iterable[SimplePage], processes: int = 0,
+                 batch_size: int = 20) -> Iterator[Tuple[SimplePage, List[TextMatch]]]:
+    """Search the texts of the ``pages`` and yield ``(page, matches)`` for every page with matches, in input order.
+
+    The ``pages`` are consumed lazily, so if they are fetched in the background (e.g. by ``iter_simple_pages``),
+    matching overlaps with the fetches. With ``processes``, matching runs in that many worker processes, for when
+    matching can't keep up with the fetches.
+    """
+
+    pages = (page for page in pages if page.exists)
+    if not processes:
+        for page in pages:
+            matches = searcher.findall(page.text)
+            if matches:
+                yield (page, matches)
+        return
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for batch in _search_batches(searcher, chunked(pages, batch_size), executor, processes):
+            yield from batch
+
+
+def _search_batches(searcher: TextSearcher, batches: Iterable[List[SimplePage]], executor: ProcessPoolExecutor,
+                    processes: int) -> Iterator[List[Tuple[SimplePage, List[TextMatch]]]]:
+    # only the texts are sent to the workers; the pages are kept here to be paired with the results
+    sent = deque()
+
+    def texts():
+        for batch in batches:
+            sent.append(batch)
+            yield [page.text for page in batch]
+
+    for results in imap_ordered(partial(_findall_batch, searcher), texts(), max_workers=processes, executor=executor):
+        yield [(page, matches) for page, matches in zip(sent.popleft(), results) if matches]
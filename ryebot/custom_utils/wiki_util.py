@@ -1,22 +1,19 @@
-import mwparserfromhell
-
 from custom_mwclient.auth_credentials import AuthCredentials
 from custom_mwclient.fandom_client import FandomClient
+from custom_utils.parse_cache import parse_cache
 
 
 def template_str_to_object(template_str: str):
     """Turns the input string into an mwparserfromhell.Template object.
     
     It is assumed the string does contain a template and only consists of that template.
+    The parse is cached, and the returned template is a copy that can be modified.
     """
 
-    wikitext = mwparserfromhell.parse(template_str)
-    for template in wikitext.filter_templates():
-        return template
-    return
+    return parse_cache.get(template_str).first_template()
 
 
-def login_to_wiki(targetwiki: str, username='bot', return_log=False, log=None):
+def login_to_wiki(targetwiki: str, username='bot', return_log=False, log=None, localdata_directory=None):
     """Basic login to a wiki.
 
     Parameters
@@ -27,6 +24,10 @@ def login_to_wiki(targetwiki: str, username='bot', return_log=False, log=None):
         - Whether to log in as Ryebot (``bot``) or Rye Greenwood (``me``).
     3. return_log : bool
         - Whether to return a log of the login actions. Will log on its own (using the function provided in the ``log`` parameter) if set to ``False``.
+    4. log : function
+        - Function to log the login actions with if ``return_log`` is ``False``.
+    5. localdata_directory : str
+        - Optional. The directory with the local data of the wiki (page store, search indexes, etc.), e.g. its directory in ``localdata/wikis``.
     
     Returns
     -------
@@ -47,9 +48,10 @@ def login_to_wiki(targetwiki: str, username='bot', return_log=False, log=None):
         has_lang = False
 
     if has_lang:
-        site = FandomClient(credentials=creds, wiki=targetwiki_base, lang=targetwiki_lang)
+        site = FandomClient(credentials=creds, wiki=targetwiki_base, lang=targetwiki_lang,
+                            localdata_directory=localdata_directory)
     else:
-        site = FandomClient(credentials=creds, wiki=targetwiki)
+        site = FandomClient(credentials=creds, wiki=targetwiki, localdata_directory=localdata_directory)
 
     # -- validate wikiname post-login ---
     wiki_id = site.get_current_wiki_name()
@@ -23,6 +23,10 @@ REQUIREMENTS = [
     'pid>=3.0.4',
     'beautifultable>=1.0.0'
 ]
+# optional dependencies, installed with e.g. "pip install ryebot[async]"
+EXTRAS_REQUIREMENTS = {
+    'async': ['aiohttp>=3.8.0']
+}
 # command that will be used to execute the program from the command line
 ENTRYPOINT_COMMAND = 'ryebot'
 
@@ -63,6 +67,7 @@ setup(
     packages=find_packages(),
     python_requires=PYTHON_VERSION,
     install_requires=REQUIREMENTS,
+    extras_require=EXTRAS_REQUIREMENTS,
     entry_points={
         'console_scripts': [
             ENTRYPOINT_COMMAND + ' = ryebot.bot.cli.console_entry_point:main'